@@ -0,0 +1,32 @@
+"""Create LangGraph message log
+
+Revision ID: 8c4e2a6f1d3b
+Revises: 5b1f3c2d9a7e
+Create Date: 2026-10-17 20:41:05.318274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2a6f1d3b'
+down_revision: Union[str, None] = '5b1f3c2d9a7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('langgraph_messages',
+    sa.Column('thread_id', sa.String(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(), nullable=True),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.PrimaryKeyConstraint('thread_id', 'seq')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('langgraph_messages')
@@ -10,16 +10,18 @@ from langchain_core.runnables import Runnable
 from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
 from chainlit.logger import logger
 from chainlit.types import ThreadDict
+from chat_workflow.database import dispose_engine, get_async_session, get_engine, get_pg_url, get_pool_stats
+from chat_workflow.lifecycle import add_route, on_app_shutdown, on_app_startup
+from chat_workflow.llm import model_catalog
+from chat_workflow.metrics import TurnMetrics, metrics_endpoint
 from chat_workflow.module_discovery import discover_workflows
-from chat_workflow.storage_client import MinIOStorageClient, LangGraph, Thread
-from chat_workflow.state_serializer import StateSerializer
+from chat_workflow.persistence import apply_background_run, flush_active_sessions, flush_session, get_checkpointer, get_graph_config, get_graph_input, load_state, run_in_background, track_session, untrack_session
+from chat_workflow.storage_client import LazyStorageClient, Thread
+from chat_workflow.streaming import TokenStreamer, chunk_to_text
 from chat_workflow.auth import maybe_oauth_callback
 from chat_workflow.workflows.workflow_factory import WorkflowFactory
 from dotenv import load_dotenv
 from typing import Dict, Optional
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.dialects.postgresql import insert
 
 
 load_dotenv()
@@ -32,77 +34,86 @@ logger.info(f"Logging level set to: {logging_level} {numeric_level}")
 
 # Discovery workflow dynamically
 discover_workflows()
+# Compile the graphs once at startup instead of on every chat start.
+# The graphs checkpoint their state to Postgres after every step.
+WorkflowFactory.set_checkpointer(get_checkpointer())
+WorkflowFactory.warm_up()
 
-pg_url = f"postgresql+asyncpg://{os.getenv('POSTGRES_USER', 'postgres')}:{os.getenv('POSTGRES_PASSWORD', 'postgres')}@{os.getenv('POSTGRES_HOST', 'localhost')}:{os.getenv('POSTGRES_PORT', '5432')}/{os.getenv('POSTGRES_DB', 'postgres')}"
+pg_url = get_pg_url()
 
 
 # Persistance Layer
-storage_client = MinIOStorageClient(
-    bucket=os.getenv("MINIO_BUCKET", "mybucket"),
-    endpoint_url=os.getenv("MINIO_ENDPOINT_URL", "http://minio:9000"),
-    access_key=os.getenv("MINIO_ROOT_USER", "chainlit_langgraph"),
-    secret_key=os.getenv("MINIO_ROOT_PASSWORD", "chainlit_langgraph"),
-)
 cl_data._data_layer = SQLAlchemyDataLayer(
     conninfo=pg_url,
-    storage_provider=storage_client
+    storage_provider=LazyStorageClient()
 )
+# Share the pooled engine with the data layer instead of opening a second pool.
+# The engine the data layer created has not connected yet, so it is closed at once.
+cl_data._data_layer.engine.sync_engine.dispose()
+cl_data._data_layer.engine = get_engine()
+cl_data._data_layer.async_session = get_async_session()
+
+
+@on_app_startup
+async def on_app_startup_start_model_catalog():
+    """
+    List the models of the providers before the first chat needs them, and keep them fresh.
+    """
+    model_catalog.start()
+
+
+@on_app_shutdown
+async def on_app_shutdown_stop_model_catalog():
+    await model_catalog.stop()
+
+
+@on_app_shutdown
+async def on_app_shutdown_dispose_engine():
+    await dispose_engine()
+
+
+async def db_health():
+    """
+    Expose the connection pool usage for monitoring
+    """
+    return {"pool": get_pool_stats()}
+
+
+add_route("/health/db", db_health)
+add_route("/metrics", metrics_endpoint)
+
+
+@on_app_shutdown
+async def on_app_shutdown_flush_sessions():
+    """
+    Checkpoint the pending changes of all sessions before the process exits.
+    Uvicorn turns SIGTERM into a graceful shutdown, which runs this hook.
+    """
+    await flush_active_sessions()
 
 
 @cl.on_chat_end
 async def on_chat_end():
     """
-    Save the chat state to the database before the chat ends using upsert
+    Checkpoint the pending changes of the session before the chat ends.
+    The graph itself checkpoints its state after every step.
     """
-    state = cl.user_session.get("state")
-    workflow_name = state["chat_profile"]
     thread_id = cl.context.session.thread_id
-
-    engine = create_async_engine(pg_url)
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False)
-
-    try:
-        async with async_session() as session:
-            stmt = insert(LangGraph).values(
-                thread_id=thread_id,
-                state=StateSerializer.serialize(state),
-                workflow=workflow_name,
-            ).on_conflict_do_update(
-                # This upsert is necessary because we might have created the thread in the on_chat_start.
-                index_elements=['thread_id'],
-                set_=dict(
-                    state=StateSerializer.serialize(state),
-                    workflow=workflow_name,
-                )
-            )
-            await session.execute(stmt)
-            await session.commit()
-            logger.info(f"Upserted LangGraph for thread_id: {thread_id}")
-    except Exception as e:
-        logger.error(f"Error saving LangGraph: {str(e)}")
+    await flush_session(thread_id)
+    untrack_session(thread_id)
 
 
 @cl.on_chat_resume
 async def on_chat_resume(thread: ThreadDict):
-    # Retrieve the LangGraph from the database
-    engine = create_async_engine(pg_url)
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False)
-
-    db_graph: Optional[LangGraph] = None
-    state: Optional[Dict] = None
-    async with async_session() as session:
-        db_graph = await session.get(LangGraph, thread["id"])
-        if db_graph:
-            chat_profile = db_graph.workflow
-            GraphState = WorkflowFactory.get_graph_state(chat_profile)
-            state = StateSerializer.deserialize(db_graph.state, GraphState)
-            cl.user_session.set("state", state)
+    # Retrieve the latest checkpoint of the thread
+    state, checkpointed = await load_state(thread["id"])
 
     # Load the Graph
-    if db_graph:
+    if state:
         await start_langgraph(state["chat_profile"], state)
+        # Legacy states are dirty so that they get migrated to a checkpoint
+        track_session(thread["id"], state, checkpointed=checkpointed,
+                      dirty=checkpointed < len(state["messages"]))
 
 
 async def start_langgraph(chat_profile: str, state: Optional[Dict] = None):
@@ -113,9 +124,8 @@ async def start_langgraph(chat_profile: str, state: Optional[Dict] = None):
         chat_profile (str): The name of the chat profile to load.
         state (Optional[Dict]): The state to load.
     """
-    workflow = WorkflowFactory.create(name=chat_profile)
-    graph = workflow.create_graph()
-    cl.user_session.set("graph", graph.compile())
+    workflow = WorkflowFactory.get(chat_profile)
+    cl.user_session.set("graph", WorkflowFactory.get_graph(chat_profile))
     if state:
         # Resume from previous state
         state["chat_profile"] = chat_profile
@@ -163,9 +173,7 @@ async def chat_profile():
 
 @cl.on_chat_start
 async def on_chat_start():
-    engine = create_async_engine(pg_url)
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False)
+    async_session = get_async_session()
 
     # Ensure Thread exists
     # This is a workaround for the fact that sometimes the thread is not created. Should be a bug in chainlit.
@@ -191,6 +199,7 @@ async def update_state_by_settings(settings: cl.ChatSettings):
         logger.debug(f"Setting {key} to {settings[key]}")
         state[key] = settings[key]
     cl.user_session.set("state", state)
+    track_session(cl.context.session.thread_id, state)
     logger.info("State updated with new settings")
 
 
@@ -201,37 +210,38 @@ async def on_message(message: cl.Message):
 
     graph: Runnable = cl.user_session.get("graph")
     state = cl.user_session.get("state")
-    workflow = WorkflowFactory.create(name=state["chat_profile"])
-    logger.debug(f"Chat Profile: {chat_profile}")
+    workflow = WorkflowFactory.get(state["chat_profile"])
+    # The turn starts when the message is received
+    metrics = TurnMetrics(state["chat_profile"], state.get(
+        "chat_model", ""), workflow.output_chat_model)
+    logger.debug(f"Chat Profile: {state['chat_profile']}")
+    thread_id = cl.context.session.thread_id
+    user = cl.user_session.get("user")
+    user_id = user.identifier if user else None
+    # Background tasks of earlier turns, e.g. summarization, apply once they are done
+    apply_background_run(thread_id, state)
 
-    state["messages"] += [workflow.format_message(message)]
+    state["messages"] += [await workflow.format_message(message)]
     logger.debug(
         f"Updated state with new message. Total messages: {len(state['messages'])}")
 
-    ui_message = None
+    streamer = TokenStreamer()
     logger.info("Starting to stream response")
-    async for event in graph.astream_events(state, version="v1", stream_mode="values"):
-        string_content = ""
+    async for event in graph.astream_events(get_graph_input(thread_id, state), config=get_graph_config(thread_id, user_id, state), version="v1", stream_mode="values"):
+        metrics.observe_event(event)
         if event["event"] == "on_chat_model_stream" and event["name"] == workflow.output_chat_model:
-            content = event["data"]["chunk"].content or ""
-            if isinstance(content, str):
-                string_content += content
-            elif isinstance(content, list) and len(content) > 0:
-                if isinstance(content[0], str):
-                    string_content += " ".join(content)
-                elif isinstance(content[0], dict) and "text" in content[0]:
-                    string_content += " ".join([c["text"] for c in content])
-            else:
-                string_content = ""
-            if ui_message is None:
-                ui_message = cl.Message(content=string_content)
-                await ui_message.send()
-                logger.debug("Started new UI message")
-            else:
-                await ui_message.stream_token(token=string_content)
+            await streamer.push(chunk_to_text(event["data"]["chunk"].content))
         if event["event"] == "on_chain_end" and event["name"] == "LangGraph":
             state = event["data"]["output"]
-    await ui_message.update()
+    await streamer.close()
+    metrics.finish()
+    logger.debug(f"Streamed response in {streamer.frames} UI updates")
     cl.user_session.set("state", state)
+    # Every step of the run has been checkpointed by the graph
+    track_session(thread_id, state, checkpointed=len(
+        state["messages"]), dirty=False)
+    if workflow.background_tasks:
+        run_in_background(thread_id, workflow.background_tasks,
+                          state, get_graph_config(thread_id, user_id, state))
     logger.debug(
         f"Updated state with AI response. Total messages: {len(state['messages'])}")
@@ -0,0 +1,77 @@
+"""
+Cold-start import time of app.py.
+
+Imports app.py in a fresh interpreter with `python -X importtime`, and reports
+the total import time and the modules that take the longest to import,
+including their own imports. Fails if the total exceeds --budget seconds, so
+that a new eager import of a heavy SDK is caught before it slows down every
+process start.
+
+Usage:
+    python -m benchmarks.import_time --budget 5 --top 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+
+def measure(module: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        The total import time in seconds, and the cumulative import time in
+        seconds of every imported module.
+    """
+    # Keep the logs quiet
+    env = {**os.environ, "LOGGING_LEVEL": "WARNING"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}:\n{result.stderr}")
+    total = 0.0
+    modules: List[Tuple[str, float]] = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        seconds = int(cumulative) / 1e6
+        modules.append((name.strip(), seconds))
+        # Modules imported at the top level, not by another module
+        if not name.startswith("  "):
+            total += seconds
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=20,
+                        help="Number of modules to report")
+    parser.add_argument("--budget", type=float,
+                        help="Maximum import time in seconds")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    total, modules = measure(args.module)
+    top = sorted(modules, key=lambda item: item[1], reverse=True)[:args.top]
+    print(f"{'total':>48} {total:>8.2f}s")
+    for name, seconds in top:
+        print(f"{name[-48:]:>48} {seconds:>8.2f}s")
+    if args.json:
+        results: Dict = {"total_s": total, "top": dict(top)}
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.budget is not None and total > args.budget:
+        print(f"FAILED: import time {total:.2f}s > {args.budget}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Load test of the chat lifecycle of app.py.
+
+Drives on_chat_start -> on_message x N -> on_chat_end for many simulated
+Chainlit sessions, through the same code paths as the websocket server. The
+sessions run against the Postgres configured by the POSTGRES_* env vars and a
+stub LLM, so no other service or network access is needed. Reports throughput,
+time to first token and turn latency percentiles, event loop lag and memory per
+session, and fails if a --max-*/--min-* limit is exceeded or a turn fails. A
+turn fails if it logs an exception or ends before the first token of a reply.
+
+Usage:
+    python -m benchmarks.load_test --sessions 1000 --concurrency 200 --turns 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import resource
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+
+
+class LoadStats:
+    """Samples collected during a load test"""
+
+    def __init__(self):
+        self.ttft: List[float] = []
+        self.turn: List[float] = []
+        self.loop_lag: List[float] = []
+        self.errors = 0
+        self.turns = 0
+        self.sessions = 0
+        self.active = 0
+        self.peak_active = 0
+
+
+class TurnErrors(logging.Handler):
+    """
+    Records the sessions that logged an exception, as Chainlit does when on_message raises.
+    """
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.sessions: Set[str] = set()
+
+    def emit(self, record: logging.LogRecord):
+        from chainlit.context import ChainlitContextException, context
+
+        if record.exc_info is None:
+            return
+        try:
+            self.sessions.add(context.session.id)
+        except ChainlitContextException:
+            pass
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def monitor_loop_lag(stats: LoadStats, interval: float, stop: asyncio.Event):
+    """Measure how late the event loop wakes up a sleeping task"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(time.perf_counter() - start - interval)
+
+
+async def run_session(profile: str, turns: int, errors: TurnErrors, stats: Optional[LoadStats]):
+    from chainlit.config import config
+    from chainlit.context import init_ws_context
+    from chainlit.session import WebsocketSession
+    from chainlit.socket import process_message
+    from literalai.helper import utc_now
+
+    turn: Dict[str, Optional[float]] = {"start": None, "first_token": None}
+
+    async def emit(event: str, data):
+        if event not in ("new_message", "stream_start") or not isinstance(data, dict):
+            return
+        # The reply is sent with its first token, after the step of the on_message hook
+        if data.get("type") == "assistant_message" and turn["first_token"] is None:
+            turn["first_token"] = time.perf_counter()
+
+    async def emit_call(event: str, data, timeout):
+        return None
+
+    session = WebsocketSession(
+        id=str(uuid.uuid4()),
+        socket_id=str(uuid.uuid4()),
+        emit=emit,
+        emit_call=emit_call,
+        user_env={},
+        client_type="webapp",
+        thread_id=str(uuid.uuid4()),
+        chat_profile=profile,
+    )
+    init_ws_context(session)
+    if stats:
+        stats.active += 1
+        stats.peak_active = max(stats.peak_active, stats.active)
+    try:
+        await config.code.on_chat_start()
+        for i in range(turns):
+            turn["start"], turn["first_token"] = time.perf_counter(), None
+            await process_message(session, {
+                "message": {
+                    "id": str(uuid.uuid4()),
+                    "threadId": session.thread_id,
+                    "createdAt": utc_now(),
+                    "output": f"Message {i} of the load test.",
+                    "name": "User",
+                    "type": "user_message",
+                },
+                "fileReferences": None,
+            })
+            end = time.perf_counter()
+            failed = session.id in errors.sessions or turn["first_token"] is None
+            errors.sessions.discard(session.id)
+            if stats:
+                stats.turns += 1
+                if failed:
+                    stats.errors += 1
+                else:
+                    stats.turn.append(end - turn["start"])
+                    stats.ttft.append(turn["first_token"] - turn["start"])
+        await config.code.on_chat_end()
+    finally:
+        session.delete()
+        if stats:
+            stats.active -= 1
+            stats.sessions += 1
+
+
+async def run(args) -> Dict[str, float]:
+    import chat_workflow.llm as llm
+    from chainlit.logger import logger
+    from chat_workflow.llm.catalog import ModelCatalog
+    from chat_workflow.llm.factory import LLMFactory
+    from chat_workflow.llm.providers.stub import StubProvider
+
+    # Only the stub provider, so that no model is listed or called over the network.
+    # Set before app imports the workflows, which use the factory and catalog of the package.
+    factory = LLMFactory(llm.llm_factory.scheduler, llm.llm_factory.single_flight,
+                         llm.llm_factory.response_cache)
+    factory.register_provider("stub", StubProvider(
+        ttft=args.ttft_ms / 1000,
+        token_delay=args.token_delay_ms / 1000,
+        output_tokens=args.output_tokens,
+        tool_calls=args.tool_calls,
+        tool_name="get_datetime_now",
+        error_rate=args.error_rate,
+        enabled=True,
+    ))
+    llm.llm_factory, llm.model_catalog = factory, ModelCatalog(factory, cache_dir="")
+    import app
+
+    errors = TurnErrors()
+    logger.addHandler(errors)
+
+    # Warm up imports, the connection pool and lazy initialization
+    await run_session(args.profile, 1, errors, None)
+
+    stats = LoadStats()
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(stats, 0.01, stop))
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rss_before = max_rss_mb()
+
+    async def limited_session():
+        async with semaphore:
+            await run_session(args.profile, args.turns, errors, stats)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[limited_session() for _ in range(args.sessions)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    rss_after = max_rss_mb()
+    await app.dispose_engine()
+
+    return {
+        "sessions": stats.sessions,
+        "turns": stats.turns,
+        "errors": stats.errors,
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": stats.turns / elapsed,
+        "ttft_p50_ms": percentile(stats.ttft, 50) * 1000,
+        "ttft_p95_ms": percentile(stats.ttft, 95) * 1000,
+        "ttft_p99_ms": percentile(stats.ttft, 99) * 1000,
+        "turn_p50_ms": percentile(stats.turn, 50) * 1000,
+        "turn_p95_ms": percentile(stats.turn, 95) * 1000,
+        "turn_p99_ms": percentile(stats.turn, 99) * 1000,
+        "loop_lag_p50_ms": percentile(stats.loop_lag, 50) * 1000,
+        "loop_lag_p99_ms": percentile(stats.loop_lag, 99) * 1000,
+        "loop_lag_max_ms": max(stats.loop_lag, default=0) * 1000,
+        "peak_sessions": stats.peak_active,
+        "rss_mb": rss_after,
+        "rss_per_session_kb": (rss_after - rss_before) * 1024 / max(stats.peak_active, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--profile", default="Simple Chat")
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--token-delay-ms", type=float, default=20)
+    parser.add_argument("--output-tokens", type=int, default=50)
+    parser.add_argument("--tool-calls", action="store_true",
+                        help="Call a tool before every reply")
+    parser.add_argument("--error-rate", type=float,
+                        help="Share of the LLM requests that fail. Defaults to STUB_LLM_ERROR_RATE (0)")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--max-ttft-p95-ms", type=float)
+    parser.add_argument("--max-turn-p95-ms", type=float)
+    parser.add_argument("--max-loop-lag-p99-ms", type=float)
+    parser.add_argument("--min-throughput", type=float,
+                        help="Minimum turns per second")
+    args = parser.parse_args()
+
+    # Keep the logs quiet
+    os.environ.setdefault("LOGGING_LEVEL", "WARNING")
+
+    results = asyncio.run(run(args))
+    for key, value in results.items():
+        print(f"{key:>24} {value:>12.2f}" if isinstance(
+            value, float) else f"{key:>24} {value:>12}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if args.max_ttft_p95_ms is not None and results["ttft_p95_ms"] > args.max_ttft_p95_ms:
+        failures.append(f"ttft_p95_ms > {args.max_ttft_p95_ms}")
+    if args.max_turn_p95_ms is not None and results["turn_p95_ms"] > args.max_turn_p95_ms:
+        failures.append(f"turn_p95_ms > {args.max_turn_p95_ms}")
+    if args.max_loop_lag_p99_ms is not None and results["loop_lag_p99_ms"] > args.max_loop_lag_p99_ms:
+        failures.append(f"loop_lag_p99_ms > {args.max_loop_lag_p99_ms}")
+    if args.min_throughput is not None and results["throughput_turns_per_s"] < args.min_throughput:
+        failures.append(f"throughput_turns_per_s < {args.min_throughput}")
+    if results["errors"]:
+        failures.append(f"{results['errors']} turns failed")
+    # No turn got through, so there is nothing to compare with the limits
+    if any(math.isnan(value) for key, value in results.items()
+           if key.startswith(("ttft_", "turn_p"))):
+        failures.append("no latency samples")
+    if failures:
+        print("FAILED: " + ", ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
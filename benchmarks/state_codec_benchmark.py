@@ -0,0 +1,75 @@
+"""
+Benchmark of the serialization of graph states.
+
+Encodes and decodes the state of threads of 10, 100 and 1000 turns, each turn
+a user message, a tool call, its result and the reply, with the legacy JSON
+format of the `langgraphs` table, JsonPlusSerializer and StateCodec, and
+reports the time per encode and decode and the size of the payload.
+
+Usage:
+    python -m benchmarks.state_codec_benchmark --turns 10,100,1000
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from chat_workflow.state_codec import StateCodec, decode_legacy_state
+
+
+def make_state(turns: int) -> Dict[str, Any]:
+    messages: List[BaseMessage] = []
+    for i in range(turns):
+        tool_call = {"name": "search", "args": {"query": f"question {i}"}, "id": f"call_{i}", "type": "tool_call"}
+        usage = {"input_tokens": 1000 + i, "output_tokens": 100, "total_tokens": 1100 + i}
+        messages += [
+            HumanMessage(content=f"Question {i}: what happened in the news today?", id=f"human_{i}"),
+            AIMessage(content="", tool_calls=[tool_call], usage_metadata=usage,
+                      response_metadata={"model_name": "gpt-4o", "finish_reason": "tool_calls"}, id=f"call_{i}"),
+            ToolMessage(content="Search results. " * 40, tool_call_id=f"call_{i}", name="search", id=f"tool_{i}"),
+            AIMessage(content="Here is a summary of the results. " * 10, usage_metadata=usage,
+                      response_metadata={"model_name": "gpt-4o", "finish_reason": "stop"}, id=f"ai_{i}"),
+        ]
+    return {"messages": messages, "chat_profile": "Simple Chat", "chat_model": "(openai)gpt-4o"}
+
+
+def legacy_dumps(state: Dict[str, Any]) -> str:
+    # The format of the legacy `langgraphs` table
+    return json.dumps({**state, "messages": [message.model_dump() for message in state["messages"]]},
+                      default=lambda obj: obj.__dict__ if hasattr(obj, "__dict__") else str(obj))
+
+
+def measure(function: Callable[[], Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", default="10,100,1000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    codecs = {
+        "legacy json": (legacy_dumps, decode_legacy_state),
+        "jsonplus": (JsonPlusSerializer().dumps_typed, JsonPlusSerializer().loads_typed),
+        "state codec": (StateCodec().dumps_typed, StateCodec().loads_typed),
+        "state codec, no zstd": (StateCodec(compression_level=0).dumps_typed,
+                                 StateCodec(compression_level=0).loads_typed),
+    }
+    print(f"{'turns':>6} {'codec':>22} {'encode ms':>10} {'decode ms':>10} {'bytes':>10}")
+    for turns in [int(t) for t in args.turns.split(",")]:
+        state = make_state(turns)
+        for name, (dumps, loads) in codecs.items():
+            data = dumps(state)
+            assert loads(data)["messages"] == state["messages"]
+            size = len(data if isinstance(data, str) else data[1])
+            print(f"{turns:>6} {name:>22} {measure(lambda: dumps(state), args.repeat):>10.2f} "
+                  f"{measure(lambda: loads(data), args.repeat):>10.2f} {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
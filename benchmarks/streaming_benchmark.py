@@ -0,0 +1,86 @@
+"""
+Benchmark of the token streaming stage in on_message.
+
+Simulates a fast provider emitting many small chunks and compares streaming
+every chunk to the UI with coalesced streaming. Each UI update is a websocket
+frame; the fake message below stands in for it and serializes a payload the
+way Chainlit's emitter does.
+
+Usage:
+    python -m benchmarks.streaming_benchmark --chunks 2000 --chunk-delay-ms 2
+"""
+import argparse
+import asyncio
+import json
+import time
+from chat_workflow.streaming import TokenStreamer
+
+
+class FakeMessage:
+    """Stand-in for cl.Message that counts frames and the time spent emitting them"""
+
+    def __init__(self, content: str = ""):
+        self.content = content
+        self.frames = 0
+        self.emit_seconds = 0.0
+
+    async def _emit(self, payload: dict):
+        start = time.perf_counter()
+        json.dumps(payload)
+        self.frames += 1
+        # Yield to the event loop as the websocket emit would
+        await asyncio.sleep(0)
+        self.emit_seconds += time.perf_counter() - start
+
+    async def send(self):
+        await self._emit({"output": self.content})
+
+    async def stream_token(self, token: str):
+        self.content += token
+        await self._emit({"id": "message", "token": token})
+
+    async def update(self):
+        await self._emit({"output": self.content})
+
+
+async def run(flush_interval: float, chunks: int, chunk_delay: float, chunk_text: str):
+    streamer = TokenStreamer(
+        flush_interval=flush_interval, message_class=FakeMessage)
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    ttft = None
+    for _ in range(chunks):
+        await asyncio.sleep(chunk_delay)
+        await streamer.push(chunk_text)
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    message = await streamer.close()
+    return {
+        "frames": message.frames,
+        "emit_ms": message.emit_seconds * 1000,
+        "cpu_ms": (time.process_time() - cpu_start) * 1000,
+        "wall_ms": (time.perf_counter() - start) * 1000,
+        "ttft_ms": ttft * 1000,
+        "chars": len(message.content),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--chunk-delay-ms", type=float, default=2)
+    parser.add_argument("--chunk-text", default="tok ")
+    parser.add_argument("--intervals-ms", default="0,30,50")
+    args = parser.parse_args()
+
+    print(f"{'interval':>10} {'frames':>8} {'emit ms':>9} {'loop cpu ms':>12} {'wall ms':>9} {'ttft ms':>8}")
+    for interval_ms in [float(i) for i in args.intervals_ms.split(",")]:
+        result = asyncio.run(run(interval_ms / 1000, args.chunks,
+                                 args.chunk_delay_ms / 1000, args.chunk_text))
+        assert result["chars"] == args.chunks * len(args.chunk_text)
+        print(f"{interval_ms:>8.0f}ms {result['frames']:>8} {result['emit_ms']:>9.1f} {result['cpu_ms']:>12.1f} "
+              f"{result['wall_ms']:>9.1f} {result['ttft_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
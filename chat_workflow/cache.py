@@ -0,0 +1,390 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+from chainlit.logger import logger
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import sessionmaker
+from .metrics import CACHE_EVICTIONS, CACHE_REQUESTS
+from .storage_client import CacheEntry
+
+
+Loader = Callable[[], Awaitable[Any]]
+
+# Number of writes to Postgres between deletions of the expired entries
+PRUNE_INTERVAL = 100
+
+
+def get_or_load(cache: "Cache", key: str, loader: Loader) -> Optional[Any]:
+    """
+    Get a value without waiting inside an event loop, or load it now without one, e.g. in scripts.
+    """
+    value = cache.get_or_refresh(key, loader)
+    if value is None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(cache.aget(key, loader))
+    return value
+
+
+class CacheTier(ABC):
+    """
+    A shared tier behind the in-memory cache, e.g. on disk or in Postgres.
+
+    Entries are stored with the wall-clock time they were stored at, so that
+    every process can tell how old they are, and are dropped after `expires_at`.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        """
+        Get the time an entry was stored at and its value, or None.
+        """
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, stored_at: float, expires_at: Optional[float]):
+        """
+        Store an entry, to be dropped after `expires_at` or never if it is None.
+        """
+
+    def get_nowait(self, key: str) -> Optional[Tuple[float, Any]]:
+        """
+        Get an entry without an event loop, if the tier is local and quick to read, or None.
+        """
+        return None
+
+
+class DiskCacheTier(CacheTier):
+    """
+    Cache tier of files in a directory, shared by the processes of a host and kept across restarts.
+
+    Args:
+        directory (Optional[str]): Directory of the files. Defaults to CACHE_DIR, or
+            chainlit-langgraph in the user's cache directory (XDG_CACHE_HOME or ~/.cache).
+        serde (Optional[SerializerProtocol]): Serializer of the values.
+    """
+
+    def __init__(self, directory: Optional[str] = None, serde: Optional[SerializerProtocol] = None):
+        self.directory = os.path.expanduser(directory or os.getenv("CACHE_DIR") or os.path.join(
+            os.getenv("XDG_CACHE_HOME") or "~/.cache", "chainlit-langgraph"))
+        self.serde = serde or JsonPlusSerializer()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        return self.get_nowait(key)
+
+    def get_nowait(self, key: str) -> Optional[Tuple[float, Any]]:
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read the cache entry {key}: {e}")
+            return None
+        if entry["key"] != key or (entry["expires_at"] is not None and entry["expires_at"] <= time.time()):
+            return None
+        return entry["stored_at"], self.serde.loads_typed(
+            (entry["type"], base64.b64decode(entry["payload"])))
+
+    async def set(self, key: str, value: Any, stored_at: float, expires_at: Optional[float]):
+        value_type, payload = self.serde.dumps_typed(value)
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Replace the file at once, so that other processes never read half of it
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "key": key,
+                    "stored_at": stored_at,
+                    "expires_at": expires_at,
+                    "type": value_type,
+                    "payload": base64.b64encode(payload).decode(),
+                }, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write the cache entry {key}: {e}")
+
+
+class PostgresCacheTier(CacheTier):
+    """
+    Cache tier of the `cache_entries` table, shared by all workers.
+
+    Args:
+        async_session (sessionmaker): Factory for async database sessions.
+        serde (Optional[SerializerProtocol]): Serializer of the values.
+    """
+
+    def __init__(self, async_session: sessionmaker, serde: Optional[SerializerProtocol] = None):
+        self.async_session = async_session
+        self.serde = serde or JsonPlusSerializer()
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        try:
+            async with self.async_session() as session:
+                row = await session.scalar(select(CacheEntry).where(
+                    CacheEntry.key == key,
+                    (CacheEntry.expires_at.is_(None)) | (
+                        CacheEntry.expires_at > datetime.now(timezone.utc)),
+                ))
+        except Exception as e:
+            logger.warning(f"Failed to read the cache entry {key}: {e}")
+            return None
+        if row is None:
+            return None
+        return row.stored_at.timestamp(), self.serde.loads_typed((row.type, row.payload))
+
+    async def set(self, key: str, value: Any, stored_at: float, expires_at: Optional[float]):
+        value_type, payload = self.serde.dumps_typed(value)
+        values = dict(
+            type=value_type,
+            payload=payload,
+            stored_at=datetime.fromtimestamp(stored_at, timezone.utc),
+            expires_at=datetime.fromtimestamp(expires_at, timezone.utc) if expires_at is not None else None,
+        )
+        try:
+            async with self.async_session() as session:
+                await session.execute(insert(CacheEntry).values(key=key, **values).on_conflict_do_update(
+                    index_elements=[CacheEntry.key], set_=values))
+                self._writes += 1
+                if self._writes % PRUNE_INTERVAL == 0:
+                    await session.execute(delete(CacheEntry).where(
+                        CacheEntry.expires_at <= datetime.now(timezone.utc)))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Failed to write the cache entry {key}: {e}")
+
+
+class Cache:
+    """
+    Bounded in-memory LRU cache with a TTL, in front of optional shared tiers.
+
+    An entry is fresh for `ttl` seconds, then stale for `stale_ttl` seconds,
+    during which it is still returned while a refresh runs in the background
+    (stale-while-revalidate). Loads of the same key are shared, so a key is
+    loaded once however many requests miss it at the same time. Ages are
+    measured with a monotonic clock in memory, and with the wall clock in the
+    tiers, which are read on a memory miss and written on every store.
+
+    Args:
+        name (str): Name of the cache in the metrics and the keys of the tiers.
+        max_size (int): Number of entries kept in memory.
+        ttl (Optional[float]): Seconds an entry is fresh, None for ever.
+        stale_ttl (float): Seconds a stale entry is returned while it is refreshed.
+        tiers (Sequence[CacheTier]): Shared tiers, from the fastest to the slowest.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+        stale_ttl: float = 0,
+        tiers: Sequence[CacheTier] = (),
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.tiers = list(tiers)
+        # Monotonic time the entries were stored at, and their values
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._loads: Dict[str, asyncio.Task] = {}
+        self._stats = {"hit": 0, "stale": 0, "miss": 0, "eviction": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _age(self, stored_at: float) -> float:
+        return time.monotonic() - stored_at
+
+    def _is_fresh(self, age: float) -> bool:
+        return self.ttl is None or age < self.ttl
+
+    def _is_usable(self, age: float) -> bool:
+        return self.ttl is None or age < self.ttl + self.stale_ttl
+
+    def _count(self, result: str):
+        self._stats[result] += 1
+        CACHE_REQUESTS.labels(self.name, result).inc()
+
+    def _lookup(self, key: str) -> Tuple[Optional[Any], bool]:
+        """
+        Get the value of a key in memory and whether it is fresh, dropping it once it is unusable.
+        """
+        if key not in self._entries:
+            return None, False
+        stored_at, value = self._entries[key]
+        age = self._age(stored_at)
+        if not self._is_usable(age):
+            del self._entries[key]
+            return None, False
+        self._entries.move_to_end(key)
+        return value, self._is_fresh(age)
+
+    def _store(self, key: str, value: Any, age: float = 0):
+        self._entries[key] = (time.monotonic() - age, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats["eviction"] += 1
+            CACHE_EVICTIONS.labels(self.name).inc()
+
+    def peek(self, key: str) -> Optional[Any]:
+        """
+        Get the value of a key from memory, even if it is stale, without counting a lookup.
+        """
+        return self._lookup(key)[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get the fresh value of a key from memory, or None.
+        """
+        value, fresh = self._lookup(key)
+        self._count("hit" if fresh else "miss")
+        return value if fresh else None
+
+    def set(self, key: str, value: Any):
+        """
+        Store a value in memory only.
+        """
+        self._store(key, value)
+
+    async def aset(self, key: str, value: Any):
+        """
+        Store a value in memory and in the tiers.
+        """
+        self._store(key, value)
+        stored_at = time.time()
+        expires_at = None
+        if self.ttl is not None and not math.isinf(self.stale_ttl):
+            expires_at = stored_at + self.ttl + self.stale_ttl
+        for tier in self.tiers:
+            await tier.set(f"{self.name}:{key}", value, stored_at, expires_at)
+
+    def invalidate(self, key: str):
+        """
+        Drop a key from memory.
+        """
+        self._entries.pop(key, None)
+
+    async def aget(self, key: str, loader: Optional[Loader] = None) -> Optional[Any]:
+        """
+        Get the value of a key, loading it on a miss.
+
+        A stale value is returned at once and refreshed in the background.
+
+        Args:
+            key (str): The key.
+            loader (Optional[Loader]): Loads the value of the key, None to only read the cache.
+        """
+        value, fresh = self._lookup(key)
+        if value is None:
+            value, fresh = await self._read_tiers(key)
+        if value is not None:
+            self._count("hit" if fresh else "stale")
+            if not fresh and loader is not None:
+                self.refresh(key, loader)
+            return value
+        self._count("miss")
+        if loader is None:
+            return None
+        return await asyncio.shield(self._start_load(key, loader, read_tiers=False))
+
+    def get_or_refresh(self, key: str, loader: Loader) -> Optional[Any]:
+        """
+        Get the value of a key from memory without waiting, even if it is stale.
+
+        On a memory miss, the local tiers are read at once. A stale or missing
+        value is loaded in the background, from the tiers or the loader, if an
+        event loop is running.
+        """
+        value, fresh = self._lookup(key)
+        if value is None:
+            value, fresh = self._read_tiers_nowait(key)
+        self._count("hit" if fresh else "stale" if value is not None else "miss")
+        if not fresh:
+            self.refresh(key, loader)
+        return value
+
+    def refresh(self, key: str, loader: Loader) -> Optional[asyncio.Task]:
+        """
+        Load a key in the background, unless it is already loading or no event loop is running.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        return self._start_load(key, loader, read_tiers=True)
+
+    def _start_load(self, key: str, loader: Loader, read_tiers: bool) -> asyncio.Task:
+        task = self._loads.get(key)
+        if task is None:
+            task = self._loads[key] = asyncio.get_running_loop().create_task(
+                self._load(key, loader, read_tiers))
+            task.add_done_callback(lambda task: self._finish_load(key, task))
+        return task
+
+    def _finish_load(self, key: str, task: asyncio.Task):
+        if self._loads.get(key) is task:
+            del self._loads[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Failed to load {key} into the {self.name} cache: {task.exception()}")
+
+    async def _load(self, key: str, loader: Loader, read_tiers: bool) -> Any:
+        if read_tiers:
+            value, fresh = await self._read_tiers(key)
+            if fresh:
+                return value
+        value = await loader()
+        await self.aset(key, value)
+        return value
+
+    async def _read_tiers(self, key: str) -> Tuple[Optional[Any], bool]:
+        """
+        Read a key from the first tier that has a usable value, and keep it in memory.
+        """
+        for tier in self.tiers:
+            entry = await tier.get(f"{self.name}:{key}")
+            if entry is not None and (result := self._use_entry(key, entry))[0] is not None:
+                return result
+        return None, False
+
+    def _use_entry(self, key: str, entry: Tuple[float, Any]) -> Tuple[Optional[Any], bool]:
+        """
+        Keep an entry of a tier in memory if it is usable.
+        """
+        stored_at, value = entry
+        age = max(0, time.time() - stored_at)
+        if not self._is_usable(age):
+            return None, False
+        self._store(key, value, age)
+        return value, self._is_fresh(age)
+
+    def _read_tiers_nowait(self, key: str) -> Tuple[Optional[Any], bool]:
+        for tier in self.tiers:
+            entry = tier.get_nowait(f"{self.name}:{key}")
+            if entry is not None and (result := self._use_entry(key, entry))[0] is not None:
+                return result
+        return None, False
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get the size of the cache and the number of hits, stale hits, misses and evictions.
+        """
+        return {"size": len(self._entries), "loading": len(self._loads), **self._stats}
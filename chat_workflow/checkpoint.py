@@ -0,0 +1,408 @@
+import functools
+import os
+import random
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from .message_history import MessageHistory
+from .metrics import DB_SAVE_DURATION, get_run_labels
+from .state_codec import StateCodec
+from .storage_client import LangGraphCheckpoint, LangGraphMessage, LangGraphWrite
+
+
+# Key that replaces the messages channel in a serialized checkpoint
+MESSAGES_LEN_KEY = "messages_len"
+
+
+class MessageLogConflictError(RuntimeError):
+    """
+    Raised when other messages were appended at the same positions of a thread's
+    message log, e.g. by another worker running the same thread.
+    """
+
+
+class PostgresCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    A LangGraph checkpointer that stores checkpoints in Postgres.
+
+    It writes through the application's pooled SQLAlchemy sessions into the
+    `langgraph_checkpoints` and `langgraph_writes` tables managed by Alembic.
+    A checkpoint is saved after every step of the graph, keyed by the thread id
+    in the `configurable` section of the run config.
+
+    The `messages` channel of the root graph is kept out of the checkpoints.
+    Messages are appended to the `langgraph_messages` log instead, so a checkpoint
+    only writes the messages added since the previous one and stores the length
+    of the history it refers to. This relies on messages being append-only, as
+    they are with the `operator.add` reducer of BaseState.
+
+    If another worker appended different messages to the same thread in the
+    meantime, the checkpoints of the run are not saved and MessageLogConflictError
+    is raised, until the thread is loaded again.
+
+    Threads that are not cached are loaded with only their last `resume_window`
+    messages, as a MessageHistory that pages in older messages on demand.
+
+    Only the async interface is supported.
+
+    Args:
+        async_session (sessionmaker): Factory for async database sessions.
+        serde (Optional[SerializerProtocol]): Serializer for checkpoints, writes and messages.
+            Defaults to StateCodec.
+        message_cache_size (Optional[int]): Number of threads whose messages are kept in memory.
+            Defaults to CHECKPOINT_MESSAGE_CACHE_SIZE (128).
+        resume_window (Optional[int]): Number of most recent messages loaded for a thread
+            that is not cached. 0 loads the full history. Defaults to RESUME_MESSAGE_WINDOW (0).
+    """
+
+    def __init__(
+        self,
+        async_session: sessionmaker,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        message_cache_size: Optional[int] = None,
+        resume_window: Optional[int] = None,
+    ):
+        super().__init__(serde=serde or StateCodec())
+        self.async_session = async_session
+        if message_cache_size is None:
+            message_cache_size = int(
+                os.getenv("CHECKPOINT_MESSAGE_CACHE_SIZE", "128"))
+        if resume_window is None:
+            resume_window = int(os.getenv("RESUME_MESSAGE_WINDOW", "0"))
+        self.message_cache_size = message_cache_size
+        self.resume_window = resume_window
+        # Persisted messages of recently used threads, in log order
+        self._messages: OrderedDict[str, MessageHistory] = OrderedDict()
+        # Threads whose messages diverged from the log, until they are loaded again
+        self._conflicts: Set[str] = set()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stmt = select(LangGraphCheckpoint).where(
+            LangGraphCheckpoint.thread_id == thread_id,
+            LangGraphCheckpoint.checkpoint_ns == checkpoint_ns,
+        )
+        if checkpoint_id := get_checkpoint_id(config):
+            stmt = stmt.where(
+                LangGraphCheckpoint.checkpoint_id == checkpoint_id)
+        else:
+            # Checkpoint ids are time ordered
+            stmt = stmt.order_by(
+                LangGraphCheckpoint.checkpoint_id.desc()).limit(1)
+
+        async with self.async_session() as session:
+            row = (await session.execute(stmt)).scalars().first()
+            if row is None:
+                return None
+            return await self._to_tuple(session, row)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        stmt = select(LangGraphCheckpoint)
+        if config:
+            stmt = stmt.where(LangGraphCheckpoint.thread_id ==
+                              config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                stmt = stmt.where(
+                    LangGraphCheckpoint.checkpoint_ns == checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                stmt = stmt.where(
+                    LangGraphCheckpoint.checkpoint_id == checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            stmt = stmt.where(
+                LangGraphCheckpoint.checkpoint_id < before_checkpoint_id)
+        stmt = stmt.order_by(LangGraphCheckpoint.checkpoint_id.desc())
+        # Metadata is stored serialized, so the filter is applied after loading
+        if limit is not None and not filter:
+            stmt = stmt.limit(limit)
+
+        async with self.async_session() as session:
+            rows = (await session.execute(stmt)).scalars().all()
+            for row in rows:
+                if limit is not None and limit <= 0:
+                    break
+                checkpoint_tuple = await self._to_tuple(session, row)
+                if filter and not all(
+                    checkpoint_tuple.metadata.get(key) == value
+                    for key, value in filter.items()
+                ):
+                    continue
+                if limit is not None:
+                    limit -= 1
+                yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)
+        messages = c["channel_values"].get("messages")
+        externalize_messages = checkpoint_ns == "" and isinstance(
+            messages, list)
+        if externalize_messages:
+            c["channel_values"] = {
+                k: v for k, v in c["channel_values"].items() if k != "messages"}
+            c[MESSAGES_LEN_KEY] = messages.total if isinstance(
+                messages, MessageHistory) else len(messages)
+        checkpoint_type, checkpoint_data = self.serde.dumps_typed(c)
+        metadata_type, metadata_data = self.serde.dumps_typed(metadata)
+        values = dict(
+            parent_checkpoint_id=config["configurable"].get("checkpoint_id"),
+            type=checkpoint_type,
+            checkpoint=checkpoint_data,
+            metadata_type=metadata_type,
+            metadata_=metadata_data,
+        )
+        stmt = insert(LangGraphCheckpoint).values(
+            thread_id=thread_id,
+            checkpoint_ns=checkpoint_ns,
+            checkpoint_id=checkpoint["id"],
+            **values,
+        ).on_conflict_do_update(
+            index_elements=['thread_id', 'checkpoint_ns', 'checkpoint_id'],
+            set_={("metadata" if k == "metadata_" else k): v for k, v in values.items()},
+        )
+        with DB_SAVE_DURATION.labels(*get_run_labels(config), "checkpoint").time():
+            async with self.async_session() as session:
+                if externalize_messages:
+                    await self._append_messages(session, thread_id, messages)
+                await session.execute(stmt)
+                await session.commit()
+        if externalize_messages:
+            self._cache_messages(thread_id, messages)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        if not writes:
+            return
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_data = self.serde.dumps_typed(value)
+            rows.append(dict(
+                thread_id=config["configurable"]["thread_id"],
+                checkpoint_ns=config["configurable"].get("checkpoint_ns", ""),
+                checkpoint_id=config["configurable"]["checkpoint_id"],
+                task_id=task_id,
+                idx=WRITES_IDX_MAP.get(channel, idx),
+                channel=channel,
+                type=value_type,
+                value=value_data,
+            ))
+        stmt = insert(LangGraphWrite).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['thread_id', 'checkpoint_ns',
+                            'checkpoint_id', 'task_id', 'idx'],
+            set_=dict(channel=stmt.excluded.channel,
+                      type=stmt.excluded.type, value=stmt.excluded.value),
+        )
+        with DB_SAVE_DURATION.labels(*get_run_labels(config), "writes").time():
+            async with self.async_session() as session:
+                await session.execute(stmt)
+                await session.commit()
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    async def _to_tuple(self, session: AsyncSession, row: LangGraphCheckpoint) -> CheckpointTuple:
+        writes = await self._load_writes(session, row, row.checkpoint_id)
+        sends = []
+        parent_config = None
+        if row.parent_checkpoint_id:
+            sends = [
+                value for _, channel, value in await self._load_writes(session, row, row.parent_checkpoint_id)
+                if channel == TASKS
+            ]
+            parent_config = {
+                "configurable": {
+                    "thread_id": row.thread_id,
+                    "checkpoint_ns": row.checkpoint_ns,
+                    "checkpoint_id": row.parent_checkpoint_id,
+                }
+            }
+        checkpoint = self.serde.loads_typed((row.type, row.checkpoint))
+        if MESSAGES_LEN_KEY in checkpoint:
+            checkpoint["channel_values"]["messages"] = await self._load_messages(
+                session, row.thread_id, checkpoint.pop(MESSAGES_LEN_KEY))
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": row.thread_id,
+                    "checkpoint_ns": row.checkpoint_ns,
+                    "checkpoint_id": row.checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "pending_sends": sends,
+            },
+            metadata=self.serde.loads_typed(
+                (row.metadata_type, row.metadata_)),
+            parent_config=parent_config,
+            pending_writes=writes,
+        )
+
+    async def _load_writes(self, session: AsyncSession, row: LangGraphCheckpoint, checkpoint_id: str):
+        stmt = select(LangGraphWrite).where(
+            LangGraphWrite.thread_id == row.thread_id,
+            LangGraphWrite.checkpoint_ns == row.checkpoint_ns,
+            LangGraphWrite.checkpoint_id == checkpoint_id,
+        ).order_by(LangGraphWrite.task_id, LangGraphWrite.idx)
+        return [
+            (write.task_id, write.channel,
+             self.serde.loads_typed((write.type, write.value)))
+            for write in (await session.execute(stmt)).scalars().all()
+        ]
+
+    async def aload_messages(self, thread_id: str, start: int, end: int) -> List[Any]:
+        """
+        Load the messages in the range [start, end) of a thread's message log.
+        """
+        stmt = select(LangGraphMessage).where(
+            LangGraphMessage.thread_id == thread_id,
+            LangGraphMessage.seq >= start,
+            LangGraphMessage.seq < end,
+        ).order_by(LangGraphMessage.seq)
+        async with self.async_session() as session:
+            return await self._select_messages(session, stmt)
+
+    async def _select_messages(self, session: AsyncSession, stmt) -> List[Any]:
+        return [
+            self.serde.loads_typed((row.type, row.payload))
+            for row in (await session.execute(stmt)).scalars().all()
+        ]
+
+    async def _append_messages(self, session: AsyncSession, thread_id: str, messages: List[Any]):
+        """
+        Insert the messages that are not in the message log yet.
+
+        Raises:
+            MessageLogConflictError: If the log holds other messages at the same positions.
+        """
+        if thread_id in self._conflicts:
+            raise MessageLogConflictError(
+                f"The messages of thread {thread_id} diverged from its message log")
+        offset = messages.offset if isinstance(messages, MessageHistory) else 0
+        cached = self._messages.get(thread_id)
+        if cached is not None:
+            persisted = cached.total
+        else:
+            persisted = (await session.execute(
+                select(func.count()).select_from(LangGraphMessage).where(
+                    LangGraphMessage.thread_id == thread_id)
+            )).scalar_one()
+        persisted = max(persisted, offset)
+        rows = []
+        for seq, message in enumerate(messages[persisted - offset:], start=persisted):
+            message_type, payload = self.serde.dumps_typed(message)
+            rows.append(dict(thread_id=thread_id, seq=seq,
+                        type=message_type, payload=payload))
+        inserted = set()
+        if rows:
+            inserted = set((await session.execute(
+                insert(LangGraphMessage).values(rows).on_conflict_do_nothing().returning(LangGraphMessage.seq)
+            )).scalars().all())
+        # Another worker may have appended the same messages already
+        expected = {row["seq"]: (row["type"], row["payload"]) for row in rows if row["seq"] not in inserted}
+        if cached is None and offset < persisted <= offset + len(messages):
+            # Without the cached messages, check that the log continues the same history
+            expected[persisted - 1] = self.serde.dumps_typed(messages[persisted - 1 - offset])
+        if not expected:
+            return
+        stored = await session.execute(
+            select(LangGraphMessage.seq, LangGraphMessage.type, LangGraphMessage.payload).where(
+                LangGraphMessage.thread_id == thread_id,
+                LangGraphMessage.seq.in_(list(expected)),
+            ))
+        if any(expected[seq] != (message_type, payload) for seq, message_type, payload in stored):
+            # The rest of the run builds on the diverged messages, so none of it is saved
+            self._messages.pop(thread_id, None)
+            self._conflicts.add(thread_id)
+            raise MessageLogConflictError(
+                f"Other messages were appended to thread {thread_id} from seq {min(expected)}")
+
+    async def _load_messages(self, session: AsyncSession, thread_id: str, count: int) -> MessageHistory:
+        """
+        Get the history of the first `count` messages of a thread.
+
+        Only the messages that are not cached are read. Without a cache, only the
+        last `resume_window` messages are read and the older ones are left to be
+        paged in by MessageHistory.load_older.
+        """
+        self._conflicts.discard(thread_id)
+        messages = self._messages.get(thread_id)
+        if messages is None or not messages.offset <= count:
+            start = max(0, count - self.resume_window) if self.resume_window else 0
+            messages = MessageHistory(offset=start)
+        if messages.total < count:
+            stmt = select(LangGraphMessage).where(
+                LangGraphMessage.thread_id == thread_id,
+                LangGraphMessage.seq >= messages.total,
+                LangGraphMessage.seq < count,
+            ).order_by(LangGraphMessage.seq)
+            messages = messages + await self._select_messages(session, stmt)
+            # Don't start the window with tool results of a cut off tool call
+            while messages and messages.offset > 0 and getattr(messages[0], "type", None) == "tool":
+                messages = MessageHistory(messages[1:], messages.offset + 1)
+            self._cache_messages(thread_id, messages)
+        return MessageHistory(
+            messages[:count - messages.offset],
+            messages.offset,
+            functools.partial(self.aload_messages, thread_id),
+        )
+
+    def _cache_messages(self, thread_id: str, messages: List[Any]):
+        if not isinstance(messages, MessageHistory):
+            messages = MessageHistory(messages)
+        cached = self._messages.get(thread_id)
+        if cached is None or messages.total >= cached.total:
+            # Loader is not kept in the cache
+            self._messages[thread_id] = MessageHistory(messages, messages.offset)
+        self._messages.move_to_end(thread_id)
+        while len(self._messages) > self.message_cache_size:
+            self._messages.popitem(last=False)
@@ -0,0 +1,81 @@
+import os
+from typing import Dict, Optional
+from chainlit.logger import logger
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def get_pg_url() -> str:
+    return f"postgresql+asyncpg://{os.getenv('POSTGRES_USER', 'postgres')}:{os.getenv('POSTGRES_PASSWORD', 'postgres')}@{os.getenv('POSTGRES_HOST', 'localhost')}:{os.getenv('POSTGRES_PORT', '5432')}/{os.getenv('POSTGRES_DB', 'postgres')}"
+
+
+_engine: Optional[AsyncEngine] = None
+_async_session: Optional[sessionmaker] = None
+
+
+def get_engine() -> AsyncEngine:
+    """
+    Get the process-wide async engine, creating it on first use.
+
+    The connection pool is configured from the environment:
+        POSTGRES_POOL_SIZE: Number of connections kept open in the pool.
+        POSTGRES_MAX_OVERFLOW: Extra connections allowed above the pool size under load.
+        POSTGRES_POOL_TIMEOUT: Seconds to wait for a connection before giving up.
+        POSTGRES_POOL_RECYCLE: Seconds after which a connection is replaced.
+        POSTGRES_POOL_PRE_PING: Test connections for liveness on checkout.
+        POSTGRES_STATEMENT_CACHE_SIZE: Size of the asyncpg prepared statement cache per connection.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            get_pg_url(),
+            pool_size=int(os.getenv("POSTGRES_POOL_SIZE", "10")),
+            max_overflow=int(os.getenv("POSTGRES_MAX_OVERFLOW", "20")),
+            pool_timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("POSTGRES_POOL_RECYCLE", "1800")),
+            pool_pre_ping=os.getenv(
+                "POSTGRES_POOL_PRE_PING", "true").lower() == "true",
+            connect_args={
+                "prepared_statement_cache_size": int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", "100")),
+            },
+        )
+        logger.info(f"Created database engine with pool: {_engine.pool.status()}")
+    return _engine
+
+
+def get_async_session() -> sessionmaker:
+    """
+    Get the process-wide session factory bound to the shared engine.
+    """
+    global _async_session
+    if _async_session is None:
+        _async_session = sessionmaker(
+            get_engine(), class_=AsyncSession, expire_on_commit=False)
+    return _async_session
+
+
+async def dispose_engine():
+    """
+    Close all pooled connections. Called when the application shuts down.
+    """
+    global _engine, _async_session
+    if _engine is not None:
+        await _engine.dispose()
+        logger.info("Database engine disposed")
+    _engine = None
+    _async_session = None
+
+
+def get_pool_stats() -> Dict[str, int]:
+    """
+    Get the current connection pool usage for monitoring.
+    """
+    if _engine is None:
+        return {}
+    pool = _engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
@@ -0,0 +1,158 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from PIL import Image, ImageOps
+
+
+class ImageProfile:
+    """
+    What the models of a family make use of in an image.
+
+    Attributes:
+        max_side (int): Longest side in pixels, larger images are downsized.
+        max_short_side (Optional[int]): Shortest side in pixels, if the models also cap it.
+        low_detail_side (Optional[int]): Side in pixels up to which an image is sent with low detail,
+            for the models that take a detail level. Larger images are sent with high detail.
+        mime_types (Tuple[str, ...]): Formats the models take, others are converted.
+    """
+
+    def __init__(
+        self,
+        max_side: int,
+        max_short_side: Optional[int] = None,
+        low_detail_side: Optional[int] = None,
+        mime_types: Tuple[str, ...] = ("image/jpeg", "image/png"),
+    ):
+        self.max_side = max_side
+        self.max_short_side = max_short_side
+        self.low_detail_side = low_detail_side
+        self.mime_types = mime_types
+
+
+# Image profiles by provider, from the image sizes documented by the providers
+IMAGE_PROFILES = {
+    # High detail images are scaled to fit 2048x2048, then to a shortest side of 768
+    "openai": ImageProfile(2048, max_short_side=768, low_detail_side=512,
+                           mime_types=("image/jpeg", "image/png", "image/webp", "image/gif")),
+    "xai": ImageProfile(2048, max_short_side=768, low_detail_side=512),
+    "groq": ImageProfile(2048, max_short_side=768),
+    "anthropic": ImageProfile(1568, mime_types=("image/jpeg", "image/png", "image/webp", "image/gif")),
+    "google": ImageProfile(3072, mime_types=("image/jpeg", "image/png", "image/webp")),
+    # Vision encoders of local models work on a few hundred pixels
+    "ollama": ImageProfile(1024),
+}
+DEFAULT_IMAGE_PROFILE = ImageProfile(2048)
+
+# Quality of the images recompressed as JPEG
+JPEG_QUALITY = 85
+
+EXIF_ORIENTATION = 0x0112
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_image_profile(model: str) -> Tuple[str, ImageProfile]:
+    """
+    Get the name and image profile of the family of a model.
+
+    Args:
+        model (str): The model name with its provider prefix, e.g. "(openai)gpt-4o".
+    """
+    family = model[1:model.index(")")] if model.startswith(
+        "(") and ")" in model else ""
+    if family in IMAGE_PROFILES:
+        return family, IMAGE_PROFILES[family]
+    return "default", DEFAULT_IMAGE_PROFILE
+
+
+def get_detail(size: Tuple[int, int], profile: ImageProfile) -> Optional[str]:
+    """
+    Get the detail level to send an image of the given size with, or None if the models don't take one.
+    """
+    if profile.low_detail_side is None:
+        return None
+    return "low" if max(size) <= profile.low_detail_side else "high"
+
+
+def get_image_size(data: bytes) -> Tuple[int, int]:
+    """
+    Get the size of an image from its header, without decoding it.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        return image.size
+
+
+def get_target_size(size: Tuple[int, int], profile: ImageProfile) -> Tuple[int, int]:
+    width, height = size
+    scale = min(1.0, profile.max_side / max(width, height))
+    if profile.max_short_side is not None:
+        scale = min(scale, profile.max_short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def preprocess_image(data: bytes, profile: ImageProfile) -> Tuple[bytes, str, Optional[str]]:
+    """
+    Downsize an image to what the models of a profile make use of.
+
+    Images that are small enough and in a format the models take are kept as
+    they are. Others are resized, and saved as PNG if they have transparency,
+    or as JPEG otherwise.
+
+    Returns:
+        Tuple[bytes, str, Optional[str]]: The image, its mime type and its detail level.
+
+    Raises:
+        ValueError: If the data is not an image.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        mime = Image.MIME.get(image.format or "")
+        # Not all models apply the orientation of photos
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        if rotated:
+            image = ImageOps.exif_transpose(image)
+        size = get_target_size(image.size, profile)
+        detail = get_detail(size, profile)
+        if size == image.size and mime in profile.mime_types and not rotated:
+            return data, mime, detail
+        return (*_encode(image, size), detail)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Not a supported image: {e}") from e
+
+
+def _encode(image: Image.Image, size: Tuple[int, int]) -> Tuple[bytes, str]:
+    # Only the first frame of animations is kept
+    if size != image.size:
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        image.save(output, format="PNG", optimize=True)
+        return output.getvalue(), "image/png"
+    image.convert("RGB").save(output, format="JPEG",
+                              quality=JPEG_QUALITY, optimize=True)
+    return output.getvalue(), "image/jpeg"
+
+
+def get_image_executor() -> ThreadPoolExecutor:
+    """
+    Get the workers that process images, as many as IMAGE_PROCESSING_WORKERS (4).
+
+    Pillow releases the GIL while decoding, resizing and encoding, so threads
+    process images in parallel without blocking the event loop.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("IMAGE_PROCESSING_WORKERS", "4")),
+            thread_name_prefix="image_processing")
+    return _executor
+
+
+async def apreprocess_image(data: bytes, profile: ImageProfile) -> Tuple[bytes, str, Optional[str]]:
+    """
+    Downsize an image in the image workers, see `preprocess_image`.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_image_executor(), preprocess_image, data, profile)
@@ -0,0 +1,206 @@
+import asyncio
+import base64
+import hashlib
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from chainlit.logger import logger
+from langchain_core.messages import BaseMessage
+from .cache import Cache
+from .image_processing import ImageProfile, apreprocess_image, get_detail, get_image_profile, get_image_size
+from .storage_client import MinIOStorageClient, get_storage_client
+
+# Scheme of the image URLs that refer to an object of the image store
+IMAGE_REF_SCHEME = "object://"
+
+
+def get_image_url(block: Any) -> Optional[str]:
+    """
+    Get the URL of an image content block, or None if the block is not an image.
+    """
+    if not isinstance(block, dict) or block.get("type") != "image_url":
+        return None
+    image_url = block.get("image_url")
+    return image_url.get("url") if isinstance(image_url, dict) else image_url
+
+
+def to_data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+class ImageStore:
+    """
+    Images of the messages, stored once in object storage under the SHA-256 of their content.
+
+    Messages only hold a reference to their images, e.g.
+    object://images/<sha256>, so the size of the graph state does not grow
+    with the images. The references are resolved when a model is called, to a
+    variant of the image preprocessed for the family of the model (see
+    `preprocess_image`): a presigned URL for the providers that fetch images
+    themselves, if `presigned_urls` is set, and an inline data URL otherwise.
+
+    The variants are stored next to the images, under
+    image_variants/<sha256>/<family>, and the recently used ones are kept in
+    memory, so an image is only processed once per model family.
+
+    If the object storage is not available, images are inlined in the message.
+
+    Args:
+        storage_client (Optional[MinIOStorageClient]): The object storage. Defaults to the process-wide client.
+        presigned_urls (Optional[bool]): Whether to pass presigned URLs to the providers that accept URLs,
+            which must be able to reach the object storage. Defaults to IMAGE_PRESIGNED_URLS (false).
+        url_expiry (Optional[int]): Seconds the presigned URLs are valid. Defaults to IMAGE_URL_EXPIRY (3600).
+        cache_size (Optional[int]): Number of images and variants kept in memory.
+            Defaults to IMAGE_CACHE_SIZE (32).
+    """
+
+    def __init__(
+        self,
+        storage_client: Optional[MinIOStorageClient] = None,
+        presigned_urls: Optional[bool] = None,
+        url_expiry: Optional[int] = None,
+        cache_size: Optional[int] = None,
+    ):
+        if presigned_urls is None:
+            presigned_urls = os.getenv(
+                "IMAGE_PRESIGNED_URLS", "false").lower() == "true"
+        if url_expiry is None:
+            url_expiry = int(os.getenv("IMAGE_URL_EXPIRY", "3600"))
+        if cache_size is None:
+            cache_size = int(os.getenv("IMAGE_CACHE_SIZE", "32"))
+        self._storage_client = storage_client
+        self.presigned_urls = presigned_urls
+        self.url_expiry = url_expiry
+        self._originals = Cache("image_originals", max_size=cache_size)
+        self._variants = Cache("image_variants", max_size=cache_size)
+
+    @property
+    def storage_client(self) -> MinIOStorageClient:
+        if self._storage_client is None:
+            self._storage_client = get_storage_client()
+        return self._storage_client
+
+    async def put(self, data: bytes, mime: str) -> str:
+        """
+        Store an image, if it is not stored yet, and get the URL that refers to it in a message.
+        """
+        key = f"images/{hashlib.sha256(data).hexdigest()}"
+        if not await self.storage_client.upload_file(key, data, mime, overwrite=False):
+            logger.warning(
+                "Failed to store the image, inlining it in the message")
+            return to_data_url(data, mime)
+        # The image is likely sent to a model right away
+        self._originals.set(key, (data, mime))
+        return IMAGE_REF_SCHEME + key
+
+    async def resolve(self, url: str, model: str = "", accepts_urls: bool = False) -> Optional[Dict[str, str]]:
+        """
+        Get the image URL to pass to a model for an image URL of a message, or None if the image is not available.
+
+        Args:
+            url (str): The URL of the image in the message.
+            model (str): The model name with its provider prefix, e.g. "(openai)gpt-4o".
+            accepts_urls (bool): Whether the model fetches images from URLs itself.
+
+        Returns:
+            Optional[Dict[str, str]]: The `image_url` of the content block, with the detail level
+                of the image for the models that take one.
+        """
+        family, profile = get_image_profile(model)
+        if url.startswith(IMAGE_REF_SCHEME):
+            key = url[len(IMAGE_REF_SCHEME):]
+            digest = key.rsplit("/", 1)[-1]
+
+            async def load_original() -> Tuple[bytes, str]:
+                return await self._originals.aget(key, lambda: self._download(key))
+        elif url.startswith("data:"):
+            # Inlined while the object storage was not available
+            header, _, encoded = url.partition(",")
+            original = base64.b64decode(encoded), header[len("data:"):].split(";")[0]
+            key = None
+            digest = hashlib.sha256(original[0]).hexdigest()
+
+            async def load_original() -> Tuple[bytes, str]:
+                return original
+        else:
+            return {"url": url}
+
+        try:
+            variant = await self._variants.aget(
+                f"{digest}/{family}", lambda: self._load_variant(digest, family, profile, load_original, key is not None))
+        except FileNotFoundError as e:
+            logger.warning(f"Failed to load the image: {e}")
+            return None
+        image_url = {"url": variant["data_url"]}
+        if accepts_urls and self.presigned_urls and variant["key"]:
+            presigned_url = self.storage_client.get_presigned_url(
+                variant["key"], self.url_expiry)
+            if presigned_url:
+                image_url["url"] = presigned_url
+        if variant["detail"]:
+            image_url["detail"] = variant["detail"]
+        return image_url
+
+    async def _download(self, key: str) -> Tuple[bytes, str]:
+        loaded = await self.storage_client.download_file(key)
+        if loaded is None:
+            raise FileNotFoundError(key)
+        return loaded
+
+    async def _load_variant(
+        self, digest: str, family: str, profile: ImageProfile,
+        load_original: Callable[[], Awaitable[Tuple[bytes, str]]], stored: bool,
+    ) -> Dict[str, Any]:
+        """
+        Get the variant of an image for a model family, processing it if it is not stored yet.
+        """
+        key = f"image_variants/{digest}/{family}" if stored else None
+        loaded = await self.storage_client.download_file(key) if key else None
+        if loaded is not None:
+            data, mime = loaded
+            try:
+                detail = get_detail(get_image_size(data), profile)
+            except OSError:
+                detail = None
+        else:
+            original, original_mime = await load_original()
+            try:
+                data, mime, detail = await apreprocess_image(original, profile)
+            except ValueError as e:
+                logger.warning(f"Failed to process the image, sending it as is: {e}")
+                data, mime, detail = original, original_mime, None
+            if key and not await self.storage_client.upload_file(key, data, mime):
+                key = None
+        return {"key": key, "data_url": to_data_url(data, mime), "detail": detail}
+
+    async def resolve_messages(
+        self, messages: Sequence[BaseMessage], model: str = "", accepts_urls: bool = False
+    ) -> List[BaseMessage]:
+        """
+        Replace the images of messages with the variants to pass to a model.
+
+        Args:
+            messages (Sequence[BaseMessage]): The messages, which are not modified.
+            model (str): The model name with its provider prefix, e.g. "(openai)gpt-4o".
+            accepts_urls (bool): Whether the model fetches images from URLs itself.
+        """
+        return list(await asyncio.gather(*[self._resolve_message(message, model, accepts_urls)
+                                           for message in messages]))
+
+    async def _resolve_message(self, message: BaseMessage, model: str, accepts_urls: bool) -> BaseMessage:
+        if not isinstance(message.content, list) or not any(get_image_url(block) for block in message.content):
+            return message
+        content = []
+        for block in message.content:
+            url = get_image_url(block)
+            if url is None:
+                content.append(block)
+                continue
+            resolved = await self.resolve(url, model, accepts_urls)
+            if resolved is None:
+                content.append(
+                    {"type": "text", "text": "[The image is no longer available]"})
+            else:
+                image_url = block["image_url"]
+                content.append({**block, "image_url": {**image_url, **resolved}
+                                if isinstance(image_url, dict) else resolved})
+        return message.model_copy(update={"content": content})
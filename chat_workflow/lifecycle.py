@@ -0,0 +1,90 @@
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+from chainlit.logger import logger
+from chainlit.server import app
+from fastapi import FastAPI
+
+Hook = Callable[[], Awaitable[None]]
+
+# Hooks are keyed by qualified name so that re-running app.py (e.g. `--watch`)
+# replaces a hook instead of registering it twice.
+_startup_hooks: Dict[str, Hook] = {}
+_shutdown_hooks: Dict[str, Hook] = {}
+
+
+def _hook_key(func: Hook) -> str:
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def on_app_startup(func: Hook) -> Hook:
+    """
+    Register a coroutine to run once when the Chainlit server starts.
+    """
+    _startup_hooks[_hook_key(func)] = func
+    return func
+
+
+def on_app_shutdown(func: Hook) -> Hook:
+    """
+    Register a coroutine to run once when the Chainlit server shuts down.
+
+    Shutdown hooks run in reverse registration order, so resources registered
+    first (e.g. the database engine) are released last.
+    """
+    _shutdown_hooks[_hook_key(func)] = func
+    return func
+
+
+async def _run_hooks(hooks: List[Hook], stage: str):
+    for hook in hooks:
+        try:
+            await hook()
+        except Exception as e:
+            logger.error(f"Error running {stage} hook {_hook_key(hook)}: {e}")
+
+
+def add_route(path: str, endpoint: Callable, methods: Optional[List[str]] = None):
+    """
+    Mount an endpoint on the Chainlit server.
+
+    Chainlit registers a catch-all route to serve the UI, so the new route is
+    moved in front of it to make sure it is reachable.
+
+    Args:
+        path (str): The path of the route.
+        endpoint (Callable): The endpoint.
+        methods (Optional[List[str]]): The HTTP methods of the route. Defaults to GET.
+    """
+    if methods is None:
+        methods = ["GET"]
+    app.router.routes = [
+        route for route in app.router.routes if getattr(route, "path", None) != path]
+    app.add_api_route(path, endpoint, methods=methods)
+    app.router.routes.insert(0, app.router.routes.pop())
+
+
+def _install_lifespan():
+    """
+    Wrap the Chainlit lifespan with the registered startup and shutdown hooks.
+
+    Chainlit force-exits the process at the end of its own lifespan, so the
+    shutdown hooks have to run inside it.
+    """
+    if getattr(app.router, "_chat_workflow_lifespan", False):
+        return
+    chainlit_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        async with chainlit_lifespan(app):
+            await _run_hooks(list(_startup_hooks.values()), "startup")
+            try:
+                yield
+            finally:
+                await _run_hooks(list(reversed(_shutdown_hooks.values())), "shutdown")
+
+    app.router.lifespan_context = lifespan
+    app.router._chat_workflow_lifespan = True
+
+
+_install_lifespan()
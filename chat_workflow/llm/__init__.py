@@ -1,17 +1,39 @@
 import os
 from typing import List, Optional
 from langchain_core.language_models.chat_models import BaseChatModel
+from .catalog import ModelCatalog
 from .factory import LLMFactory
+from .scheduler import LLMOverloadedError, LLMScheduler  # noqa
+from .single_flight import SingleFlight
+from .response_cache import ResponseCache
+from ..database import get_async_session
 from .capabilities import ModelCapability  # noqa
-from .providers import OllamaProvider, OpenAIProvider, AnthropicProvider, XAIProvider, GroqProvider, GoogleProvider
 
 # Initialize factory
-llm_factory = LLMFactory()
-# Register providers
-llm_factory.register_provider(
-    "ollama", OllamaProvider(os.getenv("OLLAMA_URL")))
-llm_factory.register_provider("openai", OpenAIProvider())
-llm_factory.register_provider("anthropic", AnthropicProvider())
-llm_factory.register_provider("xai", XAIProvider())
-llm_factory.register_provider("groq", GroqProvider())
-llm_factory.register_provider("google", GoogleProvider())
+llm_response_cache = None
+if os.getenv("LLM_RESPONSE_CACHE", "false").lower() == "true":
+    llm_response_cache = ResponseCache(
+        async_session=get_async_session()
+        if os.getenv("LLM_RESPONSE_CACHE_POSTGRES", "false").lower() == "true" else None)
+llm_factory = LLMFactory(
+    LLMScheduler(),
+    SingleFlight() if os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true" else None,
+    llm_response_cache,
+)
+# Register providers, imported on first use or when their credentials are set
+llm_factory.register_lazy_provider(
+    "ollama", "chat_workflow.llm.providers.ollama:OllamaProvider", base_url=os.getenv("OLLAMA_URL"))
+llm_factory.register_lazy_provider(
+    "openai", "chat_workflow.llm.providers.openai:OpenAIProvider", ["OPENAI_API_KEY"])
+llm_factory.register_lazy_provider(
+    "anthropic", "chat_workflow.llm.providers.anthropic:AnthropicProvider", ["ANTHROPIC_API_KEY"])
+llm_factory.register_lazy_provider(
+    "xai", "chat_workflow.llm.providers.xai:XAIProvider", ["XAI_API_KEY"])
+llm_factory.register_lazy_provider(
+    "groq", "chat_workflow.llm.providers.groq:GroqProvider", ["GROQ_API_KEY"])
+llm_factory.register_lazy_provider(
+    "google", "chat_workflow.llm.providers.google:GoogleProvider", ["GOOGLE_API_KEY"])
+llm_factory.register_lazy_provider(
+    "stub", "chat_workflow.llm.providers.stub:StubProvider", ["STUB_LLM_ENABLED"])
+
+model_catalog = ModelCatalog(llm_factory)
@@ -0,0 +1,152 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Set
+from chainlit.logger import logger
+from .capabilities import ModelCapability
+from .factory import LLMFactory
+from .providers.base import LLMProvider
+from ..cache import Cache, DiskCacheTier, get_or_load
+
+
+class ModelCatalog:
+    """
+    The models of all providers, indexed by capability.
+
+    The providers are queried concurrently, each within `timeout` seconds, and
+    providers without credentials are skipped. A provider that fails keeps its
+    models of the last refresh. The catalog is refreshed every
+    `refresh_interval` seconds in the background once started, and saved in
+    `cache_dir` for `max_age` seconds, so that a restart with the same
+    configured providers lists the models of the last run at once.
+
+    Args:
+        factory (LLMFactory): The factory whose providers are listed.
+        refresh_interval (Optional[float]): Seconds between refreshes.
+            Defaults to MODEL_CATALOG_REFRESH_INTERVAL (300).
+        timeout (Optional[float]): Seconds to wait for the models of a provider.
+            Defaults to MODEL_CATALOG_TIMEOUT (10).
+        cache_dir (Optional[str]): Directory of the saved catalog, empty to keep it in memory only.
+            Defaults to CACHE_DIR (~/.cache/chainlit-langgraph).
+        max_age (Optional[float]): Seconds after which the saved catalog is no longer listed.
+            Defaults to MODEL_CATALOG_MAX_AGE (86400).
+    """
+
+    def __init__(
+        self,
+        factory: LLMFactory,
+        refresh_interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        cache_dir: Optional[str] = None,
+        max_age: Optional[float] = None,
+    ):
+        if refresh_interval is None:
+            refresh_interval = float(
+                os.getenv("MODEL_CATALOG_REFRESH_INTERVAL", "300"))
+        if timeout is None:
+            timeout = float(os.getenv("MODEL_CATALOG_TIMEOUT", "10"))
+        if max_age is None:
+            max_age = float(os.getenv("MODEL_CATALOG_MAX_AGE", "86400"))
+        self.factory = factory
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self._cache = Cache("model_catalog", max_size=1, ttl=refresh_interval,
+                            stale_ttl=max(0, max_age - refresh_interval),
+                            tiers=[DiskCacheTier(cache_dir)] if cache_dir != "" else [])
+        self._task: Optional[asyncio.Task] = None
+
+    def list_models(self, capabilities: Optional[Set[ModelCapability]] = None) -> List[str]:
+        """
+        List the models with all the given capabilities, without waiting for the providers.
+
+        Args:
+            capabilities (Optional[Set[ModelCapability]]): The required capabilities, None for all models.
+        """
+        catalog = get_or_load(self._cache, self._key(), self._load)
+        if catalog is None:
+            return []
+        if not capabilities:
+            return list(catalog["models"])
+        index = catalog["index"]
+        return list(set.intersection(*(index.get(capability.name, set()) for capability in capabilities)))
+
+    async def wait_until_loaded(self):
+        """
+        Wait for the first load of the catalog, if it was neither loaded nor saved before.
+        """
+        try:
+            await self._cache.aget(self._key(), self._load)
+        except Exception as e:
+            logger.warning(f"Failed to load the model catalog: {e}")
+
+    async def refresh(self):
+        """
+        Query the providers now.
+        """
+        await self._cache.aset(self._key(), await self._load())
+
+    def start(self):
+        """
+        Refresh the catalog every `refresh_interval` seconds in the background.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_periodically(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Failed to refresh the model catalog: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def _configured_providers(self) -> Dict[str, LLMProvider]:
+        return {name: provider for name, provider in self.factory.providers.items()
+                if provider.is_configured}
+
+    def _key(self) -> str:
+        """
+        Key of the catalog of the configured providers, so that a catalog saved
+        with other credentials is not listed.
+        """
+        return "catalog:" + ",".join(sorted(self._configured_providers()))
+
+    async def _list_provider(self, prefix: str, provider: LLMProvider) -> Dict[str, List[str]]:
+        """
+        Get the capabilities of the models of a provider, by model id.
+        """
+        models = await asyncio.wait_for(provider.alist_models(), self.timeout)
+        capabilities = provider.capabilities
+        return {
+            f"({prefix}){model}": sorted(capability.name for capability in capabilities.get(model, set()))
+            for model in models
+        }
+
+    async def _load(self) -> Dict[str, Any]:
+        previous = self._cache.peek(self._key()) or {"providers": {}}
+        providers = self._configured_providers()
+        results = await asyncio.gather(*[self._list_provider(prefix, provider) for prefix, provider in providers.items()],
+                                       return_exceptions=True)
+        listed = {}
+        for name, result in zip(providers, results):
+            if isinstance(result, BaseException):
+                logger.warning(
+                    f"Failed to list the models of {name}: {result!r}")
+                result = previous["providers"].get(name, {})
+            listed[name] = result
+
+        models = {model: capabilities for result in listed.values()
+                  for model, capabilities in result.items()}
+        index: Dict[str, Set[str]] = {}
+        for model, capabilities in models.items():
+            for capability in capabilities:
+                index.setdefault(capability, set()).add(model)
+        return {"providers": listed, "models": models, "index": index}
@@ -1,33 +1,182 @@
-from typing import Dict, Optional, List
+import importlib
+import os
+import time
+from chainlit.logger import logger
+from collections import OrderedDict
+from typing import Any, Dict, Optional, List, Sequence, Tuple
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from .providers.base import LLMProvider
 from .capabilities import ModelCapability
+from .scheduler import LLMScheduler, ScheduledChatModel
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight, hash_request
 
 
 class LLMFactory:
-    def __init__(self):
+    """
+    Create chat models by their name with a provider prefix, e.g. "(openai)gpt-4o".
+
+    Providers registered lazily are only imported on first use, and are not
+    listed while the environment variables they require are not set, so that
+    the SDKs of unused providers are never imported.
+
+    The models of the providers are pooled by name, model and parameters, so
+    that turns reuse their clients and HTTP connections instead of creating new
+    ones. Tools are bound on top of the pooled models. The least recently used
+    models are evicted beyond `pool_size`.
+
+    Args:
+        scheduler (Optional[LLMScheduler]): Limits the concurrent calls of the models.
+        single_flight (Optional[SingleFlight]): Coalesces identical requests in flight.
+        response_cache (Optional[ResponseCache]): Caches the responses of identical requests.
+        pool_size (Optional[int]): Number of pooled models, 0 to create a model for every call.
+            Defaults to LLM_CLIENT_POOL_SIZE (64).
+    """
+
+    def __init__(
+        self,
+        scheduler: Optional[LLMScheduler] = None,
+        single_flight: Optional[SingleFlight] = None,
+        response_cache: Optional[ResponseCache] = None,
+        pool_size: Optional[int] = None,
+    ):
+        if pool_size is None:
+            pool_size = int(os.getenv("LLM_CLIENT_POOL_SIZE", "64"))
         self._providers: Dict[str, LLMProvider] = {}
+        # Import path, required environment variables and arguments of the providers not imported yet
+        self._lazy_providers: Dict[str, Tuple[str, Sequence[str], Dict[str, Any]]] = {}
+        # Seconds spent importing and creating the lazy providers
+        self.load_times: Dict[str, float] = {}
+        self._pool: OrderedDict[str, BaseChatModel] = OrderedDict()
+        self.scheduler = scheduler
+        self.single_flight = single_flight
+        self.response_cache = response_cache
+        self.pool_size = pool_size
+
+    @property
+    def providers(self) -> Dict[str, LLMProvider]:
+        """
+        The available providers, by prefix, importing the lazy ones whose environment is set.
+        """
+        for prefix, (_, required_env, _) in list(self._lazy_providers.items()):
+            if all(os.getenv(name) for name in required_env):
+                self.get_provider(prefix)
+        return dict(self._providers)
 
     def register_provider(self, prefix: str, provider: LLMProvider):
+        self._lazy_providers.pop(prefix, None)
         self._providers[prefix] = provider
+        # Pooled models may come from a provider that was replaced
+        self._pool.clear()
 
-    def create_model(self, name: str, model: str, tools: Optional[List] = None, **kwargs) -> BaseChatModel:
-        for provider_name, provider in self._providers.items():
-            prefix = f"({provider_name})"
-            if model.startswith(prefix):
-                model_name = model.replace(prefix, "")
-                if ModelCapability.TOOL_CALLING in provider.capabilities.get(model_name, set()):
-                    return provider.create_model(name, model_name, tools, **kwargs)
-                else:
-                    if tools is not None:
-                        raise ValueError(
-                            f"Model {model_name} does not support tool calling")
-                    return provider.create_model(name, model_name, **kwargs)
+    def register_lazy_provider(self, prefix: str, path: str, required_env: Sequence[str] = (), **kwargs):
+        """
+        Register a provider that is imported and created on first use.
+
+        Args:
+            prefix (str): The prefix of its models, e.g. "openai" for "(openai)gpt-4o".
+            path (str): Import path of the provider class, e.g. "chat_workflow.llm.providers.openai:OpenAIProvider".
+            required_env (Sequence[str]): Environment variables without which the provider is not listed.
+            kwargs: Arguments of the provider.
+        """
+        self._providers.pop(prefix, None)
+        self._lazy_providers[prefix] = (path, required_env, kwargs)
+        self._pool.clear()
+
+    def get_provider(self, prefix: str) -> Optional[LLMProvider]:
+        """
+        Get a provider by prefix, importing it if it was registered lazily.
+        """
+        if prefix in self._lazy_providers:
+            path, _, kwargs = self._lazy_providers.pop(prefix)
+            start = time.perf_counter()
+            module_name, class_name = path.split(":")
+            provider = getattr(importlib.import_module(module_name), class_name)(**kwargs)
+            self.load_times[prefix] = time.perf_counter() - start
+            logger.info(
+                f"Loaded the {prefix} provider in {self.load_times[prefix]:.2f}s")
+            self._providers[prefix] = provider
+        return self._providers.get(prefix)
+
+    def _split_model(self, model: str) -> Tuple[str, LLMProvider, str]:
+        """
+        Split a model name into its provider prefix, provider and model name.
+        """
+        if model.startswith("(") and ")" in model:
+            prefix, model_name = model[1:].split(")", 1)
+            provider = self.get_provider(prefix)
+            if provider is not None:
+                return prefix, provider, model_name
         raise ValueError(f"No provider found for model: {model}")
 
+    def _get_pooled_model(self, provider_name: str, name: str, model_name: str, **kwargs) -> BaseChatModel:
+        """
+        Get the model of a provider without tools, from the pool if it was created before.
+        """
+        provider = self._providers[provider_name]
+        if self.pool_size <= 0:
+            return provider.create_model(name, model_name, **kwargs)
+        key = hash_request(provider=provider_name, name=name, model=model_name,
+                           revision=provider.get_model_revision(model_name), kwargs=kwargs)
+        llm = self._pool.get(key)
+        if llm is None:
+            llm = self._pool[key] = provider.create_model(
+                name, model_name, **kwargs)
+            while len(self._pool) > self.pool_size:
+                self._pool.popitem(last=False)
+        self._pool.move_to_end(key)
+        return llm
+
+    def create_model(self, name: str, model: str, tools: Optional[List] = None, **kwargs) -> BaseChatModel:
+        provider_name, provider, model_name = self._split_model(model)
+        if tools is not None and ModelCapability.TOOL_CALLING not in provider.capabilities.get(model_name, set()):
+            raise ValueError(
+                f"Model {model_name} does not support tool calling")
+        llm = self._get_pooled_model(
+            provider_name, name, model_name, **kwargs)
+        if tools:
+            llm = llm.bind_tools(tools)
+        if self.scheduler or self.single_flight or self.response_cache:
+            return ScheduledChatModel(
+                name=name, bound=llm, scheduler=self.scheduler, single_flight=self.single_flight,
+                response_cache=self.response_cache,
+                provider=provider_name, model=model_name,
+                request_key=hash_request(
+                    model=model,
+                    tools=[convert_to_openai_tool(tool) for tool in tools or []],
+                    kwargs=kwargs))
+        return llm
+
+    def get_context_window(self, model: str) -> Optional[int]:
+        """
+        Get the context window in tokens of a model, or None if it is not known.
+
+        Args:
+            model (str): The model name with its provider prefix, e.g. "(openai)gpt-4o".
+        """
+        try:
+            _, provider, model_name = self._split_model(model)
+        except ValueError:
+            return None
+        return provider.context_windows.get(model_name)
+
+    def accepts_image_urls(self, model: str) -> bool:
+        """
+        Whether a model fetches images from URLs itself, instead of only taking inline image data.
+
+        Args:
+            model (str): The model name with its provider prefix, e.g. "(openai)gpt-4o".
+        """
+        try:
+            _, provider, _ = self._split_model(model)
+        except ValueError:
+            return False
+        return provider.accepts_image_urls
+
     def list_models(self, capabilities: Optional[set[ModelCapability]] = None) -> List[str]:
         models = []
-        for provider in self._providers.values():
+        for provider in self.providers.values():
             provider_models = provider.list_models()
             if capabilities:
                 models.extend([f"({provider.name}){model_name}" for model_name in provider_models
@@ -1,6 +1,20 @@
-from .openai import OpenAIProvider  # noqa
-from .anthropic import AnthropicProvider  # noqa
-from .ollama import OllamaProvider  # noqa
-from .xai import XAIProvider  # noqa
-from .groq import GroqProvider  # noqa
-from .google import GoogleProvider  # noqa
+import importlib
+
+# The providers are imported on first access, so that the SDKs of unused providers are not imported
+_PROVIDERS = {
+    "OpenAIProvider": ".openai",
+    "AnthropicProvider": ".anthropic",
+    "OllamaProvider": ".ollama",
+    "XAIProvider": ".xai",
+    "GroqProvider": ".groq",
+    "GoogleProvider": ".google",
+    "StubProvider": ".stub",
+}
+
+__all__ = list(_PROVIDERS)
+
+
+def __getattr__(name: str):
+    if name in _PROVIDERS:
+        return getattr(importlib.import_module(_PROVIDERS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,14 +1,100 @@
 import os
-from typing import List, Optional, Dict, Set
+from anthropic import DefaultAsyncHttpxClient, DefaultHttpxClient
+from typing import Any, List, Optional, Dict, Set
+from typing_extensions import Self
 from langchain_anthropic import ChatAnthropic
 from langchain_core.language_models.chat_models import BaseChatModel
+from pydantic import Field, model_validator
 from .base import LLMProvider
 from ..capabilities import ModelCapability
 
 
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _with_cache_control(content: Any) -> List[Dict[str, Any]]:
+    """
+    Mark the last block of a message content or system prompt as a cache breakpoint.
+    """
+    if isinstance(content, str):
+        return [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    return [*content[:-1], {**content[-1], "cache_control": CACHE_CONTROL}]
+
+
+def add_cache_breakpoints(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add prompt caching breakpoints to the payload of an Anthropic messages request.
+
+    The tool definitions and the system prompt are cached as the stable prefix
+    of every request of a workflow. The history is cached up to the latest
+    message, which the next turn reads back, and up to the previous turn's last
+    message, which this request reads. That is 4 breakpoints, the most Anthropic
+    allows. Prefixes shorter than the model's minimum are not cached.
+    """
+    if payload.get("tools"):
+        payload["tools"] = _with_cache_control(payload["tools"])
+    if payload.get("system"):
+        payload["system"] = _with_cache_control(payload["system"])
+    messages = payload.get("messages")
+    if messages:
+        previous_turns = [i for i, message in enumerate(messages[:-1])
+                          if message["role"] == "user"]
+        for i in previous_turns[-1:] + [len(messages) - 1]:
+            if messages[i]["content"]:
+                messages[i] = {**messages[i],
+                               "content": _with_cache_control(messages[i]["content"])}
+    return payload
+
+
+class SharedClientChatAnthropic(ChatAnthropic):
+    """
+    ChatAnthropic that sends its requests through the given HTTP clients.
+    """
+
+    http_client: Optional[Any] = Field(default=None, exclude=True)
+    http_async_client: Optional[Any] = Field(default=None, exclude=True)
+
+    @model_validator(mode="after")
+    def use_http_clients(self) -> Self:
+        if self.http_client is not None:
+            self._client = self._client.with_options(
+                http_client=self.http_client)
+        if self.http_async_client is not None:
+            self._async_client = self._async_client.with_options(
+                http_client=self.http_async_client)
+        return self
+
+
+class PromptCachingChatAnthropic(SharedClientChatAnthropic):
+    """
+    ChatAnthropic that caches the stable prefix of its prompts on Anthropic's side.
+    """
+
+    def _get_request_payload(self, input_: Any, *, stop: Optional[List[str]] = None, **kwargs: Dict) -> Dict:
+        return add_cache_breakpoints(super()._get_request_payload(input_, stop=stop, **kwargs))
+
+
 class AnthropicProvider(LLMProvider):
+    """
+    Provider of Anthropic models.
+
+    Args:
+        prompt_caching (Optional[bool]): Whether prompts are cached on Anthropic's side.
+            Defaults to ANTHROPIC_PROMPT_CACHING (true).
+    """
+
+    http_client_factories = (DefaultHttpxClient, DefaultAsyncHttpxClient)
+
+    def __init__(self, prompt_caching: Optional[bool] = None):
+        if prompt_caching is None:
+            prompt_caching = os.getenv(
+                "ANTHROPIC_PROMPT_CACHING", "true").lower() == "true"
+        self.prompt_caching = prompt_caching
+
     def create_model(self, name: str, model: str, tools: Optional[List] = None, **kwargs) -> BaseChatModel:
-        llm = ChatAnthropic(name=name, model=model, **kwargs)
+        chat_class = PromptCachingChatAnthropic if self.prompt_caching else SharedClientChatAnthropic
+        llm = chat_class(name=name, model=model, **{
+            **self.get_http_clients(kwargs.get("base_url")), **kwargs})
         if tools and len(tools) > 0 and ModelCapability.TOOL_CALLING in self.capabilities.get(model, set()):
             return llm.bind_tools(tools)
         return llm
@@ -25,6 +111,10 @@ class AnthropicProvider(LLMProvider):
         else:
             return []
 
+    @property
+    def is_configured(self) -> bool:
+        return bool(os.getenv("ANTHROPIC_API_KEY"))
+
     @property
     def name(self) -> str:
         return "anthropic"
@@ -35,3 +125,10 @@ class AnthropicProvider(LLMProvider):
             "claude-3-5-haiku-20241022": {ModelCapability.TEXT_TO_TEXT, ModelCapability.TOOL_CALLING, ModelCapability.STRUCTURED_OUTPUT},
             "claude-3-5-sonnet-20241022": {ModelCapability.TEXT_TO_TEXT, ModelCapability.IMAGE_TO_TEXT, ModelCapability.TOOL_CALLING, ModelCapability.STRUCTURED_OUTPUT},
         }
+
+    @property
+    def context_windows(self) -> Dict[str, int]:
+        return {
+            "claude-3-5-haiku-20241022": 200000,
+            "claude-3-5-sonnet-20241022": 200000,
+        }
@@ -1,5 +1,7 @@
+import asyncio
 from abc import ABC
-from typing import List, Optional, Dict
+from functools import cached_property
+from typing import Any, Callable, List, Optional, Dict, Tuple
 from langchain_core.language_models.chat_models import BaseChatModel
 from ..capabilities import ModelCapability, CapableModel
 
@@ -18,6 +20,33 @@ class LLMModel(BaseChatModel):
 
 
 class LLMProvider(ABC):
+    # Factories of the sync and async HTTP clients of the provider's SDK, for
+    # providers whose chat models take them as http_client and http_async_client
+    http_client_factories: Optional[Tuple[Callable[[], Any], Callable[[], Any]]] = None
+
+    @cached_property
+    def _http_clients(self) -> Dict[Optional[str], Dict[str, Any]]:
+        return {}
+
+    def get_http_clients(self, base_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        HTTP clients shared by the models of an endpoint, so that they share a connection pool.
+
+        Args:
+            base_url (Optional[str]): The endpoint of the models, or None for the provider's default.
+
+        Returns:
+            Dict[str, Any]: The http_client and http_async_client arguments of the models,
+                or no arguments if the provider has no http_client_factories.
+        """
+        if self.http_client_factories is None:
+            return {}
+        if base_url not in self._http_clients:
+            sync_factory, async_factory = self.http_client_factories
+            self._http_clients[base_url] = {
+                "http_client": sync_factory(), "http_async_client": async_factory()}
+        return self._http_clients[base_url]
+
     def create_model(self, name: str, model: str, **kwargs) -> LLMModel:
         pass
 
@@ -31,3 +60,37 @@ class LLMProvider(ABC):
     @property
     def capabilities(self) -> Dict[str, set[ModelCapability]]:
         raise NotImplementedError
+
+    async def alist_models(self) -> List[str]:
+        """
+        List the available models without blocking the event loop.
+        """
+        return list(await asyncio.to_thread(self.list_models))
+
+    @property
+    def is_configured(self) -> bool:
+        """
+        Whether the provider has the credentials it needs to list and call its models.
+        """
+        return True
+
+    @property
+    def accepts_image_urls(self) -> bool:
+        """
+        Whether the models fetch images from URLs themselves, instead of only taking inline image data.
+        """
+        return False
+
+    def get_model_revision(self, model: str) -> Optional[str]:
+        """
+        Revision of what a model is created from, e.g. its digest, or None if it is not known.
+        Pooled models are created again when it changes.
+        """
+        return None
+
+    @property
+    def context_windows(self) -> Dict[str, int]:
+        """
+        Context window in tokens of the models whose window is known.
+        """
+        return {}
@@ -22,6 +22,10 @@ class GoogleProvider(LLMProvider):
     def list_models(self) -> List[str]:
         return ["gemini-2.0-flash-exp", "gemini-1.5-pro", "gemini-1.5-flash"]
 
+    @property
+    def is_configured(self) -> bool:
+        return bool(os.getenv("GOOGLE_API_KEY"))
+
     @property
     def name(self) -> str:
         return "google"
@@ -33,3 +37,11 @@ class GoogleProvider(LLMProvider):
             "gemini-1.5-pro": {ModelCapability.TEXT_TO_TEXT, ModelCapability.IMAGE_TO_TEXT, ModelCapability.TOOL_CALLING},
             "gemini-1.5-flash": {ModelCapability.TEXT_TO_TEXT, ModelCapability.IMAGE_TO_TEXT, ModelCapability.TOOL_CALLING},
         }
+
+    @property
+    def context_windows(self) -> Dict[str, int]:
+        return {
+            "gemini-2.0-flash-exp": 1048576,
+            "gemini-1.5-pro": 2097152,
+            "gemini-1.5-flash": 1048576,
+        }
@@ -1,5 +1,6 @@
 import os
 import requests
+from groq import DefaultAsyncHttpxClient, DefaultHttpxClient
 from typing import List, Optional, Dict, Set
 from langchain_groq import ChatGroq
 from langchain_core.language_models.chat_models import BaseChatModel
@@ -8,8 +9,10 @@ from ..capabilities import ModelCapability
 
 
 class GroqProvider(LLMProvider):
+    http_client_factories = (DefaultHttpxClient, DefaultAsyncHttpxClient)
+
     def create_model(self, name: str, model: str, tools: Optional[List] = None, **kwargs) -> BaseChatModel:
-        llm = ChatGroq(name=name, model=model, **kwargs)
+        llm = ChatGroq(name=name, model=model, **{**self.get_http_clients(kwargs.get("base_url")), **kwargs})
         return llm.bind_tools(tools) if tools else llm
 
     def list_models(self) -> List[str]:
@@ -19,10 +22,18 @@ class GroqProvider(LLMProvider):
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=headers, timeout=10)
         models_data = response.json()
         return [model["id"] for model in models_data["data"]]
 
+    @property
+    def is_configured(self) -> bool:
+        return bool(os.getenv("GROQ_API_KEY"))
+
+    @property
+    def accepts_image_urls(self) -> bool:
+        return True
+
     @property
     def name(self) -> str:
         return "groq"
@@ -35,3 +46,11 @@ class GroqProvider(LLMProvider):
             "llama-3.2-90b-vision-preview": {ModelCapability.TEXT_TO_TEXT, ModelCapability.IMAGE_TO_TEXT, ModelCapability.TOOL_CALLING},
             "whisper-large-v3": {ModelCapability.AUDIO_TO_TEXT},
         }
+
+    @property
+    def context_windows(self) -> Dict[str, int]:
+        return {
+            "llama-3.2-3b-preview": 8192,
+            "llama-3.2-11b-vision-preview": 8192,
+            "llama-3.2-90b-vision-preview": 8192,
+        }
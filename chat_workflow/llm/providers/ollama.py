@@ -1,168 +1,271 @@
-import builtins
-import json
-import sys
+import asyncio
+import httpx
+import math
 import os
-import requests
-import typing
 from chainlit import logger
-from datetime import datetime, timedelta
-from functools import lru_cache
-from inspect import signature
-from typing import List, Optional, TypeVar, Dict, Any, Union, Set
-from typing import get_type_hints, get_args, get_origin
+from typing import Callable, List, Optional, Dict, Any, Tuple, Union, Set
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_ollama import ChatOllama
 from .base import LLMProvider
 from ..capabilities import ModelCapability
-
-T = TypeVar('T')
-
-
-class TimedCache:
-    """Cache with TTL support"""
-
-    def __init__(self, ttl_seconds: int = 300):
-        self.cache = {}
-        self.ttl = ttl_seconds
-
-    def get(self, key: str) -> Optional[T]:
-        if key in self.cache:
-            value, timestamp = self.cache[key]
-            if datetime.now() - timestamp < timedelta(seconds=self.ttl):
-                return value
-            del self.cache[key]
-        return None
-
-    def set(self, key: str, value: T) -> None:
-        self.cache[key] = (value, datetime.now())
-
-
-# 5 minute TTL for model list
-model_cache = TimedCache(ttl_seconds=300)
+from ...cache import Cache, DiskCacheTier, get_or_load
+
+# Keywords of the model templates that suggest a capability
+CAPABILITY_KEYWORDS = {
+    ModelCapability.TEXT_TO_TEXT: ["text", "response", "conversation", "Q&A", "template"],
+    ModelCapability.IMAGE_TO_TEXT: ["vision", "image", "CLIP", "image encoder", "patch_size", "projection_dim"],
+    ModelCapability.TOOL_CALLING: [
+        "tool", "tool_calls", "function call", "parameters",
+        "function name", "arguments", "tool calling capabilities"
+    ],
+    ModelCapability.STRUCTURED_OUTPUT: [
+        "json", "structured", "format", "parameters", "dictionary"]
+}
+
+
+def parse_str(value: str) -> str:
+    return value.strip('"\'')
+
+
+def parse_int_or_str(value: str) -> Union[int, str]:
+    try:
+        return int(value)
+    except ValueError:
+        return parse_str(value)
+
+
+def parse_str_list(value: str) -> List[str]:
+    # A single value with brackets, e.g. a stop token like "[INST]", is kept as is
+    if value.startswith('[') and value.endswith(']'):
+        return [parse_str(value)]
+    return [parse_str(element.strip()) for element in value.split(',')]
+
+
+# Parsers of the ChatOllama parameters that are not strings, by name, matching
+# the type annotations of ChatOllama. Other parameters are kept as strings.
+OLLAMA_PARAM_PARSERS: Dict[str, Callable[[str], Any]] = {
+    "mirostat": int,
+    "mirostat_eta": float,
+    "mirostat_tau": float,
+    "num_ctx": int,
+    "num_gpu": int,
+    "num_thread": int,
+    "num_predict": int,
+    "repeat_last_n": int,
+    "repeat_penalty": float,
+    "temperature": float,
+    "seed": int,
+    "stop": parse_str_list,
+    "tfs_z": float,
+    "top_k": int,
+    "top_p": float,
+    "keep_alive": parse_int_or_str,
+}
+
+
+def get_model_capabilities(metadata: dict) -> Set[ModelCapability]:
+    """
+    Infer the capabilities of a model from its /api/show metadata.
+
+    Currently Ollama doesn't have a way to query capabilities, so they are
+    guessed from the template of the model.
+    """
+    detected_capabilities = set(
+        [ModelCapability.TEXT_TO_TEXT])  # Base capability
+
+    # Check template for tool calling patterns
+    template = metadata.get("template", "").lower()
+    for capability, keywords in CAPABILITY_KEYWORDS.items():
+        if any(keyword in template for keyword in keywords):
+            detected_capabilities.add(capability)
+
+    # Check for JSON function call format in template
+    if '"name":' in template and '"parameters":' in template:
+        detected_capabilities.add(ModelCapability.TOOL_CALLING)
+        detected_capabilities.add(ModelCapability.STRUCTURED_OUTPUT)
+
+    return detected_capabilities
 
 
 class OllamaProvider(LLMProvider):
-    def __init__(self, base_url: str = "http://localhost:11434"):
-        self.base_url = base_url
+    """
+    Provider of the models of an Ollama server.
+
+    The parameters of the models, from their Modelfile, are fetched once per
+    model and digest and kept in memory, so that creating a model on a chat
+    turn does not call the server.
+
+    The models and their capabilities are discovered in the background:
+    /api/tags lists the models, and /api/show is only called for the models
+    whose digest changed, `discovery_concurrency` at a time. Requests read the
+    last discovered models and, once they are older than `refresh_interval`,
+    start a refresh without waiting for it. The discovered models are saved in
+    `cache_dir`, so that a restart starts with the models of the last run.
+
+    Args:
+        base_url (Optional[str]): URL of the Ollama server. Defaults to OLLAMA_URL (http://localhost:11434).
+        discovery_concurrency (Optional[int]): Concurrent /api/show requests of a discovery.
+            Defaults to OLLAMA_DISCOVERY_CONCURRENCY (8).
+        cache_dir (Optional[str]): Directory of the discovered models, empty to keep them in memory only.
+            Defaults to CACHE_DIR (~/.cache/chainlit-langgraph).
+        refresh_interval (Optional[float]): Seconds after which the discovered models are refreshed.
+            Defaults to OLLAMA_REFRESH_INTERVAL (300).
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        discovery_concurrency: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        refresh_interval: Optional[float] = None,
+    ):
+        if discovery_concurrency is None:
+            discovery_concurrency = int(
+                os.getenv("OLLAMA_DISCOVERY_CONCURRENCY", "8"))
+        if refresh_interval is None:
+            refresh_interval = float(
+                os.getenv("OLLAMA_REFRESH_INTERVAL", "300"))
+        self.base_url = base_url or os.getenv(
+            "OLLAMA_URL", "http://localhost:11434")
+        self.discovery_concurrency = discovery_concurrency
+        # The discovered models of the server, stale ones are kept until they are refreshed
+        self._discovery = Cache("ollama_models", max_size=1, ttl=refresh_interval, stale_ttl=math.inf,
+                                tiers=[DiskCacheTier(cache_dir)] if cache_dir != "" else [])
+        # Revision and parsed parameters of the models that were not discovered
+        self._model_params = Cache("ollama_model_params")
 
     def create_model(self, name: str, model: str, tools: Optional[List] = None, **kwargs) -> BaseChatModel:
-        # Fetch the model parameters from the Ollama API
-        base_url = os.getenv("OLLAMA_URL")
-        response = requests.post(
-            f"{base_url}/api/show", json={"name": model})
-        logger.debug(f"Response: {json.dumps(response.json(), indent=2)}")
-        params_kwargs = {}
-        if response.status_code == 200:
-            response_json = response.json()
-            if "parameters" in response_json:
-                params_kwargs = self.parse_ollama_params(
-                    response_json["parameters"])
-
-        # Merge the parameters from the Ollama API response with the provided kwargs
+        # Merge the parameters of the model with the provided kwargs
         # When conflict, kwargs overrides
-        params_kwargs.update(kwargs)
-        logger.debug(f"Params kwargs: {params_kwargs}")
+        params_kwargs = {**self.get_model_params(model), **kwargs}
         llm = ChatOllama(name=name, model=model,
-                         base_url=os.getenv("OLLAMA_URL", "http://localhost:11434"), **params_kwargs)
+                         base_url=self.base_url, **params_kwargs)
         return llm.bind_tools(tools) if tools else llm
 
-    def list_models(self) -> List[str]:
-        cache_key = f"models_{self.base_url}"
-        cached_models = model_cache.get(cache_key)
-        if cached_models is not None:
-            return cached_models
+    def get_model_params(self, model: str) -> Dict[str, Any]:
+        """
+        Get the parameters of a model from memory.
 
-        try:
-            response = requests.get(f"{self.base_url}/api/tags")
-            response.raise_for_status()
-            models = [f'{model["name"]}' for model in response.json()[
-                "models"]]
-            model_cache.set(cache_key, models)
-            return models
-        except:
-            return []
-
-    @lru_cache(maxsize=1)
-    def get_ollama_param_types(self) -> Dict[str, Any]:
+        On a miss, the parameters are loaded in the background if an event loop
+        is running, and the model is created without them in the meantime: the
+        server applies them anyway. Without an event loop, they are loaded now.
         """
-        Dynamically extract and cache parameter types from ChatOllama
+        discovered = self._get_discovered()
+        if model in discovered:
+            return discovered[model]["parameters"]
+        loaded = get_or_load(self._model_params, model,
+                              lambda: self._fetch_model_params(model))
+        return loaded[1] if loaded is not None else {}
+
+    def get_model_revision(self, model: str) -> Optional[str]:
+        discovered = self._discovery.peek(self.base_url) or {}
+        if model in discovered:
+            return discovered[model]["digest"]
+        loaded = self._model_params.peek(model)
+        return loaded[0] if loaded is not None else None
+
+    async def aload_model_params(
+        self, model: str, digest: Optional[str] = None, client: Optional[httpx.AsyncClient] = None
+    ) -> Dict[str, Any]:
         """
+        Fetch and parse the parameters of a model, unless they are known for its digest.
 
-        # Get all modules from langchain packages
-        localns = {}
-        for module_name, module in sys.modules.items():
-            if module_name.startswith(('langchain', 'typing')):
-                if module:
-                    localns.update({
-                        k: v for k, v in module.__dict__.items()
-                        if isinstance(v, type) or hasattr(v, '__origin__')
-                    })
-
-        # Add built-in types
-        localns.update({
-            k: v for k, v in builtins.__dict__.items()
-            if isinstance(v, type)
-        })
-
-        # Add typing constructs
-        localns.update(typing.__dict__)
-
-        sig = signature(ChatOllama)
-        type_hints = get_type_hints(ChatOllama, localns=localns)
-
-        param_types = {}
-        for param_name, param in sig.parameters.items():
-            if param_name == 'self':
-                continue
-            type_hint = type_hints.get(param_name, Any)
-            param_types[param_name] = type_hint
+        Args:
+            model (str): The model name.
+            digest (Optional[str]): The digest of the model, from /api/tags. Without it, the
+                modification time of the model identifies the loaded parameters.
+            client (Optional[httpx.AsyncClient]): Client of the Ollama server, to share between requests.
+        """
+        loaded = self._model_params.peek(model)
+        if loaded is not None and (digest is None or loaded[0] == digest):
+            return loaded[1]
+        try:
+            loaded = await self._fetch_model_params(model, digest, client)
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to get the parameters of {model}: {e}")
+            return {}
+        await self._model_params.aset(model, loaded)
+        return loaded[1]
+
+    async def _fetch_model_params(
+        self, model: str, digest: Optional[str] = None, client: Optional[httpx.AsyncClient] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        if client is None:
+            async with httpx.AsyncClient(base_url=self.base_url) as client:
+                return await self._fetch_model_params(model, digest, client)
+        response = await client.post("/api/show", json={"name": model})
+        response.raise_for_status()
+        response_json = response.json()
+        return (digest or response_json.get("modified_at", ""),
+                self.parse_ollama_params(response_json.get("parameters")))
 
-        return param_types
+    def list_models(self) -> List[str]:
+        return list(self.capabilities.keys())
 
-    def parse_value(self, value_str: str, type_hint):
+    def _get_discovered(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return get_or_load(self._discovery, self.base_url, self._discover) or {}
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logger.warning(f"Failed to discover the Ollama models: {e}")
+            return {}
+
+    async def discover(self, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Set[ModelCapability]]:
         """
-        Parse the string value to the type specified by type_hint
+        Discover the models of the server and their capabilities now.
+
+        Args:
+            client (Optional[httpx.AsyncClient]): Client of the Ollama server.
         """
-        origin = get_origin(type_hint)
-        args = get_args(type_hint)
-
-        if origin is Union:
-            for arg_type in args:
-                if arg_type == type(None):
-                    continue
-                try:
-                    return self.parse_value(value_str, arg_type)
-                except ValueError:
-                    continue
-            raise ValueError(f"Cannot parse {value_str} as {type_hint}")
-        elif type_hint == int:
-            return int(value_str)
-        elif type_hint == float:
-            return float(value_str)
-        elif type_hint == str:
-            # Keep the original string value without stripping special characters
-            return value_str.strip('"\'')
-        elif origin == list:
-            # For stop tokens, preserve the exact string including brackets
-            elem_type = args[0] if args else str
-
-            if value_str.startswith('[') and value_str.endswith(']'):
-                # Single element with brackets - return as is
-                return [value_str.strip('"\'')]
-            # Handle comma-separated list case
-            elements = [elem.strip().strip('"\'')
-                        for elem in value_str.split(',')]
-            return [self.parse_value(elem, elem_type) for elem in elements]
-        elif origin == dict:
-            import json
-            return json.loads(value_str)
-        else:
-
-            return value_str.strip('"\'')
+        models = await self._discover(client)
+        await self._discovery.aset(self.base_url, models)
+        return {name: model["capabilities"] for name, model in models.items()}
+
+    async def _discover(self, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the digest, parameters and capabilities of the models of the server.
+
+        Only the models whose digest changed since the last discovery are shown.
+        A model that fails to be shown keeps its previous entry, if any, and is
+        shown again on the next discovery.
+        """
+        if client is None:
+            async with httpx.AsyncClient(base_url=self.base_url) as client:
+                return await self._discover(client)
+        previous = self._discovery.peek(self.base_url) or {}
+        response = await client.get("/api/tags")
+        response.raise_for_status()
+        digests = {model["name"]: model.get("digest")
+                   for model in response.json()["models"]}
+        semaphore = asyncio.Semaphore(self.discovery_concurrency)
+
+        async def show(name: str, digest: Optional[str]) -> Optional[Dict[str, Any]]:
+            if name in previous and previous[name]["digest"] == digest:
+                return previous[name]
+            try:
+                async with semaphore:
+                    response = await client.post("/api/show", json={"name": name})
+                response.raise_for_status()
+                metadata = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"Failed to show Ollama model {name}: {e}")
+                return previous.get(name)
+            return {
+                "digest": digest,
+                "parameters": self.parse_ollama_params(metadata.get("parameters")),
+                "capabilities": get_model_capabilities(metadata),
+            }
+
+        models = await asyncio.gather(*[show(name, digest) for name, digest in digests.items()])
+        models = {name: model for name, model in zip(digests, models) if model is not None}
+        logger.debug(f"Model capabilities: {models}")
+        return models
+
+    async def alist_models(self) -> List[str]:
+        return list(await self._discovery.aget(self.base_url, self._discover))
 
     def parse_ollama_params(self, parameters: str) -> Dict[str, Any]:
         """
-        Parse the parameters from the Ollama API response
+        Parse the parameters from the Ollama API response, in a single pass
 
         Args:
             parameters: Raw parameter string from Ollama API
@@ -177,14 +280,12 @@ class OllamaProvider(LLMProvider):
                 "stop": ["[INST]", "[/INST]"]
             }
         """
-        param_types = self.get_ollama_param_types()
         result = {}
-
         if not parameters or not isinstance(parameters, str):
             return result
 
-        # First pass to collect all values for each key
-        collected_values = {}
+        # The values of the keys seen so far, as a list once a key repeats
+        values: Dict[str, List[str]] = {}
         for line in parameters.strip().split('\n'):
             parts = line.strip().split(None, 1)
             if len(parts) != 2:
@@ -195,23 +296,17 @@ class OllamaProvider(LLMProvider):
             if not value_str:
                 continue
 
-            if key not in collected_values:
-                collected_values[key] = []
-            collected_values[key].append(value_str)
-
-        # Second pass to parse values with correct types
-        for key, values in collected_values.items():
-            type_hint = param_types.get(key, str)
+            if key in values:
+                # If we have multiple values, treat as a list of strings
+                values[key].append(value_str)
+                result[key] = values[key]
+                continue
+            values[key] = [value_str]
             try:
-                # If we have multiple values, treat as a list
-                if len(values) > 1:
-                    result[key] = [self.parse_value(v, str) for v in values]
-                else:
-                    result[key] = self.parse_value(values[0], type_hint)
-            except (ValueError, TypeError) as e:
+                result[key] = OLLAMA_PARAM_PARSERS.get(key, parse_str)(value_str)
+            except ValueError as e:
                 logger.debug(
-                    f"Skipping invalid parameter value for {key}: {values} ({e})")
-                continue
+                    f"Skipping invalid parameter value for {key}: {value_str} ({e})")
 
         return result
 
@@ -221,60 +316,11 @@ class OllamaProvider(LLMProvider):
 
     @property
     def capabilities(self) -> Dict[str, Set[ModelCapability]]:
-        # Currently Ollama doesn't have a way to query capabilities
-        # But we can infer some capabilities based on model metadata
-        def get_model_capabilities(metadata: dict) -> Set[ModelCapability]:
-            capability_keywords = {
-                ModelCapability.TEXT_TO_TEXT: ["text", "response", "conversation", "Q&A", "template"],
-                ModelCapability.IMAGE_TO_TEXT: ["vision", "image", "CLIP", "image encoder", "patch_size", "projection_dim"],
-                ModelCapability.TOOL_CALLING: [
-                    "tool", "tool_calls", "function call", "parameters",
-                    "function name", "arguments", "tool calling capabilities"
-                ],
-                ModelCapability.STRUCTURED_OUTPUT: [
-                    "json", "structured", "format", "parameters", "dictionary"]
-            }
-
-            detected_capabilities = set(
-                [ModelCapability.TEXT_TO_TEXT])  # Base capability
-
-            # Check template for tool calling patterns
-            template = metadata.get("template", "").lower()
-            for capability, keywords in capability_keywords.items():
-                if any(keyword in template for keyword in keywords):
-                    detected_capabilities.add(capability)
-
-            # Check for JSON function call format in template
-            if '"name":' in template and '"parameters":' in template:
-                detected_capabilities.add(ModelCapability.TOOL_CALLING)
-                detected_capabilities.add(ModelCapability.STRUCTURED_OUTPUT)
-
-            return detected_capabilities
+        """
+        The capabilities of the discovered models.
 
-        try:
-            cache_key = f"capabilities_{self.base_url}"
-            cached_capabilities = model_cache.get(cache_key)
-            if cached_capabilities is not None:
-                return cached_capabilities
-
-            response = requests.get(f"{self.base_url}/api/tags")
-            response.raise_for_status()
-            logger.debug(f"API response: {response.json()}")
-
-            model_capabilities = {}
-            for model in response.json()["models"]:
-                # Get detailed info for each model
-                show_response = requests.post(
-                    f"{self.base_url}/api/show",
-                    json={"name": model["name"]}
-                )
-                show_response.raise_for_status()
-                capabilities = get_model_capabilities(show_response.json())
-                model_capabilities[model["name"]] = capabilities
-
-            model_cache.set(cache_key, model_capabilities)
-            logger.debug(f"Model capabilities: {model_capabilities}")
-            return model_capabilities
-        except Exception as e:
-            logger.error(f"Error getting capabilities: {e}")
-            return {}
+        The models are refreshed in the background once they are stale. Only
+        without a running event loop, e.g. in scripts, the first discovery is
+        waited for.
+        """
+        return {name: model["capabilities"] for name, model in self._get_discovered().items()}
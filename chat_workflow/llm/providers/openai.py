@@ -1,14 +1,19 @@
+import os
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_openai import ChatOpenAI
-from openai import OpenAI
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 from typing import Optional, List, Dict, Set
 from .base import LLMProvider
 from ..capabilities import ModelCapability
 
 
 class OpenAIProvider(LLMProvider):
+    http_client_factories = (DefaultHttpxClient, DefaultAsyncHttpxClient)
+
     def create_model(self, name: str, model: str, tools: Optional[List] = None, **kwargs) -> BaseChatModel:
-        llm = ChatOpenAI(name=name, model=model, **kwargs)
+        # Usage, including the cached prompt tokens, is only streamed on request
+        kwargs.setdefault("stream_usage", True)
+        llm = ChatOpenAI(name=name, model=model, **{**self.get_http_clients(kwargs.get("base_url")), **kwargs})
         return llm.bind_tools(tools) if tools else llm
 
     def list_models(self) -> List[str]:
@@ -48,6 +53,14 @@ class OpenAIProvider(LLMProvider):
         except Exception as e:
             return []
 
+    @property
+    def is_configured(self) -> bool:
+        return bool(os.getenv("OPENAI_API_KEY"))
+
+    @property
+    def accepts_image_urls(self) -> bool:
+        return True
+
     @property
     def name(self) -> str:
         return "openai"
@@ -65,3 +78,11 @@ class OpenAIProvider(LLMProvider):
             "whisper-1": {ModelCapability.AUDIO_TO_TEXT},
             "dalle-3": {ModelCapability.TEXT_TO_IMAGE},
         }
+
+    @property
+    def context_windows(self) -> Dict[str, int]:
+        return {
+            "gpt-4o": 128000,
+            "gpt-4o-mini": 128000,
+            "gpt-4o-audio-preview": 128000,
+        }
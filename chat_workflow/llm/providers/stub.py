@@ -0,0 +1,263 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, ToolMessage, get_buffer_string
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+from .base import LLMProvider
+from ..capabilities import ModelCapability
+
+
+# Placeholder arguments of emitted tool calls, by JSON schema type
+PLACEHOLDER_ARGS = {
+    "string": "stub",
+    "integer": 1,
+    "number": 1.0,
+    "boolean": True,
+    "array": [],
+    "object": {},
+}
+
+
+class StubModelError(RuntimeError):
+    """Error injected by the stub chat model."""
+
+
+class StubChatModel(BaseChatModel):
+    """
+    A chat model that streams a deterministic reply without calling any service.
+
+    The reply is `output_tokens` tokens "tok0 tok1 ...", streamed one token per
+    chunk after `ttft` seconds and `token_delay` seconds apart. The last chunk
+    carries the usage metadata, like the streams of the real providers.
+
+    With `tool_calls` and bound tools, the model first calls `tool_name` (or the
+    first bound tool) with placeholder arguments, and replies once the last
+    message is the tool's result. With `error_rate`, that share of the requests
+    fails with StubModelError after `error_after_tokens` tokens.
+    """
+
+    ttft: float = 0.2
+    token_delay: float = 0.02
+    output_tokens: int = 50
+    tool_calls: bool = False
+    tool_name: str = ""
+    error_rate: float = 0.0
+    error_after_tokens: int = 0
+    rng: Any = Field(default=None, exclude=True)
+    bound_tools: List[Dict[str, Any]] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools: List, **kwargs: Any) -> "StubChatModel":
+        return self.model_copy(update={
+            "bound_tools": [convert_to_openai_tool(tool)["function"] for tool in tools],
+        })
+
+    def _should_fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        return (self.rng or random).random() < self.error_rate
+
+    def _tool_call(self, messages: List[BaseMessage]) -> Optional[Dict[str, Any]]:
+        if not self.tool_calls or not self.bound_tools:
+            return None
+        if messages and isinstance(messages[-1], ToolMessage):
+            return None
+        tool = next((t for t in self.bound_tools if t["name"] == self.tool_name),
+                    self.bound_tools[0])
+        parameters = tool.get("parameters", {})
+        args = {
+            name: PLACEHOLDER_ARGS.get(parameters["properties"].get(name, {}).get("type"), "stub")
+            for name in parameters.get("required", [])
+        }
+        return {"name": tool["name"], "args": json.dumps(args),
+                "id": f"call_{uuid.uuid4().hex[:24]}", "index": 0}
+
+    def _chunks(self, messages: List[BaseMessage]) -> Iterator[ChatGenerationChunk]:
+        """
+        The chunks of the reply, without the delays.
+        """
+        fail = self._should_fail()
+        input_tokens = len(get_buffer_string(messages)) // 4
+        if (tool_call := self._tool_call(messages)) is not None:
+            if fail:
+                raise StubModelError("Injected error of the stub chat model")
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="", tool_call_chunks=[tool_call],
+                usage_metadata={"input_tokens": input_tokens, "output_tokens": 1,
+                                "total_tokens": input_tokens + 1}))
+            return
+        for i in range(self.output_tokens):
+            if fail and i == self.error_after_tokens:
+                raise StubModelError("Injected error of the stub chat model")
+            usage = None
+            if i == self.output_tokens - 1:
+                usage = {"input_tokens": input_tokens, "output_tokens": self.output_tokens,
+                         "total_tokens": input_tokens + self.output_tokens}
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"tok{i} ", usage_metadata=usage))
+        if fail:
+            raise StubModelError("Injected error of the stub chat model")
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        chunk = None
+        for next_chunk in self._stream(messages, stop, run_manager, **kwargs):
+            chunk = next_chunk if chunk is None else chunk + next_chunk
+        return ChatResult(generations=[ChatGeneration(message=chunk.message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        chunk = None
+        async for next_chunk in self._astream(messages, stop, run_manager, **kwargs):
+            chunk = next_chunk if chunk is None else chunk + next_chunk
+        return ChatResult(generations=[ChatGeneration(message=chunk.message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.ttft)
+        for i, chunk in enumerate(self._chunks(messages)):
+            if i > 0:
+                time.sleep(self.token_delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.ttft)
+        for i, chunk in enumerate(self._chunks(messages)):
+            if i > 0:
+                await asyncio.sleep(self.token_delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class StubProvider(LLMProvider):
+    """
+    Provider of stub chat models, for tests and benchmarks without network access.
+
+    The models are only listed in the UI if STUB_LLM_ENABLED is true, but they
+    can always be created by name, e.g. "(stub)stub-chat". Arguments that are
+    not given are read from the STUB_LLM_* environment variables.
+
+    Args:
+        ttft (Optional[float]): Seconds before the first token.
+        token_delay (Optional[float]): Seconds between tokens.
+        output_tokens (Optional[int]): Number of tokens of every reply.
+        tool_calls (Optional[bool]): Whether models with bound tools call a tool first.
+        tool_name (Optional[str]): The tool to call, the first bound tool if empty.
+        error_rate (Optional[float]): Share of the requests that fail.
+        error_after_tokens (Optional[int]): Number of tokens streamed before a failure.
+        seed (Optional[int]): Seed of the injected errors.
+        enabled (Optional[bool]): Whether the models are listed.
+    """
+
+    def __init__(
+        self,
+        ttft: Optional[float] = None,
+        token_delay: Optional[float] = None,
+        output_tokens: Optional[int] = None,
+        tool_calls: Optional[bool] = None,
+        tool_name: Optional[str] = None,
+        error_rate: Optional[float] = None,
+        error_after_tokens: Optional[int] = None,
+        seed: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        if ttft is None:
+            ttft = float(os.getenv("STUB_LLM_TTFT_MS", "200")) / 1000
+        if token_delay is None:
+            token_delay = float(os.getenv("STUB_LLM_TOKEN_DELAY_MS", "20")) / 1000
+        if output_tokens is None:
+            output_tokens = int(os.getenv("STUB_LLM_OUTPUT_TOKENS", "50"))
+        if tool_calls is None:
+            tool_calls = os.getenv("STUB_LLM_TOOL_CALLS", "false").lower() == "true"
+        if tool_name is None:
+            tool_name = os.getenv("STUB_LLM_TOOL_NAME", "")
+        if error_rate is None:
+            error_rate = float(os.getenv("STUB_LLM_ERROR_RATE", "0"))
+        if error_after_tokens is None:
+            error_after_tokens = int(os.getenv("STUB_LLM_ERROR_AFTER_TOKENS", "0"))
+        if seed is None:
+            seed = int(os.getenv("STUB_LLM_SEED", "0"))
+        if enabled is None:
+            enabled = os.getenv("STUB_LLM_ENABLED", "false").lower() == "true"
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.output_tokens = output_tokens
+        self.tool_calls = tool_calls
+        self.tool_name = tool_name
+        self.error_rate = error_rate
+        self.error_after_tokens = error_after_tokens
+        self.enabled = enabled
+        # Shared by all models, so that the errors are spread over the requests
+        self.rng = random.Random(seed)
+
+    def create_model(self, name: str, model: str, tools: Optional[List] = None, **kwargs) -> BaseChatModel:
+        llm = StubChatModel(
+            name=name,
+            ttft=self.ttft,
+            token_delay=self.token_delay,
+            output_tokens=self.output_tokens,
+            tool_calls=self.tool_calls,
+            tool_name=self.tool_name,
+            error_rate=self.error_rate,
+            error_after_tokens=self.error_after_tokens,
+            rng=self.rng,
+            **kwargs,
+        )
+        return llm.bind_tools(tools) if tools else llm
+
+    def list_models(self) -> List[str]:
+        return list(self.capabilities.keys()) if self.enabled else []
+
+    @property
+    def is_configured(self) -> bool:
+        return self.enabled
+
+    @property
+    def name(self) -> str:
+        return "stub"
+
+    @property
+    def capabilities(self) -> Dict[str, Set[ModelCapability]]:
+        return {
+            "stub-chat": {ModelCapability.TEXT_TO_TEXT, ModelCapability.IMAGE_TO_TEXT, ModelCapability.TOOL_CALLING},
+        }
+
+    @property
+    def context_windows(self) -> Dict[str, int]:
+        return {
+            "stub-chat": 128000,
+        }
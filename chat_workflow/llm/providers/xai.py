@@ -1,5 +1,5 @@
 import os
-from openai import OpenAI
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 from typing import List, Optional, Dict, Set
 from langchain_openai import ChatOpenAI
 from langchain_core.language_models.chat_models import BaseChatModel
@@ -8,13 +8,16 @@ from ..capabilities import ModelCapability
 
 
 class XAIProvider(LLMProvider):
+    http_client_factories = (DefaultHttpxClient, DefaultAsyncHttpxClient)
+
     def create_model(self, name: str, model: str, tools: Optional[List] = None, **kwargs) -> BaseChatModel:
+        base_url = os.getenv("XAI_BASE_URL")
         llm = ChatOpenAI(
             name=name,
             model=model,
             api_key=os.getenv("XAI_API_KEY"),
-            base_url=os.getenv("XAI_BASE_URL"),
-            **kwargs
+            base_url=base_url,
+            **{**self.get_http_clients(base_url), **kwargs}
         )
         return llm.bind_tools(tools) if tools else llm
 
@@ -56,6 +59,14 @@ class XAIProvider(LLMProvider):
         except Exception as e:
             return []
 
+    @property
+    def is_configured(self) -> bool:
+        return bool(os.getenv("XAI_API_KEY"))
+
+    @property
+    def accepts_image_urls(self) -> bool:
+        return True
+
     @property
     def name(self) -> str:
         return "xai"
@@ -65,3 +76,9 @@ class XAIProvider(LLMProvider):
         return {
             "grok-beta": {ModelCapability.TEXT_TO_TEXT, ModelCapability.TOOL_CALLING},
         }
+
+    @property
+    def context_windows(self) -> Dict[str, int]:
+        return {
+            "grok-beta": 131072,
+        }
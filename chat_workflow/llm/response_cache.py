@@ -0,0 +1,60 @@
+import os
+from typing import Any, List, Optional
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from sqlalchemy.orm import sessionmaker
+from ..cache import Cache, PostgresCacheTier
+from ..metrics import LLM_CACHE_REQUESTS
+
+
+class ResponseCache:
+    """
+    Exact-match cache of the streamed responses of LLM requests.
+
+    A response is stored as the list of its chunks, keyed by the hash of the
+    request, so that a hit is replayed chunk by chunk like a live response.
+    Responses are kept in the in-memory LRU of a `Cache` named "llm_responses"
+    and, with an `async_session`, in its Postgres tier, which survives restarts
+    and is shared by workers. Both expire `ttl` seconds after they were stored.
+
+    Args:
+        max_size (Optional[int]): Number of responses kept in memory.
+            Defaults to LLM_RESPONSE_CACHE_SIZE (1024).
+        ttl (Optional[float]): Seconds a response is valid, 0 for no expiry.
+            Defaults to LLM_RESPONSE_CACHE_TTL (3600).
+        async_session (Optional[sessionmaker]): Factory for async database sessions of the Postgres tier.
+        serde (Optional[SerializerProtocol]): Serializer of the responses stored in Postgres.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        async_session: Optional[sessionmaker] = None,
+        serde: Optional[SerializerProtocol] = None,
+    ):
+        if max_size is None:
+            max_size = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", "1024"))
+        if ttl is None:
+            ttl = float(os.getenv("LLM_RESPONSE_CACHE_TTL", "3600"))
+        self.max_size = max_size
+        self.ttl = ttl
+        tiers = [PostgresCacheTier(async_session, serde)] if async_session is not None else []
+        self._responses = Cache("llm_responses", max_size=max_size, ttl=ttl or None, tiers=tiers)
+
+    async def get(self, key: str, label: str = "") -> Optional[List[Any]]:
+        """
+        Get the chunks of a cached response, or None.
+
+        Args:
+            key (str): Hash of the request.
+            label (str): Label of the request in the metrics, e.g. its model.
+        """
+        chunks = await self._responses.aget(key)
+        LLM_CACHE_REQUESTS.labels(label, "miss" if chunks is None else "hit").inc()
+        return chunks
+
+    async def set(self, key: str, chunks: List[Any]):
+        """
+        Store the chunks of a complete response.
+        """
+        await self._responses.aset(key, chunks)
@@ -0,0 +1,336 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.messages.ai import add_usage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, ensure_config
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from .single_flight import get_message_identity, hash_request
+from ..metrics import LLM_ACTIVE_CALLS, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, LLM_REJECTED, record_token_usage
+
+
+class LLMOverloadedError(RuntimeError):
+    """An LLM call was rejected because too many calls are queued or it waited too long."""
+
+
+def parse_limits(value: str) -> Dict[str, float]:
+    """
+    Parse "key=value" pairs separated by commas, e.g. "ollama=4,(openai)gpt-4o=16".
+    """
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, limit = item.rsplit("=", 1)
+            limits[key.strip()] = float(limit)
+    return limits
+
+
+class FairLimiter:
+    """
+    A concurrency limit whose waiters are served by weighted fair queuing.
+
+    Every user has its own virtual clock: a call of a user with weight w
+    finishes 1 / w after the later of the user's previous call and the start of
+    the call in service. Free slots go to the waiting call that finishes first,
+    so a user with many queued calls can't starve the others.
+
+    Args:
+        name (str): Name of the limit in the metrics.
+        limit (int): Maximum number of concurrent calls.
+        max_queue (int): Maximum number of waiting calls.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters: List[Tuple[float, int, float, asyncio.Future]] = []
+        self._finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    async def acquire(self, user: str, weight: float = 1.0, timeout: Optional[float] = None):
+        if self.active < self.limit and not self.queued:
+            self._grant()
+            return
+        if self.queued >= self.max_queue:
+            LLM_REJECTED.labels(self.name, "queue_full").inc()
+            raise LLMOverloadedError(
+                f"Too many LLM calls are waiting for {self.name}")
+
+        start = max(self._virtual_time, self._finish.get(user, 0.0))
+        finish = start + 1 / weight
+        self._finish[user] = finish
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (finish, next(self._seq), start, future))
+        LLM_QUEUE_DEPTH.labels(self.name).inc()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            LLM_REJECTED.labels(self.name, "timeout").inc()
+            raise LLMOverloadedError(
+                f"Timed out waiting for a free slot of {self.name}") from None
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            LLM_QUEUE_DEPTH.labels(self.name).dec()
+
+    def release(self):
+        while self._waiters:
+            _, _, start, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot over to the next call
+                self._virtual_time = start
+                future.set_result(None)
+                return
+        # All users are idle, so none of them has used more than its share
+        self._finish.clear()
+        self.active -= 1
+        LLM_ACTIVE_CALLS.labels(self.name).dec()
+
+    def _grant(self):
+        self.active += 1
+        LLM_ACTIVE_CALLS.labels(self.name).inc()
+
+
+class LLMScheduler:
+    """
+    Admission control of the LLM calls of the process.
+
+    A call takes a slot of its model's limit, if it has one, and of its
+    provider's limit. When no slot is free, the call waits in a bounded queue
+    and the slots are shared fairly between users. Calls are rejected with
+    LLMOverloadedError when the queue is full or after waiting too long.
+
+    Arguments that are not given are read from the environment:
+    LLM_CONCURRENCY_LIMITS, e.g. "ollama=4,(openai)gpt-4o=16", sets the limits of
+    providers and models; the other providers are limited to
+    LLM_DEFAULT_CONCURRENCY calls, 0 for no limit. LLM_QUEUE_SIZE and
+    LLM_QUEUE_TIMEOUT bound the queue of every limit, and LLM_USER_WEIGHTS,
+    e.g. "admin=2", gives users a larger share.
+
+    Args:
+        limits (Optional[Dict[str, int]]): Concurrency limits by provider or model.
+        default_limit (Optional[int]): Limit of the providers not in `limits`.
+        max_queue (Optional[int]): Maximum number of waiting calls per limit.
+        timeout (Optional[float]): Seconds a call waits for a slot, 0 for no timeout.
+        user_weights (Optional[Dict[str, float]]): Weights of users, 1 by default.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        default_limit: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        timeout: Optional[float] = None,
+        user_weights: Optional[Dict[str, float]] = None,
+    ):
+        if limits is None:
+            limits = {key: int(limit) for key, limit in parse_limits(
+                os.getenv("LLM_CONCURRENCY_LIMITS", "ollama=4")).items()}
+        if default_limit is None:
+            default_limit = int(os.getenv("LLM_DEFAULT_CONCURRENCY", "32"))
+        if max_queue is None:
+            max_queue = int(os.getenv("LLM_QUEUE_SIZE", "256"))
+        if timeout is None:
+            timeout = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+        if user_weights is None:
+            user_weights = parse_limits(os.getenv("LLM_USER_WEIGHTS", ""))
+        self.limits = limits
+        self.default_limit = default_limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.user_weights = user_weights
+        self._limiters: Dict[str, FairLimiter] = {}
+
+    def _limiter(self, key: str, limit: int) -> FairLimiter:
+        if key not in self._limiters:
+            self._limiters[key] = FairLimiter(key, limit, self.max_queue)
+        return self._limiters[key]
+
+    def get_limiters(self, provider: str, model: str) -> List[FairLimiter]:
+        """
+        Get the limiters of a call to a model, in the order they are acquired.
+        """
+        limiters = []
+        model_key = f"({provider}){model}"
+        if self.limits.get(model_key):
+            limiters.append(self._limiter(model_key, self.limits[model_key]))
+        provider_limit = self.limits.get(provider, self.default_limit)
+        if provider_limit:
+            limiters.append(self._limiter(provider, provider_limit))
+        return limiters
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model: str, user: str = ""):
+        """
+        Hold a concurrency slot for a call to a model.
+
+        Raises:
+            LLMOverloadedError: If the queue is full or the wait timed out.
+        """
+        weight = self.user_weights.get(user, 1.0)
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        acquired: List[FairLimiter] = []
+        try:
+            for limiter in self.get_limiters(provider, model):
+                start = time.perf_counter()
+                await limiter.acquire(user, weight, None if deadline is None
+                                      else max(0.0, deadline - time.monotonic()))
+                LLM_QUEUE_WAIT.labels(limiter.name).observe(
+                    time.perf_counter() - start)
+                acquired.append(limiter)
+            yield
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get the active and queued calls of every limit.
+        """
+        return {name: {"limit": limiter.limit, "active": limiter.active, "queued": limiter.queued}
+                for name, limiter in self._limiters.items()}
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    A chat model that runs the calls of another model in slots of a scheduler.
+
+    The wrapped model, possibly bound to tools, is called without callbacks; the
+    events of the run, e.g. on_chat_model_stream, are those of this model, which
+    has the same name. The user of a call is the `user_id`, or else the
+    `thread_id`, of the configurable of the graph run that calls the model.
+
+    With a SingleFlight, streamed calls with the same `request_key` and
+    messages share one upstream call while it is in flight. With a
+    ResponseCache, they are replayed from the cache once a call has completed.
+    """
+
+    bound: Runnable
+    scheduler: Optional[Any] = None
+    single_flight: Optional[Any] = None
+    response_cache: Optional[Any] = None
+    provider: str
+    model: str
+    request_key: str = ""
+
+    @property
+    def _llm_type(self) -> str:
+        return "scheduled"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"provider": self.provider, "model": self.model}
+
+    def bind_tools(self, tools: List, **kwargs: Any) -> "ScheduledChatModel":
+        return self.model_copy(update={
+            "bound": self.bound.bind_tools(tools, **kwargs),
+            "request_key": hash_request(
+                request=self.request_key,
+                tools=[convert_to_openai_tool(tool) for tool in tools],
+                kwargs=kwargs),
+        })
+
+    def _user(self) -> str:
+        # The config of the graph node that calls the model
+        metadata = ensure_config().get("metadata", {})
+        return str(metadata.get("user_id") or metadata.get("thread_id") or "")
+
+    def _slot(self, user: str):
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(self.provider, self.model, user)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # Blocking calls run outside the event loop, so they are not scheduled
+        message = self.bound.invoke(messages, {"callbacks": []}, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        async with self._slot(self._user()):
+            message = await self.bound.ainvoke(messages, {"callbacks": []}, stop=stop, **kwargs)
+        record_token_usage(f"({self.provider}){self.model}", message.usage_metadata)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for chunk in self.bound.stream(messages, {"callbacks": []}, stop=stop, **kwargs):
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        user = self._user()
+        label = f"({self.provider}){self.model}"
+        key = hash_request(request=self.request_key, stop=stop, kwargs=kwargs,
+                           messages=get_message_identity(messages))
+        if self.response_cache is not None:
+            cached = await self.response_cache.get(key, label)
+            if cached is not None:
+                for i, chunk in enumerate(cached):
+                    chunk = chunk.model_copy(update={"id": None})
+                    if i == len(cached) - 1:
+                        chunk.response_metadata = {
+                            **chunk.response_metadata, "cache_hit": True}
+                    yield ChatGenerationChunk(message=chunk)
+                return
+
+        async def upstream():
+            chunks = []
+            usage = None
+            async with self._slot(user):
+                async for chunk in self.bound.astream(messages, {"callbacks": []}, stop=stop, **kwargs):
+                    chunks.append(chunk)
+                    if chunk.usage_metadata:
+                        usage = add_usage(usage, chunk.usage_metadata)
+                    yield chunk
+            record_token_usage(label, usage)
+            # Only complete responses are cached
+            if self.response_cache is not None:
+                await self.response_cache.set(key, chunks)
+
+        if self.single_flight is None:
+            chunks = upstream()
+        else:
+            chunks = self.single_flight.stream(key, upstream, label)
+        async for chunk in chunks:
+            # The chunks are shared with other callers and the cache, and the
+            # caller sets its own id and metadata
+            yield ChatGenerationChunk(message=chunk.model_copy(update={"id": None}))
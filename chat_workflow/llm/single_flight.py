@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence
+from langchain_core.messages import BaseMessage
+from ..metrics import LLM_COALESCED_CALLS
+
+
+def hash_request(**parts: Any) -> str:
+    """
+    Hash the identity of an LLM request, e.g. its model, parameters, tools and messages.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def get_message_identity(messages: Sequence[BaseMessage]) -> List[Dict[str, Any]]:
+    """
+    Get the fields of messages that are sent to the model, without their ids.
+    """
+    return [{
+        "type": message.type,
+        "content": message.content,
+        "name": message.name,
+        "tool_calls": getattr(message, "tool_calls", None),
+        "tool_call_id": getattr(message, "tool_call_id", None),
+    } for message in messages]
+
+
+class _Flight:
+    """The upstream stream of a request and the chunks it has produced so far."""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """
+    Share one upstream stream between identical requests in flight at the same time.
+
+    The first request of a key starts the upstream stream in its own task; the
+    requests with the same key that arrive before it ends subscribe to it, and
+    get the chunks received so far replayed before the new ones. The upstream
+    stream is cancelled when all its subscribers are gone. Requests arriving
+    after the end start a new stream.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def stream(self, key: str, upstream: Callable[[], AsyncIterator[Any]], label: str = "") -> AsyncIterator[Any]:
+        """
+        Stream the chunks of a request.
+
+        Args:
+            key (str): Identity of the request.
+            upstream (Callable[[], AsyncIterator[Any]]): Starts the upstream stream of the request.
+            label (str): Label of the request in the metrics, e.g. its model.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._run(key, flight, upstream))
+        else:
+            LLM_COALESCED_CALLS.labels(label).inc()
+        flight.subscribers += 1
+        try:
+            i = 0
+            while True:
+                if i < len(flight.chunks):
+                    yield flight.chunks[i]
+                    i += 1
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+                self._forget(key, flight)
+
+    async def _run(self, key: str, flight: _Flight, upstream: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for chunk in upstream():
+                flight.chunks.append(chunk)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(key, flight)
+            flight.notify()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
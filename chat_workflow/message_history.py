@@ -0,0 +1,89 @@
+import copy
+from typing import Any, Awaitable, Callable, List, Optional
+
+
+class MessageHistory(list):
+    """
+    The most recent part of a thread's message history.
+
+    Long threads are resumed with only their latest messages loaded. The older
+    messages stay in the message log and are paged in on demand, for example by
+    a workflow node that needs the full conversation.
+
+    It behaves like a list of the loaded messages, so it can be used as the
+    `messages` channel of a graph. Appending messages with `+` keeps the cursor
+    to the older history.
+
+    Args:
+        messages (List[Any]): The loaded messages, oldest first.
+        offset (int): Number of older messages that are not loaded.
+        loader (Optional[Callable[[int, int], Awaitable[List[Any]]]]): Loads the
+            messages in the range [start, end) of the thread's history.
+    """
+
+    def __init__(
+        self,
+        messages: List[Any] = (),
+        offset: int = 0,
+        loader: Optional[Callable[[int, int], Awaitable[List[Any]]]] = None,
+    ):
+        super().__init__(messages)
+        self.offset = offset
+        self.loader = loader
+
+    @property
+    def total(self) -> int:
+        """
+        Number of messages in the thread, including the ones not loaded.
+        """
+        return self.offset + len(self)
+
+    def __add__(self, other):
+        return MessageHistory(list.__add__(self, list(other)), self.offset, self.loader)
+
+    def __copy__(self):
+        return MessageHistory(self, self.offset, self.loader)
+
+    def __deepcopy__(self, memo):
+        # The loader holds the checkpointer and its engine, which are shared, not copied
+        return MessageHistory(copy.deepcopy(list(self), memo), self.offset, self.loader)
+
+    def __reduce__(self):
+        # The loader is not picklable, so a pickled history can't page in older messages
+        return (MessageHistory, (list(self), self.offset))
+
+    def __repr__(self):
+        return f"MessageHistory(offset={self.offset}, {list.__repr__(self)})"
+
+    async def load_older(self, limit: Optional[int] = None) -> List[Any]:
+        """
+        Page in older messages in front of the loaded ones.
+
+        Args:
+            limit (Optional[int]): Maximum number of messages to load. Loads all if not given.
+
+        Returns:
+            List[Any]: The messages that were loaded.
+        """
+        if self.offset == 0 or self.loader is None:
+            return []
+        start = 0 if limit is None else max(0, self.offset - limit)
+        older = await self.loader(start, self.offset)
+        self[0:0] = older
+        self.offset = start
+        return older
+
+    async def load_first(self, count: int) -> List[Any]:
+        """
+        Get the first messages of the thread, paging in the ones that are not loaded.
+
+        The messages between them and the loaded ones are not paged in, unless
+        there are none.
+
+        Args:
+            count (int): Number of messages to get.
+        """
+        if count <= self.offset and self.loader is not None:
+            return await self.loader(0, count)
+        await self.load_older()
+        return list(self[:max(0, count - self.offset)])
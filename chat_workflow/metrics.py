@@ -0,0 +1,175 @@
+import time
+from typing import Any, Dict, Optional, Tuple
+from fastapi import Response
+from langchain_core.runnables import RunnableConfig
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+
+# Buckets in seconds, from a fast first token to a long agentic turn
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+              0.1, 0.25, 0.5, 1, 2.5)
+
+TURN_TTFT = Histogram(
+    "chat_turn_time_to_first_token_seconds",
+    "Time from receiving a message to streaming the first token of the reply",
+    ["workflow", "model"], buckets=LATENCY_BUCKETS)
+TURN_DURATION = Histogram(
+    "chat_turn_duration_seconds",
+    "Time from receiving a message to the end of the graph run",
+    ["workflow", "model"], buckets=LATENCY_BUCKETS)
+TURN_TOKENS_PER_SECOND = Histogram(
+    "chat_turn_output_tokens_per_second",
+    "Streamed output tokens per second, after the first token",
+    ["workflow", "model"], buckets=TOKENS_PER_SECOND_BUCKETS)
+NODE_DURATION = Histogram(
+    "chat_graph_node_duration_seconds",
+    "Duration of a graph node",
+    ["workflow", "model", "node"], buckets=LATENCY_BUCKETS)
+TOOL_DURATION = Histogram(
+    "chat_tool_call_duration_seconds",
+    "Duration of a tool call",
+    ["workflow", "model", "tool"], buckets=LATENCY_BUCKETS)
+DB_SAVE_DURATION = Histogram(
+    "chat_db_save_duration_seconds",
+    "Duration of a write of the chat state to the database",
+    ["workflow", "model", "operation"], buckets=DB_BUCKETS)
+
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth",
+    "Number of LLM calls waiting for a concurrency slot",
+    ["limit"])
+LLM_ACTIVE_CALLS = Gauge(
+    "llm_active_calls",
+    "Number of LLM calls holding a concurrency slot",
+    ["limit"])
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds",
+    "Time an LLM call waited for a concurrency slot",
+    ["limit"], buckets=LATENCY_BUCKETS)
+LLM_REJECTED = Counter(
+    "llm_rejected_calls",
+    "LLM calls rejected because the queue was full or the wait timed out",
+    ["limit", "reason"])
+LLM_CACHE_REQUESTS = Counter(
+    "llm_response_cache_requests",
+    "Lookups of LLM responses in the response cache",
+    ["model", "result"])
+LLM_COALESCED_CALLS = Counter(
+    "llm_coalesced_calls",
+    "LLM calls served by the stream of an identical call in flight",
+    ["model"])
+LLM_INPUT_TOKENS = Counter(
+    "llm_input_tokens",
+    "Prompt tokens sent to LLM providers, by whether the provider read them from its prompt cache, wrote them to it, or neither",
+    ["model", "cache"])
+LLM_OUTPUT_TOKENS = Counter(
+    "llm_output_tokens",
+    "Tokens generated by LLM providers",
+    ["model"])
+CACHE_REQUESTS = Counter(
+    "cache_requests",
+    "Lookups in the in-memory caches, by whether the value was fresh, stale or missing",
+    ["cache", "result"])
+CACHE_EVICTIONS = Counter(
+    "cache_evictions",
+    "Entries evicted from the in-memory caches because they were full",
+    ["cache"])
+
+
+def get_run_labels(config: Optional[RunnableConfig]) -> Tuple[str, str]:
+    """
+    Get the workflow and model labels of a graph run from the metadata of its config.
+    """
+    metadata = (config or {}).get("metadata") or {}
+    return metadata.get("workflow", ""), metadata.get("model", "")
+
+
+def record_token_usage(model: str, usage: Optional[Dict[str, Any]]):
+    """
+    Record the usage metadata of an LLM response.
+
+    Args:
+        model (str): The model name with its provider prefix.
+        usage (Optional[Dict[str, Any]]): The usage metadata of the response, if the provider reported it.
+    """
+    if not usage:
+        return
+    details = usage.get("input_token_details") or {}
+    cache_read = details.get("cache_read") or 0
+    cache_creation = details.get("cache_creation") or 0
+    LLM_INPUT_TOKENS.labels(model, "read").inc(cache_read)
+    LLM_INPUT_TOKENS.labels(model, "write").inc(cache_creation)
+    LLM_INPUT_TOKENS.labels(model, "none").inc(
+        max(0, usage.get("input_tokens", 0) - cache_read - cache_creation))
+    LLM_OUTPUT_TOKENS.labels(model).inc(usage.get("output_tokens", 0))
+
+
+class TurnMetrics:
+    """
+    Record the metrics of one chat turn from the events of its graph run.
+
+    Args:
+        workflow (str): The name of the workflow.
+        model (str): The chat model of the turn.
+        output_chat_model (str): The name of the chat model whose tokens are streamed to the user.
+    """
+
+    def __init__(self, workflow: str, model: str, output_chat_model: str):
+        self.workflow = workflow
+        self.model = model
+        self.output_chat_model = output_chat_model
+        self.start = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.output_tokens = 0
+        # Output tokens reported in the usage metadata of the chunks, if any
+        self.reported_output_tokens = 0
+        self._node_starts: Dict[str, float] = {}
+
+    def observe_event(self, event: Dict[str, Any]):
+        """
+        Record an event of `astream_events`.
+        """
+        kind = event["event"]
+        if kind == "on_chat_model_stream":
+            if event["name"] != self.output_chat_model:
+                return
+            chunk = event["data"]["chunk"]
+            usage = getattr(chunk, "usage_metadata", None)
+            if usage:
+                self.reported_output_tokens += usage.get("output_tokens", 0)
+            if chunk.content:
+                if self.first_token is None:
+                    self.first_token = time.perf_counter()
+                    TURN_TTFT.labels(self.workflow, self.model).observe(
+                        self.first_token - self.start)
+                self.output_tokens += 1
+        elif kind in ("on_chain_start", "on_chain_end"):
+            # The run of a node itself, not the runnables nested in it
+            if event.get("metadata", {}).get("langgraph_node") != event["name"]:
+                return
+            if kind == "on_chain_start":
+                self._node_starts[event["run_id"]] = time.perf_counter()
+            elif (start := self._node_starts.pop(event["run_id"], None)) is not None:
+                NODE_DURATION.labels(self.workflow, self.model, event["name"]).observe(
+                    time.perf_counter() - start)
+
+    def finish(self):
+        """
+        Record the end of the turn.
+        """
+        end = time.perf_counter()
+        TURN_DURATION.labels(self.workflow, self.model).observe(end - self.start)
+        # Streamed chunks are counted as tokens when the provider reports no usage
+        tokens = self.reported_output_tokens or self.output_tokens
+        if self.first_token is not None and tokens > 1 and end > self.first_token:
+            TURN_TOKENS_PER_SECOND.labels(self.workflow, self.model).observe(
+                (tokens - 1) / (end - self.first_token))
+
+
+async def metrics_endpoint():
+    """
+    Expose the metrics in the Prometheus text format.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,245 @@
+import asyncio
+import copy
+from typing import Any, Dict, List, Optional, Tuple
+from chainlit.logger import logger
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import START
+from .checkpoint import PostgresCheckpointSaver
+from .database import get_async_session
+from .metrics import DB_SAVE_DURATION, get_run_labels
+from .state_codec import decode_legacy_state
+from .storage_client import LangGraph
+from .workflows.base import BackgroundTask
+from .workflows.workflow_factory import WorkflowFactory
+
+
+_checkpointer: Optional[PostgresCheckpointSaver] = None
+
+
+def get_checkpointer() -> PostgresCheckpointSaver:
+    """
+    Get the process-wide checkpointer used by all compiled graphs.
+    """
+    global _checkpointer
+    if _checkpointer is None:
+        _checkpointer = PostgresCheckpointSaver(get_async_session())
+    return _checkpointer
+
+
+def get_graph_config(
+    thread_id: str, user_id: Optional[str] = None, state: Optional[Dict[str, Any]] = None
+) -> RunnableConfig:
+    """
+    Get the run config that binds a graph run to the checkpoints of a Chainlit thread.
+
+    Args:
+        thread_id (str): The Chainlit thread id.
+        user_id (Optional[str]): The user of the run, whose LLM calls are scheduled fairly with other users'.
+        state (Optional[Dict[str, Any]]): Session state of the run, whose workflow and model label its metrics.
+    """
+    config: RunnableConfig = {"configurable": {"thread_id": thread_id}}
+    if user_id:
+        config["configurable"]["user_id"] = user_id
+    if state is not None:
+        config["metadata"] = {
+            "workflow": state["chat_profile"], "model": state.get("chat_model", "")}
+    return config
+
+
+async def load_state(thread_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    Load the latest state of a thread.
+
+    The state is read from the latest checkpoint. Threads saved before
+    checkpointing was introduced are read from the legacy `langgraphs` table
+    instead; they are migrated to checkpoints the next time the session is
+    flushed.
+
+    Returns:
+        Tuple[Optional[Dict[str, Any]], int]: The state, or None if the thread has
+            no saved state, and the number of its messages already checkpointed.
+    """
+    saved = await get_checkpointer().aget_tuple(get_graph_config(thread_id))
+    if saved:
+        channel_values = saved.checkpoint["channel_values"]
+        GraphState = WorkflowFactory.get_graph_state(
+            channel_values["chat_profile"])
+        state = {key: value for key, value in channel_values.items()
+                 if key in GraphState.__annotations__}
+        logger.info(f"Loaded checkpoint for thread_id: {thread_id}")
+        return state, len(state.get("messages", []))
+
+    async with get_async_session()() as session:
+        db_graph = await session.get(LangGraph, thread_id)
+        if db_graph:
+            GraphState = WorkflowFactory.get_graph_state(db_graph.workflow)
+            state = GraphState(**decode_legacy_state(db_graph.state))
+            logger.info(f"Loaded legacy LangGraph for thread_id: {thread_id}")
+            return state, 0
+    return None, 0
+
+
+class SessionRecord:
+    """
+    Bookkeeping for a chat session whose state may not be fully checkpointed yet.
+
+    Attributes:
+        state (Dict[str, Any]): The latest state of the session.
+        checkpointed (int): Number of messages already in the checkpoint.
+        dirty (bool): Whether the state has changes that are not checkpointed,
+            e.g. updated chat settings or messages resumed from the legacy store.
+    """
+
+    def __init__(self, state: Dict[str, Any], checkpointed: int = 0, dirty: bool = True):
+        self.state = state
+        self.checkpointed = checkpointed
+        self.dirty = dirty
+
+
+# Sessions of this process, keyed by thread id
+_active_sessions: Dict[str, SessionRecord] = {}
+
+
+def track_session(thread_id: str, state: Dict[str, Any], checkpointed: Optional[int] = None, dirty: bool = True):
+    """
+    Record the latest state of a session.
+
+    Args:
+        thread_id (str): The Chainlit thread id.
+        state (Dict[str, Any]): The latest state of the session.
+        checkpointed (Optional[int]): Number of messages already in the checkpoint.
+            Keeps the previous value if not given.
+        dirty (bool): Whether the state has changes that are not checkpointed.
+    """
+    record = _active_sessions.get(thread_id)
+    if record is None:
+        _active_sessions[thread_id] = SessionRecord(
+            state, checkpointed or 0, dirty)
+        return
+    record.state = state
+    record.dirty = dirty
+    if checkpointed is not None:
+        record.checkpointed = checkpointed
+
+
+def untrack_session(thread_id: str):
+    _active_sessions.pop(thread_id, None)
+
+
+def get_graph_input(thread_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the input of a graph run from the session state.
+
+    Messages are accumulated by the graph, so only the messages that are not
+    in the checkpoint yet are passed along with the other state fields.
+    """
+    record = _active_sessions.get(thread_id)
+    checkpointed = record.checkpointed if record else 0
+    return {**state, "messages": list(state["messages"][checkpointed:])}
+
+
+# Background tasks of the last turn, keyed by thread id
+_background_runs: Dict[str, asyncio.Task] = {}
+
+
+def run_in_background(
+    thread_id: str, tasks: List[BackgroundTask], state: Dict[str, Any], config: RunnableConfig
+):
+    """
+    Run the background tasks of a workflow on a snapshot of the session state.
+
+    Their updates are applied by apply_background_run on a later turn, so the
+    turns themselves never wait for them. Skipped while a previous run of the
+    thread is still going.
+    """
+    previous = _background_runs.get(thread_id)
+    if previous is not None and not previous.done():
+        return
+    snapshot = {**state, "messages": copy.copy(state["messages"])}
+
+    async def run() -> Dict[str, Any]:
+        update: Dict[str, Any] = {}
+        for task in tasks:
+            update.update(await task({**snapshot, **update}, config) or {})
+        return update
+
+    _background_runs[thread_id] = asyncio.create_task(run())
+
+
+def _apply_result(task: asyncio.Task, state: Optional[Dict[str, Any]]) -> bool:
+    try:
+        result = task.result()
+    except Exception as e:
+        logger.error(f"Error in background run: {str(e)}")
+        return False
+    if state is None or not result:
+        return False
+    state.update(
+        {key: value for key, value in result.items() if key != "messages"})
+    return True
+
+
+def apply_background_run(thread_id: str, state: Dict[str, Any]) -> bool:
+    """
+    Apply the result of the background run of a thread if it has finished.
+
+    Returns:
+        bool: Whether the state was updated.
+    """
+    task = _background_runs.get(thread_id)
+    if task is None or not task.done():
+        return False
+    del _background_runs[thread_id]
+    return _apply_result(task, state)
+
+
+async def wait_for_background_run(thread_id: str, state: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Wait for the background run of a thread, if any, and apply its result.
+
+    Args:
+        thread_id (str): The Chainlit thread id.
+        state (Optional[Dict[str, Any]]): Session state to update with the fields set by the run.
+
+    Returns:
+        bool: Whether the state was updated.
+    """
+    task = _background_runs.pop(thread_id, None)
+    if task is None:
+        return False
+    await asyncio.wait([task])
+    return _apply_result(task, state)
+
+
+async def flush_session(thread_id: str):
+    """
+    Write the pending changes of a session to its checkpoint.
+    """
+    record = _active_sessions.get(thread_id)
+    if await wait_for_background_run(thread_id, record.state if record else None):
+        record.dirty = True
+    if record is None or not record.dirty:
+        return
+    try:
+        graph = WorkflowFactory.get_graph(record.state["chat_profile"])
+        # Written as graph input, so the next run picks it up like a new turn
+        config = get_graph_config(thread_id, state=record.state)
+        with DB_SAVE_DURATION.labels(*get_run_labels(config), "flush").time():
+            await graph.aupdate_state(
+                config,
+                get_graph_input(thread_id, record.state),
+                as_node=START,
+            )
+        record.checkpointed = len(record.state["messages"])
+        record.dirty = False
+        logger.info(f"Flushed session state for thread_id: {thread_id}")
+    except Exception as e:
+        logger.error(f"Error flushing session state: {str(e)}")
+
+
+async def flush_active_sessions():
+    """
+    Flush all sessions of this process. Called on shutdown (e.g. SIGTERM).
+    """
+    for thread_id in list(_active_sessions.keys()):
+        await flush_session(thread_id)
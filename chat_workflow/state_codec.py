@@ -0,0 +1,150 @@
+import ast
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+import msgpack
+import zstandard
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer, _msgpack_default, _msgpack_ext_hook
+
+
+# Version of the layout of the encoded values, stored with every value
+SCHEMA_VERSION = 1
+
+# Fields of the messages, in the order they are encoded. The position of a
+# class is its code, so classes are only ever appended. Changing the fields of
+# a class requires a new SCHEMA_VERSION and a migration.
+MESSAGE_SCHEMAS: List[Tuple[Type[BaseMessage], Tuple[str, ...]]] = [
+    (HumanMessage, ("content", "additional_kwargs", "response_metadata", "name", "id", "example")),
+    (AIMessage, ("content", "additional_kwargs", "response_metadata", "name", "id", "example",
+                 "tool_calls", "invalid_tool_calls", "usage_metadata")),
+    (SystemMessage, ("content", "additional_kwargs", "response_metadata", "name", "id")),
+    (ToolMessage, ("content", "additional_kwargs", "response_metadata", "name", "id",
+                   "tool_call_id", "artifact", "status")),
+    (AIMessageChunk, ("content", "additional_kwargs", "response_metadata", "name", "id", "example",
+                      "tool_calls", "invalid_tool_calls", "usage_metadata", "tool_call_chunks")),
+]
+MESSAGE_CODES = {cls: code for code, (cls, _) in enumerate(MESSAGE_SCHEMAS)}
+
+# msgpack extension type of the messages, after the ones of JsonPlusSerializer
+MESSAGE_EXT = 16
+
+# Migrations of the values encoded with an older schema version, by the version they migrate from
+MIGRATIONS: Dict[int, Callable[[Any], Any]] = {}
+
+
+def _default(obj: Any) -> Any:
+    code = MESSAGE_CODES.get(type(obj))
+    if code is None:
+        return _msgpack_default(obj)
+    fields = MESSAGE_SCHEMAS[code][1]
+    data = obj.__dict__
+    return msgpack.ExtType(MESSAGE_EXT, msgpack.packb(
+        [code, *(data[field] for field in fields)], default=_default))
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code != MESSAGE_EXT:
+        return _msgpack_ext_hook(code, data)
+    values = msgpack.unpackb(data, ext_hook=_ext_hook, strict_map_key=False)
+    cls, fields = MESSAGE_SCHEMAS[values[0]]
+    # The fields were validated when the message was created
+    return cls.model_construct(**dict(zip(fields, values[1:])))
+
+
+class StateCodec(SerializerProtocol):
+    """
+    Serializer of graph states, checkpoints and messages.
+
+    Values are encoded with msgpack, and messages with a fixed layout per
+    message class, so they are decoded without validation or imports. Values
+    of an older SCHEMA_VERSION are migrated on read. Payloads of at least
+    `compression_threshold` bytes are compressed with zstd.
+
+    Values of other types, and payloads written by JsonPlusSerializer before
+    this codec was introduced, are handled by JsonPlusSerializer.
+
+    Args:
+        compression_level (Optional[int]): The zstd level, 0 to disable compression.
+            Defaults to STATE_COMPRESSION_LEVEL (3).
+        compression_threshold (Optional[int]): Size in bytes from which payloads are compressed.
+            Defaults to STATE_COMPRESSION_THRESHOLD (4096).
+    """
+
+    def __init__(self, compression_level: Optional[int] = None, compression_threshold: Optional[int] = None):
+        if compression_level is None:
+            compression_level = int(os.getenv("STATE_COMPRESSION_LEVEL", "3"))
+        if compression_threshold is None:
+            compression_threshold = int(
+                os.getenv("STATE_COMPRESSION_THRESHOLD", "4096"))
+        self.compression_level = compression_level
+        self.compression_threshold = compression_threshold
+        self._fallback = JsonPlusSerializer()
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._fallback.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self._fallback.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if isinstance(obj, (bytes, bytearray)):
+            return self._fallback.dumps_typed(obj)
+        try:
+            payload = msgpack.packb([SCHEMA_VERSION, obj], default=_default)
+        except UnicodeEncodeError:
+            return self._fallback.dumps_typed(obj)
+        if self.compression_level and len(payload) >= self.compression_threshold:
+            return "state+zstd", zstandard.compress(payload, self.compression_level)
+        return "state", payload
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ == "state+zstd":
+            payload = zstandard.decompress(payload)
+        elif type_ != "state":
+            return self._fallback.loads_typed(data)
+        version, value = msgpack.unpackb(
+            payload, ext_hook=_ext_hook, strict_map_key=False)
+        while version < SCHEMA_VERSION:
+            value = MIGRATIONS[version](value)
+            version += 1
+        return value
+
+
+LEGACY_MESSAGE_CLASSES = {
+    "human": HumanMessage,
+    "ai": AIMessage,
+    "tool": ToolMessage,
+    "system": SystemMessage,
+}
+
+
+def decode_legacy_state(serialized_state: str) -> Dict[str, Any]:
+    """
+    Decode a state of the legacy `langgraphs` table.
+
+    The states were saved as JSON, with the messages as their model dump and
+    other objects as their `__dict__` or `str`. Strings that are Python
+    literals are read back as such.
+    """
+    state = json.loads(serialized_state)
+    state["messages"] = [
+        LEGACY_MESSAGE_CLASSES.get(message.get("type"), BaseMessage).model_validate(message)
+        for message in state["messages"]
+    ]
+    for key, value in state.items():
+        if isinstance(value, str):
+            try:
+                state[key] = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                pass
+    return state
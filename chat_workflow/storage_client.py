@@ -1,10 +1,12 @@
+import asyncio
 import boto3
 import hashlib
+import os
 import uuid
-from typing import Any, Dict, Union
+from typing import Any, Dict, Optional, Tuple, Union
 from chainlit.logger import logger
 from chainlit.data.base import BaseStorageClient
-from sqlalchemy import Column, String, Boolean, Integer, ForeignKey, Text, JSON
+from sqlalchemy import Column, String, Boolean, Integer, ForeignKey, Text, JSON, LargeBinary, DateTime
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB, ARRAY
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -58,15 +60,90 @@ class MinIOStorageClient(BaseStorageClient):
                 md5_hash = hashlib.md5(data if isinstance(
                     data, bytes) else data.encode('utf-8')).digest()
                 extra_args["ContentMD5"] = md5_hash
-            self.client.put_object(
+            if not overwrite and await self.file_exists(object_key):
+                return {"object_key": object_key, "url": self.get_url(object_key)}
+            await asyncio.to_thread(
+                self.client.put_object,
                 Bucket=self.bucket, Key=object_key, Body=data, **extra_args
             )
-            url = f"{self.client.meta.endpoint_url}/{self.bucket}/{object_key}"
-            return {"object_key": object_key, "url": url}
+            return {"object_key": object_key, "url": self.get_url(object_key)}
         except Exception as e:
             logger.warning(f"MinIOStorageClient, upload_file error: {e}")
             return {}
 
+    def get_url(self, object_key: str) -> str:
+        return f"{self.client.meta.endpoint_url}/{self.bucket}/{object_key}"
+
+    async def file_exists(self, object_key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=object_key)
+            return True
+        except Exception:
+            return False
+
+    async def download_file(self, object_key: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Get the content and mime type of an object, or None if it can't be read.
+        """
+        try:
+            response = await asyncio.to_thread(
+                self.client.get_object, Bucket=self.bucket, Key=object_key)
+            data = await asyncio.to_thread(response["Body"].read)
+            return data, response.get("ContentType", "application/octet-stream")
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") != "NoSuchKey":
+                logger.warning(
+                    f"MinIOStorageClient, download_file error: {e}")
+            return None
+
+    def get_presigned_url(self, object_key: str, expires_in: int = 3600) -> Optional[str]:
+        """
+        Get a URL that grants read access to an object for `expires_in` seconds.
+        """
+        try:
+            return self.client.generate_presigned_url(
+                "get_object", Params={"Bucket": self.bucket, "Key": object_key}, ExpiresIn=expires_in)
+        except Exception as e:
+            logger.warning(f"MinIOStorageClient, get_presigned_url error: {e}")
+            return None
+
+
+_storage_client: Optional[MinIOStorageClient] = None
+
+
+def get_storage_client() -> MinIOStorageClient:
+    """
+    Get the process-wide MinIO client, configured by the MINIO_* env vars.
+    """
+    global _storage_client
+    if _storage_client is None:
+        _storage_client = MinIOStorageClient(
+            bucket=os.getenv("MINIO_BUCKET", "mybucket"),
+            endpoint_url=os.getenv("MINIO_ENDPOINT_URL", "http://minio:9000"),
+            access_key=os.getenv("MINIO_ROOT_USER", "chainlit_langgraph"),
+            secret_key=os.getenv("MINIO_ROOT_PASSWORD", "chainlit_langgraph"),
+        )
+    return _storage_client
+
+
+class LazyStorageClient(BaseStorageClient):
+    """
+    Storage provider of the Chainlit data layer that connects to MinIO on the first upload.
+
+    Creating the MinIO client checks its bucket, which retries for seconds when
+    MinIO is not reachable, so it is not done when the app is imported.
+    """
+
+    async def upload_file(
+        self,
+        object_key: str,
+        data: Union[bytes, str],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+    ) -> Dict[str, Any]:
+        storage_client = await asyncio.to_thread(get_storage_client)
+        return await storage_client.upload_file(object_key, data, mime, overwrite)
+
 
 Base = declarative_base()
 
@@ -152,3 +229,44 @@ class LangGraph(Base):
     thread_id = Column(String, primary_key=True)
     state = Column(JSON, nullable=False)
     workflow = Column(String, nullable=False)
+
+
+class LangGraphCheckpoint(Base):
+    __tablename__ = 'langgraph_checkpoints'
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, primary_key=True)
+    parent_checkpoint_id = Column(String)
+    type = Column(String)
+    checkpoint = Column(LargeBinary, nullable=False)
+    metadata_type = Column(String)
+    metadata_ = Column("metadata", LargeBinary, nullable=False)
+
+
+class LangGraphWrite(Base):
+    __tablename__ = 'langgraph_writes'
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, primary_key=True)
+    task_id = Column(String, primary_key=True)
+    idx = Column(Integer, primary_key=True)
+    channel = Column(String, nullable=False)
+    type = Column(String)
+    value = Column(LargeBinary)
+
+
+class LangGraphMessage(Base):
+    __tablename__ = 'langgraph_messages'
+    thread_id = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    type = Column(String)
+    payload = Column(LargeBinary, nullable=False)
+
+
+class CacheEntry(Base):
+    __tablename__ = 'cache_entries'
+    key = Column(String, primary_key=True)
+    type = Column(String)
+    payload = Column(LargeBinary, nullable=False)
+    stored_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), index=True)
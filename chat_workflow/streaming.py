@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from typing import Any, List, Optional, Type
+import chainlit as cl
+
+
+def chunk_to_text(content: Any) -> str:
+    """
+    Convert the content of a streamed chat model chunk to plain text.
+
+    Providers return either a string or a list of content blocks.
+    """
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list) and len(content) > 0:
+        if isinstance(content[0], str):
+            return " ".join(content)
+        if isinstance(content[0], dict) and "text" in content[0]:
+            return " ".join([c["text"] for c in content if "text" in c])
+    return ""
+
+
+class TokenStreamer:
+    """
+    Coalesce streamed tokens into fewer UI updates.
+
+    The first token is sent immediately to keep the time to first token low.
+    Subsequent tokens are buffered and flushed to the UI once the flush interval
+    has elapsed since the previous flush or the buffer exceeds its size limit,
+    whichever comes first. Every flush is a single websocket frame.
+
+    Args:
+        flush_interval (Optional[float]): Seconds between flushes. 0 streams every token.
+            Defaults to STREAM_FLUSH_INTERVAL_MS (40 ms).
+        max_buffer_size (Optional[int]): Number of buffered characters that triggers an
+            immediate flush. Defaults to STREAM_FLUSH_MAX_CHARS (512).
+        message_class (Type[cl.Message]): The message class used to create the UI message.
+    """
+
+    def __init__(
+        self,
+        flush_interval: Optional[float] = None,
+        max_buffer_size: Optional[int] = None,
+        message_class: Type[cl.Message] = cl.Message,
+    ):
+        if flush_interval is None:
+            flush_interval = float(
+                os.getenv("STREAM_FLUSH_INTERVAL_MS", "40")) / 1000
+        if max_buffer_size is None:
+            max_buffer_size = int(os.getenv("STREAM_FLUSH_MAX_CHARS", "512"))
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self.message_class = message_class
+        self.message: Optional[cl.Message] = None
+        self.frames = 0
+        self._buffer: List[str] = []
+        self._buffer_size = 0
+        self._last_flush = 0.0
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def push(self, token: str):
+        """
+        Add a token to the stream.
+        """
+        # Chunks of tool calls have no text, and must not take the place of the first token
+        if not token:
+            return
+        if self.message is None:
+            self.message = self.message_class(content=token)
+            await self.message.send()
+            self.frames += 1
+            self._last_flush = time.monotonic()
+            return
+
+        self._buffer.append(token)
+        self._buffer_size += len(token)
+        elapsed = time.monotonic() - self._last_flush
+        if self._buffer_size >= self.max_buffer_size or elapsed >= self.flush_interval:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(
+                self._flush_later(self.flush_interval - elapsed))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """
+        Send all buffered tokens to the UI as one update.
+        """
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._buffer or self.message is None:
+                return
+            text = "".join(self._buffer)
+            self._buffer = []
+            self._buffer_size = 0
+            self._last_flush = time.monotonic()
+            await self.message.stream_token(token=text)
+            self.frames += 1
+
+    async def close(self) -> Optional[cl.Message]:
+        """
+        Flush the remaining tokens and finalize the UI message.
+        """
+        await self.flush()
+        if self.message is not None:
+            await self.message.update()
+        return self.message
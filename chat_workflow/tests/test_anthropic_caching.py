@@ -0,0 +1,52 @@
+from chat_workflow.llm.providers.anthropic import AnthropicProvider, PromptCachingChatAnthropic, add_cache_breakpoints
+
+
+def count_breakpoints(value) -> int:
+    if isinstance(value, dict):
+        return ("cache_control" in value) + sum(count_breakpoints(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(count_breakpoints(v) for v in value)
+    return 0
+
+
+def test_add_cache_breakpoints():
+    payload = add_cache_breakpoints({
+        "system": "You are a helpful assistant.",
+        "tools": [{"name": "a"}, {"name": "b"}],
+        "messages": [
+            {"role": "user", "content": "first"},
+            {"role": "assistant", "content": "reply"},
+            {"role": "user", "content": [{"type": "text", "text": "second"}]},
+            {"role": "assistant", "content": "reply"},
+            {"role": "user", "content": "third"},
+        ],
+    })
+    assert payload["system"] == [{"type": "text", "text": "You are a helpful assistant.",
+                                  "cache_control": {"type": "ephemeral"}}]
+    assert "cache_control" not in payload["tools"][0]
+    assert "cache_control" in payload["tools"][1]
+    messages = payload["messages"]
+    assert messages[0]["content"] == "first"
+    assert messages[2]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert messages[4]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert count_breakpoints(payload) == 4
+
+
+def test_prompt_caching_setting():
+    def create_model(prompt_caching):
+        return AnthropicProvider(prompt_caching=prompt_caching).create_model(
+            "chat_model", "claude-3-5-haiku-20241022", api_key="test")
+    assert isinstance(create_model(True), PromptCachingChatAnthropic)
+    assert not isinstance(create_model(False), PromptCachingChatAnthropic)
+
+
+def test_models_share_http_clients():
+    provider = AnthropicProvider()
+    first, second = (provider.create_model("chat_model", "claude-3-5-haiku-20241022", api_key="test")
+                     for _ in range(2))
+    assert first._client._client is second._client._client
+    assert first._async_client._client is second._async_client._client
+    other = provider.create_model("chat_model", "claude-3-5-haiku-20241022",
+                                  api_key="test", base_url="http://localhost:8080")
+    assert other._client._client is not first._client._client
+    assert str(other._client.base_url).startswith("http://localhost:8080")
@@ -0,0 +1,111 @@
+import asyncio
+import math
+import uuid
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from chat_workflow.cache import Cache, DiskCacheTier, PostgresCacheTier
+from chat_workflow.database import get_pg_url
+from chat_workflow.storage_client import Base
+
+
+@pytest_asyncio.fixture
+async def async_session():
+    """Sessions on the database configured by the POSTGRES_* env vars, if reachable"""
+    engine = create_async_engine(get_pg_url())
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[
+                Base.metadata.tables["cache_entries"],
+            ])
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"Postgres is not available: {e}")
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+def make_loader(values: list):
+    calls = []
+
+    async def loader():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        return values[len(calls) - 1]
+    return loader, calls
+
+
+def test_lru_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("chat_workflow.cache.time.monotonic", lambda: now[0])
+    cache = Cache("test_lru_and_ttl", max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    # "b" is the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    now[0] += 61
+    assert cache.get("a") is None
+    assert cache.get_stats() == {"size": 1, "loading": 0,
+                                 "hit": 2, "stale": 0, "miss": 2, "eviction": 1}
+
+
+@pytest.mark.asyncio
+async def test_loads_are_shared():
+    cache = Cache("test_loads_are_shared")
+    loader, calls = make_loader(["v1"])
+    assert await asyncio.gather(*[cache.aget("k", loader) for _ in range(5)]) == ["v1"] * 5
+    assert len(calls) == 1
+    assert await cache.aget("k", loader) == "v1"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate():
+    # Values are stale as soon as they are stored
+    cache = Cache("test_stale_while_revalidate", ttl=0, stale_ttl=math.inf)
+    loader, calls = make_loader(["v1", "v2"])
+    assert cache.get_or_refresh("k", loader) is None
+    await asyncio.gather(*cache._loads.values())
+    # The stale value is returned at once, and refreshed in the background
+    assert await cache.aget("k", loader) == "v1"
+    assert cache.get_or_refresh("k", loader) == "v1"
+    await asyncio.gather(*cache._loads.values())
+    assert cache.peek("k") == "v2"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_loads_are_not_cached():
+    cache = Cache("test_failed_loads_are_not_cached")
+
+    async def loader():
+        raise ValueError("unavailable")
+    with pytest.raises(ValueError):
+        await cache.aget("k", loader)
+    assert cache.get("k") is None
+    assert cache.get_stats()["loading"] == 0
+
+
+@pytest.mark.asyncio
+async def test_disk_tier(tmp_path):
+    loader, calls = make_loader([{"a": {1, 2}}])
+    await Cache("test_disk_tier", ttl=60, tiers=[DiskCacheTier(str(tmp_path))]).aget("k", loader)
+    # Another process, or the same one after a restart
+    cache = Cache("test_disk_tier", ttl=60, tiers=[DiskCacheTier(str(tmp_path))])
+    assert cache.get_or_refresh("k", loader) == {"a": {1, 2}}
+    assert len(calls) == 1
+    assert await Cache("other", tiers=[DiskCacheTier(str(tmp_path))]).aget("k") is None
+
+
+@pytest.mark.asyncio
+async def test_postgres_tier(async_session):
+    key = str(uuid.uuid4())
+    await Cache("test_postgres_tier", ttl=60, tiers=[PostgresCacheTier(async_session)]).aset(key, [1, "a"])
+    cache = Cache("test_postgres_tier", ttl=60, tiers=[PostgresCacheTier(async_session)])
+    assert await cache.aget(key) == [1, "a"]
+    assert cache.get(key) == [1, "a"]
+    assert await cache.aget(str(uuid.uuid4())) is None
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import pytest
+from typing import List
+from chat_workflow.llm.capabilities import ModelCapability
+from chat_workflow.llm.catalog import ModelCatalog
+from chat_workflow.llm.factory import LLMFactory
+from chat_workflow.llm.providers.stub import StubProvider
+
+
+class FlakyProvider(StubProvider):
+    """Lists its models once, then fails or hangs"""
+
+    def __init__(self, hang: bool = False):
+        super().__init__(enabled=True)
+        self.calls = 0
+        self.hang = hang
+
+    async def alist_models(self) -> List[str]:
+        self.calls += 1
+        if self.calls > 1:
+            if self.hang:
+                await asyncio.sleep(60)
+            raise RuntimeError("unavailable")
+        return self.list_models()
+
+
+def make_catalog(tmp_path, **providers) -> ModelCatalog:
+    factory = LLMFactory()
+    for prefix, provider in providers.items():
+        factory.register_provider(prefix, provider)
+    return ModelCatalog(factory, timeout=0.1, cache_dir=str(tmp_path))
+
+
+def test_list_models_by_capability(tmp_path):
+    catalog = make_catalog(tmp_path, stub=StubProvider(enabled=True),
+                           off=StubProvider(enabled=False))
+    assert catalog.list_models() == ["(stub)stub-chat"]
+    assert catalog.list_models(
+        {ModelCapability.TOOL_CALLING, ModelCapability.IMAGE_TO_TEXT}) == ["(stub)stub-chat"]
+    assert catalog.list_models({ModelCapability.TEXT_EMBEDDING}) == []
+
+
+@pytest.mark.asyncio
+async def test_failed_providers_keep_their_models(tmp_path):
+    flaky, hanging = FlakyProvider(), FlakyProvider(hang=True)
+    catalog = make_catalog(tmp_path, flaky=flaky, hanging=hanging)
+    await catalog.refresh()
+    await catalog.refresh()
+    assert (flaky.calls, hanging.calls) == (2, 2)
+    assert sorted(catalog.list_models()) == ["(flaky)stub-chat", "(hanging)stub-chat"]
+
+    # A restart lists the saved models without waiting for the providers
+    restarted = make_catalog(tmp_path, flaky=FlakyProvider(), hanging=FlakyProvider())
+    assert sorted(restarted.list_models()) == ["(flaky)stub-chat", "(hanging)stub-chat"]
+
+
+@pytest.mark.asyncio
+async def test_refreshed_in_background(tmp_path):
+    provider = FlakyProvider()
+    catalog = make_catalog(tmp_path, stub=provider)
+    catalog.refresh_interval = 0.01
+    catalog.start()
+    await asyncio.sleep(0.05)
+    await catalog.stop()
+    assert provider.calls > 1
+    assert catalog.list_models() == ["(stub)stub-chat"]
+
+
+@pytest.mark.asyncio
+async def test_saved_catalog_of_other_providers(tmp_path):
+    catalog = make_catalog(tmp_path, stub=StubProvider(enabled=True))
+    await catalog.refresh()
+    entry = json.loads(next(tmp_path.iterdir()).read_text())
+    assert entry["expires_at"] is not None
+
+    # Not listed once the configured providers change
+    restarted = make_catalog(tmp_path, other=FlakyProvider())
+    await restarted.wait_until_loaded()
+    assert restarted.list_models() == ["(other)stub-chat"]
+    restarted = make_catalog(tmp_path, stub=FlakyProvider(),
+                             off=StubProvider(enabled=False))
+    assert restarted.list_models() == ["(stub)stub-chat"]
@@ -0,0 +1,172 @@
+import operator
+import uuid
+import pytest
+import pytest_asyncio
+from typing import Annotated, Sequence, TypedDict
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import StateGraph, END, START
+from prometheus_client import REGISTRY
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from chat_workflow.checkpoint import MessageLogConflictError, PostgresCheckpointSaver
+from chat_workflow.database import get_pg_url
+from chat_workflow.storage_client import Base, LangGraphMessage
+
+
+class GraphState(TypedDict):
+    messages: Annotated[Sequence, operator.add]
+    chat_model: str
+
+
+async def chat_node(state: GraphState) -> GraphState:
+    return {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]}
+
+
+@pytest_asyncio.fixture
+async def checkpointer():
+    """Checkpointer on the database configured by the POSTGRES_* env vars, if reachable"""
+    engine = create_async_engine(get_pg_url())
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[
+                Base.metadata.tables["langgraph_checkpoints"],
+                Base.metadata.tables["langgraph_writes"],
+                Base.metadata.tables["langgraph_messages"],
+            ])
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"Postgres is not available: {e}")
+    yield PostgresCheckpointSaver(sessionmaker(engine, class_=AsyncSession, expire_on_commit=False), message_cache_size=2)
+    await engine.dispose()
+
+
+def build_graph(checkpointer):
+    graph = StateGraph(GraphState)
+    graph.add_node("chat", chat_node)
+    graph.set_entry_point("chat")
+    graph.add_edge("chat", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+@pytest.fixture
+def graph(checkpointer):
+    return build_graph(checkpointer)
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_per_turn(graph):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    await graph.ainvoke({"messages": [HumanMessage(content="hi")], "chat_model": "a"}, config)
+    state = await graph.ainvoke({"messages": [HumanMessage(content="again")]}, config)
+    assert [m.content for m in state["messages"]] == [
+        "hi", "reply 1", "again", "reply 3"]
+    assert state["chat_model"] == "a"
+
+    snapshot = await graph.aget_state(config)
+    assert len(snapshot.values["messages"]) == 4
+    history = [s async for s in graph.aget_state_history(config)]
+    assert len(history) == 6
+    assert len([s async for s in graph.aget_state_history(config, limit=2)]) == 2
+    assert len([s async for s in graph.aget_state_history(config, filter={"source": "input"})]) == 2
+
+
+@pytest.mark.asyncio
+async def test_save_duration_labels(graph):
+    labels = {"workflow": "test_save_duration_labels", "model": "a"}
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}, "metadata": dict(labels)}
+    await graph.ainvoke({"messages": [HumanMessage(content="hi")], "chat_model": "a"}, config)
+    for operation in ["checkpoint", "writes"]:
+        assert REGISTRY.get_sample_value(
+            "chat_db_save_duration_seconds_count", {**labels, "operation": operation}) > 0
+
+
+@pytest.mark.asyncio
+async def test_seed_and_update_state(graph):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    await graph.aupdate_state(config, {"messages": [HumanMessage(content="old")], "chat_model": "a"}, as_node=START)
+    await graph.aupdate_state(config, {"chat_model": "b"}, as_node=START)
+    state = await graph.ainvoke({"messages": [HumanMessage(content="new")]}, config)
+    assert [m.content for m in state["messages"]] == ["old", "new", "reply 2"]
+    assert state["chat_model"] == "b"
+
+    await graph.aupdate_state(config, {"chat_model": "c"}, as_node=START)
+    state = await graph.ainvoke({"messages": [HumanMessage(content="next")]}, config)
+    assert [m.content for m in state["messages"]] == [
+        "old", "new", "reply 2", "next", "reply 4"]
+    assert state["chat_model"] == "c"
+
+
+@pytest.mark.asyncio
+async def test_unknown_thread(checkpointer):
+    assert await checkpointer.aget_tuple({"configurable": {"thread_id": str(uuid.uuid4())}}) is None
+
+
+@pytest.mark.asyncio
+async def test_messages_are_appended_once(graph, checkpointer):
+    thread_id = str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    await graph.ainvoke({"messages": [HumanMessage(content="hi")], "chat_model": "a"}, config)
+    await graph.ainvoke({"messages": [HumanMessage(content="again")]}, config)
+
+    async with checkpointer.async_session() as session:
+        rows = (await session.execute(
+            select(LangGraphMessage).where(LangGraphMessage.thread_id == thread_id)
+            .order_by(LangGraphMessage.seq))).scalars().all()
+    assert [row.seq for row in rows] == [0, 1, 2, 3]
+
+    # A cold saver reassembles the state from the message log
+    cold = PostgresCheckpointSaver(checkpointer.async_session)
+    saved = await cold.aget_tuple(config)
+    assert [m.content for m in saved.checkpoint["channel_values"]["messages"]] == [
+        "hi", "reply 1", "again", "reply 3"]
+    assert saved.checkpoint["channel_values"]["chat_model"] == "a"
+    history = [s async for s in cold.alist(config)]
+    assert [len(s.checkpoint["channel_values"].get("messages", [])) for s in history] == [
+        4, 3, 2, 2, 1, 0]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_appends_conflict(graph, checkpointer):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    await graph.ainvoke({"messages": [HumanMessage(content="hi")], "chat_model": "a"}, config)
+    # Another worker runs a turn while this one still has the previous state
+    saved = await checkpointer.aget_tuple(config)
+    await build_graph(PostgresCheckpointSaver(checkpointer.async_session)).ainvoke(
+        {"messages": [HumanMessage(content="from other")]}, config)
+    checkpoint = {**saved.checkpoint, "id": str(uuid.uuid4()), "channel_values": {
+        **saved.checkpoint["channel_values"],
+        "messages": saved.checkpoint["channel_values"]["messages"] + [HumanMessage(content="from first")]}}
+    with pytest.raises(MessageLogConflictError):
+        await checkpointer.aput(saved.config, checkpoint, {}, {})
+    with pytest.raises(MessageLogConflictError):
+        await checkpointer.aput(saved.config, checkpoint, {}, {})
+
+    # Loading the thread again picks up the messages of the other worker
+    state = await graph.ainvoke({"messages": [HumanMessage(content="again")]}, config)
+    assert [m.content for m in state["messages"]] == [
+        "hi", "reply 1", "from other", "reply 3", "again", "reply 5"]
+
+
+@pytest.mark.asyncio
+async def test_windowed_resume(graph, checkpointer):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    for content in ["a", "b", "c"]:
+        await graph.ainvoke({"messages": [HumanMessage(content=content)], "chat_model": "a"}, config)
+
+    # A cold saver only loads the last messages of the thread
+    cold = PostgresCheckpointSaver(checkpointer.async_session, resume_window=3)
+    messages = (await cold.aget_tuple(config)).checkpoint["channel_values"]["messages"]
+    assert messages.offset == 3
+    assert [m.content for m in messages] == ["reply 3", "c", "reply 5"]
+
+    # New messages are appended after the full history
+    thread_id = config["configurable"]["thread_id"]
+    state = await build_graph(cold).ainvoke({"messages": [HumanMessage(content="d")]}, config)
+    assert [m.content for m in state["messages"]] == ["reply 3", "c", "reply 5", "d", "reply 4"]
+    full = await checkpointer.aload_messages(thread_id, 0, 10)
+    assert [m.content for m in full] == [
+        "a", "reply 1", "b", "reply 3", "c", "reply 5", "d", "reply 4"]
+
+    await state["messages"].load_older(limit=1)
+    assert [m.content for m in state["messages"]][:2] == ["b", "reply 3"]
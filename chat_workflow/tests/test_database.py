@@ -0,0 +1,36 @@
+import pytest
+from chat_workflow import database
+
+
+@pytest.fixture(autouse=True)
+def reset_engine(monkeypatch):
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(database, "_async_session", None)
+
+
+def test_engine_is_shared():
+    assert database.get_engine() is database.get_engine()
+    assert database.get_async_session() is database.get_async_session()
+
+
+def test_pool_configured_from_env(monkeypatch):
+    monkeypatch.setenv("POSTGRES_POOL_SIZE", "3")
+    monkeypatch.setenv("POSTGRES_MAX_OVERFLOW", "2")
+    engine = database.get_engine()
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 2
+
+
+def test_pool_stats():
+    assert database.get_pool_stats() == {}
+    database.get_engine()
+    stats = database.get_pool_stats()
+    assert stats["checked_out"] == 0
+    assert set(stats) == {"size", "checked_in", "checked_out", "overflow"}
+
+
+@pytest.mark.asyncio
+async def test_dispose_engine():
+    engine = database.get_engine()
+    await database.dispose_engine()
+    assert database.get_engine() is not engine
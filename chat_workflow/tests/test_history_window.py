@@ -0,0 +1,102 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from chat_workflow.message_history import MessageHistory
+from chat_workflow.workflows.base import HistoryWindow, count_tokens
+from chat_workflow.workflows.resume_optimizer import ResumeOptimizerWorkflow
+
+
+def human(content: str) -> HumanMessage:
+    # 40 characters are 10 tokens plus the message overhead
+    return HumanMessage(content=content * 40)
+
+
+def test_count_tokens_is_cached():
+    message = human("a")
+    assert count_tokens(message) == 14
+    # The message itself is not modified
+    assert message.response_metadata == {}
+    message.content = ""
+    assert count_tokens(message) == 14
+    assert count_tokens(human("")) == 4
+
+
+def test_count_tokens_uses_usage_metadata():
+    message = AIMessage(content="hi", usage_metadata={
+                        "input_tokens": 10, "output_tokens": 100, "total_tokens": 110})
+    assert count_tokens(message) == 104
+
+
+def test_count_tokens_of_images():
+    message = HumanMessage(content=[
+        {"type": "text", "text": "a" * 40},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}},
+    ])
+    assert count_tokens(message) == 14 + 765
+
+
+def test_get_budget():
+    window = HistoryWindow(context_ratio=0.5, default_context_window=1000)
+    assert window.get_budget("(openai)gpt-4o") == 64000
+    assert window.get_budget("(ollama)unknown") == 500
+    assert HistoryWindow(max_tokens=100).get_budget("(openai)gpt-4o") == 100
+
+
+def test_trim_keeps_recent_messages():
+    window = HistoryWindow()
+    messages = [SystemMessage(content="s"), human("a"),
+                human("b"), human("c"), human("d")]
+    trimmed = window.trim(messages, budget=5 + 14 * 2)
+    assert [m.content[0] for m in trimmed] == ["s", "c", "d"]
+    trimmed = window.trim(messages, budget=5 + 14 * 2, keep_first=1)
+    assert [m.content[0] for m in trimmed] == ["s", "a", "d"]
+    # The latest message is kept even if it is over budget
+    assert window.trim(messages, budget=0) == [messages[0], messages[-1]]
+
+
+def test_trim_keeps_tool_call_pairs():
+    window = HistoryWindow()
+    tool_call = AIMessage(content="", tool_calls=[
+                          {"name": "search", "args": {}, "id": "1"}])
+    messages = [human("a"), tool_call, ToolMessage(
+        content="r" * 400, tool_call_id="1"), AIMessage(content="x" * 40), human("b")]
+    # The tool result fits but its tool call does not
+    trimmed = window.trim(messages, budget=14 * 2 + 104)
+    assert trimmed == messages[3:]
+    # A pending tool result is kept with its tool call
+    trimmed = window.trim(messages[:3], budget=0)
+    assert trimmed == messages[1:3]
+
+
+def test_trim_windowed_history():
+    window = HistoryWindow()
+    messages = MessageHistory([human("c"), human("d")], offset=2)
+    assert window.trim(messages, budget=14, keep_first=2) == [messages[-1]]
+
+
+@pytest.mark.asyncio
+async def test_trim_pinned_windowed_history():
+    window = HistoryWindow()
+    log = [human(c) for c in "abcdef"]
+
+    async def loader(start, end):
+        return log[start:end]
+
+    state = {"messages": MessageHistory(log[4:], offset=4, loader=loader)}
+    messages = await ResumeOptimizerWorkflow().load_pinned(state, 2)
+    trimmed = window.trim(messages, budget=14 * 3, keep_first=2)
+    assert [m.content[0] for m in trimmed] == ["a", "b", "f"]
+
+
+def test_trim_moves_in_steps():
+    window = HistoryWindow(trim_step=0.5)
+    messages = [human(c) for c in "abcdefgh"]
+    # Over budget by one message, the cut drops a whole step of two messages
+    trimmed = window.trim(messages[:5], budget=14 * 4)
+    assert [m.content[0] for m in trimmed] == ["c", "d", "e"]
+    # The kept history starts with the same message until it grows past the step
+    trimmed = window.trim(messages[:6], budget=14 * 4)
+    assert [m.content[0] for m in trimmed] == ["c", "d", "e", "f"]
+    trimmed = window.trim(messages[:7], budget=14 * 4)
+    assert [m.content[0] for m in trimmed] == ["e", "f", "g"]
+    assert [m.content[0] for m in HistoryWindow(trim_step=0).trim(
+        messages[:7], budget=14 * 4)] == ["d", "e", "f", "g"]
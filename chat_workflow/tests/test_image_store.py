@@ -0,0 +1,134 @@
+import base64
+import io
+import pytest
+from PIL import Image
+from langchain_core.messages import HumanMessage
+from chat_workflow.image_processing import IMAGE_PROFILES, preprocess_image
+from chat_workflow.image_store import IMAGE_REF_SCHEME, ImageStore
+from chat_workflow import storage_client
+
+
+class MemoryStorageClient:
+    """Object storage kept in memory"""
+
+    def __init__(self, available: bool = True):
+        self.objects = {}
+        self.uploads = 0
+        self.downloads = 0
+        self.available = available
+
+    async def upload_file(self, object_key, data, mime="application/octet-stream", overwrite=True, content_md5=False):
+        if not self.available:
+            return {}
+        if overwrite or object_key not in self.objects:
+            self.uploads += 1
+            self.objects[object_key] = (data, mime)
+        return {"object_key": object_key, "url": f"http://minio/{object_key}"}
+
+    async def download_file(self, object_key):
+        self.downloads += 1
+        return self.objects.get(object_key)
+
+    def get_presigned_url(self, object_key, expires_in=3600):
+        return f"http://minio/{object_key}?expires={expires_in}"
+
+
+def make_image(size, mode="RGB", format="PNG") -> bytes:
+    output = io.BytesIO()
+    Image.new(mode, size).save(output, format=format)
+    return output.getvalue()
+
+
+def decode_image(url: str) -> Image.Image:
+    header, _, data = url.partition(",")
+    image = Image.open(io.BytesIO(base64.b64decode(data)))
+    assert header == f"data:{image.get_format_mimetype()};base64"
+    return image
+
+
+def image_message(url: str) -> HumanMessage:
+    return HumanMessage(content=[{"type": "text", "text": "What is this?"},
+                                 {"type": "image_url", "image_url": {"url": url}}])
+
+
+def test_preprocess_image():
+    openai, anthropic = IMAGE_PROFILES["openai"], IMAGE_PROFILES["anthropic"]
+    small = make_image((400, 300))
+    assert preprocess_image(small, openai) == (small, "image/png", "low")
+    data, mime, detail = preprocess_image(make_image((4000, 3000)), openai)
+    assert (Image.open(io.BytesIO(data)).size, mime, detail) == ((1024, 768), "image/jpeg", "high")
+    data, mime, detail = preprocess_image(make_image((4000, 3000), "RGBA"), anthropic)
+    assert (Image.open(io.BytesIO(data)).size, mime, detail) == ((1568, 1176), "image/png", None)
+    # Formats the models don't take are converted
+    data, mime, _ = preprocess_image(make_image((100, 100), format="BMP"), anthropic)
+    assert mime == "image/jpeg"
+    with pytest.raises(ValueError):
+        preprocess_image(b"not an image", openai)
+
+
+@pytest.mark.asyncio
+async def test_images_are_stored_once():
+    storage = MemoryStorageClient()
+    store = ImageStore(storage)
+    small = await store.put(make_image((10, 10)), "image/png")
+    large = await store.put(make_image((1000, 1000)), "image/png")
+    assert await store.put(make_image((10, 10)), "image/png") == small
+    assert storage.uploads == 2
+    # References don't grow with the images
+    assert small.startswith(IMAGE_REF_SCHEME) and len(small) == len(large)
+
+
+@pytest.mark.asyncio
+async def test_variants_per_model_family():
+    storage = MemoryStorageClient()
+    url = await ImageStore(storage).put(make_image((3000, 2000)), "image/png")
+    # Another process, without the image in memory
+    store = ImageStore(storage, presigned_urls=True)
+    message = image_message(url)
+    [resolved] = await store.resolve_messages([message], "(openai)gpt-4o")
+    image_url = resolved.content[1]["image_url"]
+    assert decode_image(image_url["url"]).size == (1152, 768)
+    assert image_url["detail"] == "high"
+    assert message.content[1]["image_url"]["url"] == url
+    [resolved] = await store.resolve_messages([message], "(anthropic)claude-3-5-sonnet")
+    assert decode_image(resolved.content[1]["image_url"]["url"]).size == (1568, 1045)
+    [resolved] = await store.resolve_messages([message], "(openai)gpt-4o", accepts_urls=True)
+    assert resolved.content[1]["image_url"]["url"].startswith("http://minio/image_variants/")
+
+    # The variants are processed once and stored
+    uploads, downloads = storage.uploads, storage.downloads
+    await store.resolve_messages([message] * 3, "(openai)gpt-4o-mini")
+    [resolved] = await ImageStore(storage).resolve_messages([message], "(openai)gpt-4o")
+    assert storage.uploads == uploads
+    assert storage.downloads == downloads + 1
+    assert resolved.content[1]["image_url"]["detail"] == "high"
+
+    # Images that are gone are replaced by a note
+    storage.objects.clear()
+    [resolved] = await ImageStore(storage).resolve_messages([message], "(openai)gpt-4o")
+    assert resolved.content[1]["type"] == "text"
+
+
+@pytest.mark.asyncio
+async def test_inlined_without_storage():
+    store = ImageStore(MemoryStorageClient(available=False))
+    url = await store.put(make_image((3000, 3000)), "image/png")
+    assert decode_image(url).size == (3000, 3000)
+    [resolved] = await store.resolve_messages([image_message(url)], "(ollama)llava")
+    assert decode_image(resolved.content[1]["image_url"]["url"]).size == (1024, 1024)
+
+
+@pytest.mark.asyncio
+async def test_lazy_storage_client(monkeypatch):
+    created = []
+
+    def get_storage_client():
+        created.append(MemoryStorageClient())
+        return created[-1]
+
+    monkeypatch.setattr(storage_client, "get_storage_client", get_storage_client)
+    client = storage_client.LazyStorageClient()
+    assert created == []
+    uploaded = await client.upload_file("key", b"data", "text/plain")
+    assert uploaded["object_key"] == "key"
+    assert created[0].objects == {"key": (b"data", "text/plain")}
@@ -1,4 +1,11 @@
-from chat_workflow.llm.providers.ollama import OllamaProvider
+import asyncio
+import httpx
+import json
+import pytest
+from chat_workflow.llm.capabilities import ModelCapability
+from chat_workflow.llm.providers.ollama import OLLAMA_PARAM_PARSERS, OllamaProvider, parse_str_list
+from langchain_ollama import ChatOllama
+from typing import List, Optional
 
 provider = OllamaProvider()
 
@@ -99,3 +106,113 @@ stop              "[INST]"
         "stop": ["[INST]"]
     }
     assert provider.parse_ollama_params(input_str) == expected
+
+
+def test_param_parsers_match_chat_ollama():
+    parsers = {Optional[int]: int, Optional[float]: float,
+               Optional[List[str]]: parse_str_list}
+    expected = {name: parsers[field.annotation] for name, field in ChatOllama.model_fields.items()
+                if field.annotation in parsers}
+    assert {name: parser for name, parser in OLLAMA_PARAM_PARSERS.items()
+            if name in expected} == expected
+    assert set(OLLAMA_PARAM_PARSERS) <= set(ChatOllama.model_fields)
+
+
+def mock_ollama_client(requests: list) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"parameters": "num_ctx 4096\nstop \"<|eot|>\""})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ollama")
+
+
+@pytest.mark.asyncio
+async def test_model_params_cached_by_digest():
+    provider = OllamaProvider("http://ollama", cache_dir="")
+    requests = []
+    async with mock_ollama_client(requests) as client:
+        params = await provider.aload_model_params("llama3.2", "sha1", client)
+        assert params == {"num_ctx": 4096, "stop": ["<|eot|>"]}
+        await provider.aload_model_params("llama3.2", "sha1", client)
+        await provider.aload_model_params("llama3.2", client=client)
+        assert len(requests) == 1
+        # A new digest of the model loads its parameters again
+        await provider.aload_model_params("llama3.2", "sha2", client)
+        assert len(requests) == 2
+    assert provider.get_model_revision("llama3.2") == "sha2"
+    # Creating the model does not call the server
+    llm = provider.create_model("chat_model", "llama3.2", num_ctx=8192)
+    assert (llm.num_ctx, llm.stop) == (8192, ["<|eot|>"])
+
+
+@pytest.mark.asyncio
+async def test_model_params_loaded_in_background():
+    provider = OllamaProvider("http://127.0.0.1:9", cache_dir="")
+    llm = provider.create_model("chat_model", "llama3.2")
+    assert llm.num_ctx is None
+    assert provider._model_params.get_stats()["loading"] == 1
+    # The server is unreachable, so the parameters are tried again on the next miss
+    await asyncio.gather(*provider._model_params._loads.values(), return_exceptions=True)
+    assert provider.get_model_revision("llama3.2") is None
+
+
+def mock_ollama_server(tags: dict, requests: list) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": [
+                {"name": name, "digest": digest} for name, digest in tags.items()]})
+        name = json.loads(request.content)["name"]
+        if name.startswith("broken"):
+            return httpx.Response(500, json={"error": "failed to load model"})
+        template = "{{ .Tools }}" if name.startswith("tool") else "{{ .Prompt }}"
+        return httpx.Response(200, json={"template": template, "parameters": "num_ctx 2048"})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ollama")
+
+
+@pytest.mark.asyncio
+async def test_discovery_shows_changed_models(tmp_path):
+    provider = OllamaProvider("http://ollama", cache_dir=str(tmp_path))
+    tags, requests = {"tool-model": "sha1", "chat-model": "sha1"}, []
+    async with mock_ollama_server(tags, requests) as client:
+        capabilities = await provider.discover(client)
+        assert ModelCapability.TOOL_CALLING in capabilities["tool-model"]
+        assert capabilities["chat-model"] == {ModelCapability.TEXT_TO_TEXT}
+        assert len(requests) == 3
+        # Only the models with a new digest are shown again
+        tags.update({"chat-model": "sha2"})
+        del tags["tool-model"]
+        requests.clear()
+        capabilities = await provider.discover(client)
+        assert [r.url.path for r in requests] == ["/api/tags", "/api/show"]
+        assert list(capabilities) == ["chat-model"]
+
+    # A restart starts with the saved models without calling the server
+    provider = OllamaProvider("http://ollama", cache_dir=str(tmp_path))
+    assert provider.list_models() == ["chat-model"]
+    assert provider.get_model_params("chat-model") == {"num_ctx": 2048}
+    assert provider.get_model_revision("chat-model") == "sha2"
+    assert provider._discovery.get_stats()["loading"] == 0
+    # Stale models are refreshed in the background
+    provider = OllamaProvider("http://ollama", cache_dir=str(tmp_path), refresh_interval=0)
+    assert provider.list_models() == ["chat-model"]
+    assert provider._discovery.get_stats()["loading"] == 1
+    # The server is unreachable, so the stale models are kept
+    await asyncio.gather(*provider._discovery._loads.values(), return_exceptions=True)
+    assert provider.list_models() == ["chat-model"]
+    assert OllamaProvider("http://other", cache_dir=str(tmp_path), refresh_interval=0).list_models() == []
+
+
+@pytest.mark.asyncio
+async def test_discovery_skips_failing_models(tmp_path):
+    provider = OllamaProvider("http://ollama", cache_dir=str(tmp_path))
+    tags, requests = {"chat-model": "sha1", "broken-model": "sha1"}, []
+    async with mock_ollama_server(tags, requests) as client:
+        capabilities = await provider.discover(client)
+        assert list(capabilities) == ["chat-model"]
+        # A model that fails after a new digest keeps its previous entry
+        await provider._discovery.aset("http://ollama", {
+            **await provider._discover(client),
+            "broken-model": {"digest": "sha0", "parameters": {}, "capabilities": {ModelCapability.TEXT_TO_TEXT}}})
+        capabilities = await provider.discover(client)
+        assert list(capabilities) == ["chat-model", "broken-model"]
+        assert provider.get_model_revision("broken-model") == "sha0"
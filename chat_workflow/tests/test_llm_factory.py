@@ -0,0 +1,76 @@
+import pytest
+from chat_workflow.llm.factory import LLMFactory
+from chat_workflow.llm.providers.stub import StubChatModel, StubProvider
+from chat_workflow.tools.time import get_datetime_now
+
+
+def make_factory(**kwargs) -> LLMFactory:
+    factory = LLMFactory(**kwargs)
+    factory.register_provider("stub", StubProvider(ttft=0, token_delay=0))
+    return factory
+
+
+def test_models_are_pooled():
+    factory = make_factory()
+    llm = factory.create_model("chat_model", model="(stub)stub-chat")
+    assert isinstance(llm, StubChatModel)
+    assert factory.create_model("chat_model", model="(stub)stub-chat") is llm
+    # Tools are bound on top of the pooled model
+    with_tools = factory.create_model(
+        "chat_model", model="(stub)stub-chat", tools=[get_datetime_now])
+    assert with_tools.bound_tools[0]["name"] == "get_datetime_now"
+    assert factory.create_model("chat_model", model="(stub)stub-chat") is llm
+    # Other names and parameters get their own models
+    assert factory.create_model("summary_model", model="(stub)stub-chat") is not llm
+    assert factory.create_model(
+        "chat_model", model="(stub)stub-chat", disable_streaming=True) is not llm
+
+
+def test_pool_evicts_least_recently_used():
+    factory = make_factory(pool_size=2)
+    a = factory.create_model("a", model="(stub)stub-chat")
+    b = factory.create_model("b", model="(stub)stub-chat")
+    assert factory.create_model("a", model="(stub)stub-chat") is a
+    factory.create_model("c", model="(stub)stub-chat")
+    assert factory.create_model("a", model="(stub)stub-chat") is a
+    assert factory.create_model("b", model="(stub)stub-chat") is not b
+    # Replacing a provider drops its pooled models
+    factory.register_provider("stub", StubProvider())
+    assert factory.create_model("a", model="(stub)stub-chat") is not a
+
+
+def test_pool_disabled():
+    factory = make_factory(pool_size=0)
+    assert factory.create_model("chat_model", model="(stub)stub-chat") is not \
+        factory.create_model("chat_model", model="(stub)stub-chat")
+
+
+def test_tools_require_tool_calling():
+    factory = LLMFactory()
+    factory.register_provider("stub", StubProvider())
+    with pytest.raises(ValueError):
+        factory.create_model("chat_model", model="(stub)unknown", tools=[])
+
+
+def test_lazy_providers(monkeypatch):
+    monkeypatch.delenv("LAZY_TEST_API_KEY", raising=False)
+    factory = LLMFactory()
+    factory.register_lazy_provider(
+        "stub", "chat_workflow.llm.providers.stub:StubProvider", ["LAZY_TEST_API_KEY"], enabled=True)
+    # Not imported nor listed without its credentials
+    assert factory.providers == {}
+    assert factory.list_models() == []
+    monkeypatch.setenv("LAZY_TEST_API_KEY", "test")
+    assert factory.list_models() == ["(stub)stub-chat"]
+    assert "stub" in factory.load_times
+
+    # Imported on first use regardless of its credentials
+    monkeypatch.delenv("LAZY_TEST_API_KEY")
+    factory = LLMFactory()
+    factory.register_lazy_provider(
+        "stub", "chat_workflow.llm.providers.stub:StubProvider", ["LAZY_TEST_API_KEY"], ttft=0)
+    assert isinstance(factory.create_model(
+        "chat_model", model="(stub)stub-chat"), StubChatModel)
+    assert isinstance(factory.providers["stub"], StubProvider)
+    with pytest.raises(ValueError):
+        factory.create_model("chat_model", model="(missing)stub-chat")
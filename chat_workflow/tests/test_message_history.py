@@ -0,0 +1,75 @@
+import copy
+import functools
+import operator
+import pickle
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from chat_workflow.message_history import MessageHistory
+
+
+def make_log(n: int):
+    return [HumanMessage(content=str(i)) for i in range(n)]
+
+
+def test_add_keeps_cursor():
+    log = make_log(10)
+    history = MessageHistory(log[8:], offset=8)
+    history = operator.add(history, [AIMessage(content="10")])
+    assert isinstance(history, MessageHistory)
+    assert history.offset == 8
+    assert history.total == 11
+    assert [m.content for m in history] == ["8", "9", "10"]
+
+
+@pytest.mark.asyncio
+async def test_load_older():
+    log = make_log(10)
+
+    async def loader(start, end):
+        return log[start:end]
+
+    history = MessageHistory(log[7:], offset=7, loader=loader)
+    older = await history.load_older(limit=2)
+    assert [m.content for m in older] == ["5", "6"]
+    assert history.offset == 5
+    await history.load_older()
+    assert history.offset == 0
+    assert [m.content for m in history] == [str(i) for i in range(10)]
+    assert await history.load_older() == []
+
+
+@pytest.mark.asyncio
+async def test_load_older_without_loader():
+    history = MessageHistory(make_log(2), offset=3)
+    assert await history.load_older() == []
+    assert history.offset == 3
+
+
+@pytest.mark.asyncio
+async def test_load_first():
+    log = make_log(10)
+
+    async def loader(start, end):
+        return log[start:end]
+
+    history = MessageHistory(log[7:], offset=7, loader=loader)
+    assert [m.content for m in await history.load_first(2)] == ["0", "1"]
+    assert history.offset == 7
+    # No messages are left between the first and the loaded ones
+    history = MessageHistory(log[1:], offset=1, loader=loader)
+    assert [m.content for m in await history.load_first(2)] == ["0", "1"]
+    assert history.offset == 0
+
+
+def test_copy_shares_loader():
+    # The loader of a resumed thread is bound to the checkpointer, which can't be copied
+    loader = functools.partial(lambda module, start, end: [], functools)
+    history = MessageHistory(make_log(2), offset=5, loader=loader)
+    copied = copy.deepcopy(history)
+    assert isinstance(copied, MessageHistory)
+    assert copied.offset == 5 and copied.loader is loader
+    assert copied == history and copied[0] is not history[0]
+
+    unpickled = pickle.loads(pickle.dumps(history))
+    assert unpickled.offset == 5 and unpickled.loader is None
+    assert [m.content for m in unpickled] == ["0", "1"]
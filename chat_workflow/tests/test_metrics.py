@@ -0,0 +1,93 @@
+import operator
+import pytest
+from typing import Annotated, Sequence, TypedDict
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langgraph.graph import StateGraph, END
+from prometheus_client import REGISTRY
+from chat_workflow.metrics import TurnMetrics, get_run_labels, metrics_endpoint, record_token_usage
+from chat_workflow.persistence import get_graph_config
+
+
+class GraphState(TypedDict):
+    messages: Annotated[Sequence, operator.add]
+
+
+def build_graph():
+    llm = GenericFakeChatModel(messages=iter(
+        [AIMessage(content="hello there world")]), name="chat_model")
+
+    async def chat_node(state: GraphState, config):
+        return {"messages": [await llm.ainvoke(state["messages"], config=config)]}
+
+    graph = StateGraph(GraphState)
+    graph.add_node("chat", chat_node)
+    graph.set_entry_point("chat")
+    graph.add_edge("chat", END)
+    return graph.compile()
+
+
+@pytest.mark.asyncio
+async def test_turn_metrics():
+    labels = {"workflow": "test_turn_metrics", "model": "fake"}
+    metrics = TurnMetrics(labels["workflow"], labels["model"], "chat_model")
+    async for event in build_graph().astream_events(
+            {"messages": [HumanMessage(content="hi")]}, version="v1", stream_mode="values"):
+        metrics.observe_event(event)
+    metrics.finish()
+
+    # The fake model streams words and the spaces between them
+    assert metrics.output_tokens == 5
+    for name in ["chat_turn_time_to_first_token_seconds", "chat_turn_duration_seconds",
+                 "chat_turn_output_tokens_per_second"]:
+        assert REGISTRY.get_sample_value(f"{name}_count", labels) == 1
+    assert REGISTRY.get_sample_value("chat_graph_node_duration_seconds_count", {
+        **labels, "node": "chat"}) == 1
+
+
+def test_tokens_per_second_from_usage():
+    labels = {"workflow": "test_tokens_per_second_from_usage", "model": "fake"}
+    metrics = TurnMetrics(labels["workflow"], labels["model"], "chat_model")
+    for chunk in [AIMessageChunk(content="hello"), AIMessageChunk(content=" world"),
+                  AIMessageChunk(content="", usage_metadata={
+                      "input_tokens": 10, "output_tokens": 41, "total_tokens": 51})]:
+        metrics.observe_event({"event": "on_chat_model_stream",
+                               "name": "chat_model", "data": {"chunk": chunk}})
+    metrics.first_token -= 1
+    metrics.finish()
+
+    assert metrics.output_tokens == 2
+    assert metrics.reported_output_tokens == 41
+    # 40 tokens after the first in about a second
+    assert REGISTRY.get_sample_value(
+        "chat_turn_output_tokens_per_second_bucket", {**labels, "le": "20.0"}) == 0
+    assert REGISTRY.get_sample_value(
+        "chat_turn_output_tokens_per_second_bucket", {**labels, "le": "40.0"}) == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    TurnMetrics("test_metrics_endpoint", "fake", "chat_model").finish()
+    response = await metrics_endpoint()
+    assert response.media_type.startswith("text/plain")
+    assert b'chat_turn_duration_seconds_bucket{le="0.05",model="fake",workflow="test_metrics_endpoint"}' in response.body
+
+
+def test_record_token_usage():
+    model = "(anthropic)test_record_token_usage"
+    record_token_usage(model, {
+        "input_tokens": 1000, "output_tokens": 20, "total_tokens": 1020,
+        "input_token_details": {"cache_read": 800, "cache_creation": 150}})
+    record_token_usage(model, None)
+    for cache, tokens in [("read", 800), ("write", 150), ("none", 50)]:
+        assert REGISTRY.get_sample_value("llm_input_tokens_total", {
+            "model": model, "cache": cache}) == tokens
+    assert REGISTRY.get_sample_value(
+        "llm_output_tokens_total", {"model": model}) == 20
+
+
+def test_get_run_labels():
+    config = get_graph_config("thread", "user", {"chat_profile": "Simple Chat", "chat_model": "(openai)gpt-4o"})
+    assert get_run_labels(config) == ("Simple Chat", "(openai)gpt-4o")
+    assert get_run_labels(get_graph_config("thread")) == ("", "")
+    assert get_run_labels(None) == ("", "")
@@ -0,0 +1,109 @@
+import uuid
+import pytest
+import pytest_asyncio
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from chat_workflow.database import get_pg_url
+from chat_workflow.llm.factory import LLMFactory
+from chat_workflow.llm.providers.stub import StubChatModel, StubModelError, StubProvider
+from chat_workflow.llm.response_cache import ResponseCache
+from chat_workflow.storage_client import Base
+
+
+@pytest_asyncio.fixture
+async def async_session():
+    """Sessions on the database configured by the POSTGRES_* env vars, if reachable"""
+    engine = create_async_engine(get_pg_url())
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[
+                Base.metadata.tables["cache_entries"],
+            ])
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"Postgres is not available: {e}")
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_lru_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("chat_workflow.cache.time.monotonic", lambda: now[0])
+    cache = ResponseCache(max_size=2, ttl=60)
+    await cache.set("a", ["a"])
+    await cache.set("b", ["b"])
+    assert await cache.get("a") == ["a"]
+    await cache.set("c", ["c"])
+    # "b" is the least recently used
+    assert await cache.get("b") is None
+    assert await cache.get("c") == ["c"]
+    now[0] += 61
+    assert await cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_persistent_tier(async_session):
+    key = str(uuid.uuid4())
+    chunks = [
+        AIMessageChunk(content="tok0 "),
+        AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "get_datetime_now", "args": "{}", "id": "call_1", "index": 0}],
+            usage_metadata={"input_tokens": 3, "output_tokens": 2, "total_tokens": 5}),
+    ]
+    await ResponseCache(ttl=60, async_session=async_session).set(key, chunks)
+    # Another worker, or the same one after a restart
+    cached = await ResponseCache(ttl=60, async_session=async_session).get(key)
+    assert cached == chunks
+    assert (cached[0] + cached[1]).tool_calls[0]["name"] == "get_datetime_now"
+    assert await ResponseCache(async_session=async_session).get(str(uuid.uuid4())) is None
+
+
+@pytest.mark.asyncio
+async def test_factory_replays_cached_responses(monkeypatch):
+    calls = []
+    astream = StubChatModel._astream
+
+    def counted_astream(self, *args, **kwargs):
+        calls.append(1)
+        return astream(self, *args, **kwargs)
+    monkeypatch.setattr(StubChatModel, "_astream", counted_astream)
+
+    factory = LLMFactory(response_cache=ResponseCache(max_size=8, ttl=60))
+    factory.register_provider("stub", StubProvider(
+        ttft=0, token_delay=0, output_tokens=3))
+
+    async def stream(content):
+        llm = factory.create_model("chat_model", model="(stub)stub-chat")
+        tokens, output = [], None
+        async for event in llm.astream_events([HumanMessage(content=content)], version="v1"):
+            if event["event"] == "on_chat_model_stream":
+                tokens.append(event["data"]["chunk"].content)
+            elif event["event"] == "on_chat_model_end":
+                output = event["data"]["output"]
+        return tokens, output
+
+    tokens, output = await stream("Write a snake game in Python.")
+    assert "cache_hit" not in output.response_metadata
+    cached_tokens, cached_output = await stream("Write a snake game in Python.")
+    assert cached_tokens == tokens == ["tok0 ", "tok1 ", "tok2 "]
+    assert cached_output.response_metadata["cache_hit"] is True
+    assert cached_output.id != output.id
+    assert len(calls) == 1
+
+    await stream("Something else")
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_responses_are_not_cached():
+    cache = ResponseCache(max_size=8, ttl=60)
+    factory = LLMFactory(response_cache=cache)
+    factory.register_provider("stub", StubProvider(
+        ttft=0, token_delay=0, output_tokens=3, error_rate=1, error_after_tokens=2))
+    llm = factory.create_model("chat_model", model="(stub)stub-chat")
+    with pytest.raises(StubModelError):
+        async for _ in llm.astream([HumanMessage(content="hi")]):
+            pass
+    assert len(cache._responses) == 0
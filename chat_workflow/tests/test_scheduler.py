@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+from typing import TypedDict
+from langchain_core.messages import HumanMessage
+from langgraph.graph import END, START, StateGraph
+from chat_workflow.llm.factory import LLMFactory
+from chat_workflow.llm.providers.stub import StubProvider
+from chat_workflow.llm.scheduler import FairLimiter, LLMOverloadedError, LLMScheduler, ScheduledChatModel, parse_limits
+
+
+def test_parse_limits():
+    assert parse_limits("ollama=4, (openai)gpt-4o=16,") == {
+        "ollama": 4, "(openai)gpt-4o": 16}
+
+
+def test_get_limiters():
+    scheduler = LLMScheduler(limits={"ollama": 2, "(ollama)llama3.2": 1, "openai": 0},
+                             default_limit=8, max_queue=10, timeout=0, user_weights={})
+    assert [l.name for l in scheduler.get_limiters("ollama", "llama3.2")] == [
+        "(ollama)llama3.2", "ollama"]
+    assert [l.name for l in scheduler.get_limiters("ollama", "qwen2.5")] == ["ollama"]
+    assert scheduler.get_limiters("openai", "gpt-4o") == []
+    assert [l.limit for l in scheduler.get_limiters("groq", "llama3")] == [8]
+
+
+@pytest.mark.asyncio
+async def test_fair_queuing():
+    limiter = FairLimiter("test", limit=1, max_queue=10)
+    order = []
+
+    async def call(user):
+        await limiter.acquire(user)
+        order.append(user)
+        await asyncio.sleep(0)
+        limiter.release()
+
+    await limiter.acquire("a")
+    tasks = [asyncio.create_task(call("a")) for _ in range(4)]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(call("b")) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert limiter.queued == 6
+    limiter.release()
+    await asyncio.gather(*tasks)
+    # The user that opened many calls doesn't starve the other one
+    assert order == ["a", "b", "a", "b", "a", "a"]
+    assert limiter.active == 0 and limiter.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_weights():
+    limiter = FairLimiter("test", limit=1, max_queue=10)
+    order = []
+
+    async def call(user, weight):
+        await limiter.acquire(user, weight)
+        order.append(user)
+        limiter.release()
+
+    await limiter.acquire("a")
+    tasks = [asyncio.create_task(call("a", 1)) for _ in range(3)]
+    tasks += [asyncio.create_task(call("b", 2)) for _ in range(4)]
+    await asyncio.sleep(0)
+    limiter.release()
+    await asyncio.gather(*tasks)
+    # b gets twice the share of a
+    assert order == ["b", "a", "b", "b", "a", "b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_rejections():
+    limiter = FairLimiter("test", limit=1, max_queue=1)
+    await limiter.acquire("a")
+    with pytest.raises(LLMOverloadedError):
+        await limiter.acquire("b", timeout=0.01)
+    waiter = asyncio.create_task(limiter.acquire("b"))
+    await asyncio.sleep(0)
+    with pytest.raises(LLMOverloadedError):
+        await limiter.acquire("c")
+
+    # A cancelled waiter gives up its place
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.queued == 0
+    limiter.release()
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduled_model():
+    scheduler = LLMScheduler(limits={"stub": 1}, default_limit=0, max_queue=10,
+                             timeout=0, user_weights={})
+    factory = LLMFactory(scheduler)
+    factory.register_provider("stub", StubProvider(
+        ttft=0.05, token_delay=0, output_tokens=3))
+    llm = factory.create_model("chat_model", model="(stub)stub-chat")
+    assert isinstance(llm, ScheduledChatModel)
+
+    tokens = [
+        event["data"]["chunk"].content
+        async for event in llm.astream_events([HumanMessage(content="hi")], version="v1")
+        if event["event"] == "on_chat_model_stream"
+    ]
+    # The events of the wrapped model are not duplicated
+    assert tokens == ["tok0 ", "tok1 ", "tok2 "]
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    responses = await asyncio.gather(*[llm.ainvoke([HumanMessage(content="hi")]) for _ in range(3)])
+    assert loop.time() - start >= 0.15
+    assert all(response.content == "tok0 tok1 tok2 " for response in responses)
+    assert scheduler.get_stats() == {"stub": {"limit": 1, "active": 0, "queued": 0}}
+
+
+@pytest.mark.asyncio
+async def test_user_of_graph_run():
+    users = []
+    scheduler = LLMScheduler(limits={}, default_limit=1, max_queue=10,
+                             timeout=0, user_weights={})
+    slot = scheduler.slot
+
+    def record_slot(provider, model, user=""):
+        users.append(user)
+        return slot(provider, model, user)
+    scheduler.slot = record_slot
+    factory = LLMFactory(scheduler)
+    factory.register_provider("stub", StubProvider(
+        ttft=0, token_delay=0, output_tokens=1))
+
+    class State(TypedDict):
+        messages: list
+
+    async def chat(state, config):
+        llm = factory.create_model("chat_model", model="(stub)stub-chat")
+        return {"messages": [await llm.ainvoke(state["messages"], config=config)]}
+
+    graph = StateGraph(State)
+    graph.add_node("chat", chat)
+    graph.add_edge(START, "chat")
+    graph.add_edge("chat", END)
+    graph = graph.compile()
+    await graph.ainvoke({"messages": [HumanMessage(content="hi")]},
+                        {"configurable": {"thread_id": "t1", "user_id": "alice"}})
+    await graph.ainvoke({"messages": [HumanMessage(content="hi")]},
+                        {"configurable": {"thread_id": "t2"}})
+    assert users == ["alice", "t2"]
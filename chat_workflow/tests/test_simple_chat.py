@@ -1,5 +1,8 @@
 import pytest
 from chainlit.input_widget import Select
+from chat_workflow.llm import llm_factory
+from chat_workflow.llm.catalog import ModelCatalog
+from chat_workflow.workflows import simple_chat
 from chat_workflow.workflows.simple_chat import SimpleChatWorkflow, GraphState
 
 
@@ -33,7 +36,9 @@ def test_chat_profile():
     assert len(profile.starters) == 3
 
 
-def test_chat_settings(simple_chat_workflow):
+def test_chat_settings(simple_chat_workflow, monkeypatch):
+    monkeypatch.setattr(simple_chat, "model_catalog",
+                        ModelCatalog(llm_factory, cache_dir=""))
     settings = simple_chat_workflow.chat_settings
     assert len(settings.inputs) == 1
     assert isinstance(settings.inputs[0], Select)
@@ -53,7 +58,7 @@ async def test_chat_node():
     state = GraphState(
         name="Simple Chat",
         messages=[],
-        chat_model="(openai)gpt-4o-mini"  # Use an appropriate test model
+        chat_model="(stub)stub-chat"
     )
     config = {"configurable": {"session_id": "test_session"}}
 
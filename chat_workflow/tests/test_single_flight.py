@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from langchain_core.messages import HumanMessage
+from chat_workflow.llm.factory import LLMFactory
+from chat_workflow.llm.providers.stub import StubChatModel, StubProvider
+from chat_workflow.llm.single_flight import SingleFlight, get_message_identity, hash_request
+
+
+def make_upstream(calls, n=3, delay=0.01, error=None):
+    async def upstream():
+        calls.append(1)
+        for i in range(n):
+            await asyncio.sleep(delay)
+            yield i
+        if error:
+            raise error
+    return upstream
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_a_stream():
+    single_flight = SingleFlight()
+    calls = []
+    upstream = make_upstream(calls)
+    first = asyncio.create_task(collect(single_flight.stream("key", upstream)))
+    await asyncio.sleep(0.015)
+    # Joins after the first chunk, which is replayed
+    second = asyncio.create_task(collect(single_flight.stream("key", upstream)))
+    other = asyncio.create_task(collect(single_flight.stream("other", upstream)))
+    assert await first == [0, 1, 2]
+    assert await second == [0, 1, 2]
+    assert await other == [0, 1, 2]
+    assert len(calls) == 2
+    assert single_flight.in_flight == 0
+
+    # A request after the end starts a new stream
+    assert await collect(single_flight.stream("key", upstream)) == [0, 1, 2]
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_error_reaches_all_subscribers():
+    single_flight = SingleFlight()
+    upstream = make_upstream([], error=ValueError("upstream"))
+    results = await asyncio.gather(
+        collect(single_flight.stream("key", upstream)),
+        collect(single_flight.stream("key", upstream)),
+        return_exceptions=True)
+    assert [type(result) for result in results] == [ValueError, ValueError]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_when_all_subscribers_leave():
+    single_flight = SingleFlight()
+    upstream = make_upstream([], n=100)
+    stream = single_flight.stream("key", upstream)
+    assert await stream.__anext__() == 0
+    flight = single_flight._flights["key"]
+    await stream.aclose()
+    await asyncio.sleep(0)
+    assert flight.task.cancelled()
+    assert single_flight.in_flight == 0
+
+
+def test_message_identity_ignores_ids():
+    def key(message_id):
+        return hash_request(model="(stub)stub-chat", messages=get_message_identity(
+            [HumanMessage(content="Write a snake game in Python.", id=message_id)]))
+    assert key("1") == key("2")
+
+
+@pytest.mark.asyncio
+async def test_factory_coalesces_streams(monkeypatch):
+    calls = []
+    astream = StubChatModel._astream
+
+    def counted_astream(self, *args, **kwargs):
+        calls.append(1)
+        return astream(self, *args, **kwargs)
+    monkeypatch.setattr(StubChatModel, "_astream", counted_astream)
+
+    factory = LLMFactory(single_flight=SingleFlight())
+    factory.register_provider("stub", StubProvider(
+        ttft=0.02, token_delay=0, output_tokens=3))
+
+    async def stream(content):
+        llm = factory.create_model("chat_model", model="(stub)stub-chat")
+        return [
+            event["data"]["chunk"].content
+            async for event in llm.astream_events([HumanMessage(content=content)], version="v1")
+            if event["event"] == "on_chat_model_stream"
+        ]
+
+    results = await asyncio.gather(stream("hi"), stream("hi"), stream("hello"))
+    assert results == [["tok0 ", "tok1 ", "tok2 "]] * 3
+    assert len(calls) == 2
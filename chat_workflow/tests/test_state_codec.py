@@ -0,0 +1,49 @@
+import json
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from chat_workflow import state_codec
+from chat_workflow.state_codec import StateCodec, decode_legacy_state
+
+
+def make_messages():
+    tool_call = {"name": "search", "args": {"query": "news"}, "id": "call_1", "type": "tool_call"}
+    return [
+        HumanMessage(content="Hello", id="1"),
+        AIMessage(content="", tool_calls=[tool_call], id="2",
+                  usage_metadata={"input_tokens": 10, "output_tokens": 2, "total_tokens": 12}),
+        ToolMessage(content=[{"type": "text", "text": "results"}], tool_call_id="call_1", artifact={"urls": []}),
+        AIMessage(content="Hi there!", response_metadata={"finish_reason": "stop"}),
+    ]
+
+
+def test_round_trip():
+    codec = StateCodec(compression_threshold=100)
+    state = {"messages": make_messages(), "chat_profile": "Simple Chat", "chat_settings": {"x": [1, 2]}}
+    type_, payload = codec.dumps_typed(state)
+    assert type_ == "state+zstd"
+    assert codec.loads_typed((type_, payload)) == state
+    assert StateCodec(compression_level=0).dumps_typed(state)[0] == "state"
+    # Payloads written before the codec are still read
+    assert codec.loads_typed(JsonPlusSerializer().dumps_typed(state)) == state
+
+
+def test_migrated_on_read(monkeypatch):
+    codec = StateCodec()
+    payload = codec.dumps_typed({"model": "gpt-4o"})
+    monkeypatch.setattr(state_codec, "SCHEMA_VERSION", 2)
+    monkeypatch.setitem(state_codec.MIGRATIONS, 1,
+                        lambda value: {"chat_model": value["model"]})
+    assert codec.loads_typed(payload) == {"chat_model": "gpt-4o"}
+
+
+def test_decode_legacy_state():
+    messages = make_messages()
+    state = decode_legacy_state(json.dumps({
+        "messages": [message.model_dump() for message in messages],
+        "turns": "3",
+        "chat_profile": "__import__('os').getcwd()",
+    }))
+    assert state["messages"] == messages
+    assert state["turns"] == 3
+    # Not evaluated
+    assert state["chat_profile"] == "__import__('os').getcwd()"
@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from chat_workflow.streaming import TokenStreamer, chunk_to_text
+
+
+class FakeMessage:
+    def __init__(self, content: str = ""):
+        self.content = content
+        self.frames = []
+        self.finalized = False
+
+    async def send(self):
+        self.frames.append(self.content)
+
+    async def stream_token(self, token: str):
+        self.content += token
+        self.frames.append(token)
+
+    async def update(self):
+        self.finalized = True
+
+
+def test_chunk_to_text():
+    assert chunk_to_text("hello") == "hello"
+    assert chunk_to_text(["a", "b"]) == "a b"
+    assert chunk_to_text([{"type": "text", "text": "hi"}]) == "hi"
+    assert chunk_to_text([{"type": "tool_use", "id": "1"}]) == ""
+    assert chunk_to_text([]) == ""
+    assert chunk_to_text(None) == ""
+
+
+@pytest.mark.asyncio
+async def test_first_token_sent_immediately():
+    streamer = TokenStreamer(flush_interval=10, message_class=FakeMessage)
+    await streamer.push("Hello")
+    assert streamer.message.frames == ["Hello"]
+    await streamer.push(" world")
+    assert streamer.message.frames == ["Hello"]
+    message = await streamer.close()
+    assert message.content == "Hello world"
+    assert message.frames == ["Hello", " world"]
+    assert message.finalized
+
+
+@pytest.mark.asyncio
+async def test_empty_tokens_skipped():
+    streamer = TokenStreamer(flush_interval=10, message_class=FakeMessage)
+    await streamer.push("")
+    assert streamer.message is None
+    await streamer.push("Hello")
+    assert streamer.message.frames == ["Hello"]
+    await streamer.push("")
+    message = await streamer.close()
+    assert message.frames == ["Hello"]
+
+
+@pytest.mark.asyncio
+async def test_zero_interval_streams_every_token():
+    streamer = TokenStreamer(flush_interval=0, message_class=FakeMessage)
+    for token in ["a", "b", "c"]:
+        await streamer.push(token)
+    message = await streamer.close()
+    assert message.frames == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_flush_on_buffer_size():
+    streamer = TokenStreamer(
+        flush_interval=10, max_buffer_size=4, message_class=FakeMessage)
+    for token in ["x", "ab", "cd", "e"]:
+        await streamer.push(token)
+    assert streamer.message.frames == ["x", "abcd"]
+    message = await streamer.close()
+    assert message.content == "xabcde"
+
+
+@pytest.mark.asyncio
+async def test_flush_on_interval_without_new_tokens():
+    streamer = TokenStreamer(flush_interval=0.01, message_class=FakeMessage)
+    await streamer.push("a")
+    await streamer.push("b")
+    await asyncio.sleep(0.05)
+    assert streamer.message.frames == ["a", "b"]
+    await streamer.close()
+    assert streamer.frames == 2
+
+
+@pytest.mark.asyncio
+async def test_close_without_tokens():
+    streamer = TokenStreamer(message_class=FakeMessage)
+    assert await streamer.close() is None
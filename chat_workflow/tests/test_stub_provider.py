@@ -0,0 +1,71 @@
+import pytest
+from langchain_core.messages import HumanMessage, ToolMessage
+from chat_workflow.llm import llm_factory
+from chat_workflow.llm.providers.stub import StubChatModel, StubModelError, StubProvider
+from chat_workflow.tools.time import get_datetime_now
+
+
+def make_provider(**kwargs):
+    return StubProvider(**{"ttft": 0, "token_delay": 0, "output_tokens": 3, **kwargs})
+
+
+def test_registered():
+    llm = llm_factory.create_model("chat_model", model="(stub)stub-chat")
+    assert isinstance(llm.bound, StubChatModel)
+    assert llm_factory.get_context_window("(stub)stub-chat") == 128000
+
+
+def test_listed_only_if_enabled():
+    assert make_provider(enabled=False).list_models() == []
+    assert make_provider(enabled=True).list_models() == ["stub-chat"]
+
+
+@pytest.mark.asyncio
+async def test_stream_events():
+    llm = make_provider().create_model("chat_model", "stub-chat")
+    tokens = [
+        event["data"]["chunk"].content
+        async for event in llm.astream_events([HumanMessage(content="hi")], version="v1")
+        if event["event"] == "on_chat_model_stream" and event["name"] == "chat_model"
+    ]
+    assert tokens == ["tok0 ", "tok1 ", "tok2 "]
+    response = await llm.ainvoke([HumanMessage(content="hi")])
+    assert response.content == "tok0 tok1 tok2 "
+    assert response.usage_metadata["output_tokens"] == 3
+
+
+@pytest.mark.asyncio
+async def test_tool_call():
+    llm = make_provider(tool_calls=True).create_model(
+        "chat_model", "stub-chat", tools=[get_datetime_now])
+    response = await llm.ainvoke([HumanMessage(content="What time is it?")])
+    assert response.content == ""
+    assert response.tool_calls[0]["name"] == "get_datetime_now"
+    assert response.tool_calls[0]["args"] == {}
+
+    response = await llm.ainvoke([
+        HumanMessage(content="What time is it?"),
+        response,
+        ToolMessage(content="2024-01-01 00:00:00",
+                    tool_call_id=response.tool_calls[0]["id"]),
+    ])
+    assert response.content == "tok0 tok1 tok2 "
+
+
+@pytest.mark.asyncio
+async def test_error_injection():
+    provider = make_provider(error_rate=1, error_after_tokens=2)
+    llm = provider.create_model("chat_model", "stub-chat")
+    tokens = []
+    with pytest.raises(StubModelError):
+        async for chunk in llm.astream([HumanMessage(content="hi")]):
+            tokens.append(chunk.content)
+    assert tokens == ["tok0 ", "tok1 "]
+
+    # The same seed fails the same requests
+    def failures(seed):
+        llm = make_provider(error_rate=0.5, seed=seed).create_model(
+            "chat_model", "stub-chat")
+        return [llm._should_fail() for _ in range(20)]
+    assert failures(1) == failures(1)
+    assert 0 < sum(failures(1)) < 20
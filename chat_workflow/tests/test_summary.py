@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from chat_workflow.persistence import apply_background_run, run_in_background
+from chat_workflow.workflows import base
+from chat_workflow.workflows.simple_chat import SimpleChatWorkflow
+
+
+@pytest.fixture
+def workflow(monkeypatch):
+    prompts = []
+
+    class SummaryModel(FakeListChatModel):
+        async def ainvoke(self, input, config=None, **kwargs):
+            prompts.append(input[0].content)
+            return await super().ainvoke(input, config, **kwargs)
+
+    monkeypatch.setattr(base.llm_factory, "create_model",
+                        lambda name, model, **kwargs: SummaryModel(responses=["summary"]))
+    workflow = SimpleChatWorkflow()
+    workflow.summary_trigger_tokens = 50
+    workflow.summary_keep_messages = 2
+    workflow.prompts = prompts
+    return workflow
+
+
+def make_state(messages, **kwargs):
+    return {"messages": messages, "chat_profile": "Simple Chat", "chat_model": "(openai)gpt-4o",
+            "summary": "", "summary_upto": 0, **kwargs}
+
+
+@pytest.mark.asyncio
+async def test_below_trigger(workflow):
+    state = make_state([HumanMessage(content="hi"), AIMessage(content="hello")])
+    assert await workflow.summarize_node(state, {}) is None
+
+
+@pytest.mark.asyncio
+async def test_summarizes_only_new_messages(workflow):
+    messages = [HumanMessage(content=f"message {i} " * 10) for i in range(6)]
+    state = make_state(messages, summary="old", summary_upto=2)
+    update = await workflow.summarize_node(state, {})
+    assert update == {"summary": "summary", "summary_upto": 4}
+    prompt = workflow.prompts[0]
+    assert "old" in prompt
+    assert "message 2" in prompt and "message 3" in prompt
+    assert "message 1" not in prompt and "message 4" not in prompt
+
+    state.update(update)
+    assert workflow.get_unsummarized_messages(state) == messages[4:]
+    assert workflow.get_summary_prompt(state).endswith("summary")
+
+
+@pytest.mark.asyncio
+async def test_keeps_tool_results_with_their_call(workflow):
+    messages = [
+        HumanMessage(content="question " * 20),
+        AIMessage(content="", tool_calls=[{"name": "search", "args": {}, "id": "1"}]),
+        ToolMessage(content="result " * 20, tool_call_id="1"),
+        AIMessage(content="answer"),
+    ]
+    update = await workflow.summarize_node(make_state(messages), {})
+    assert update["summary_upto"] == 3
+
+
+def test_background_tasks(workflow):
+    assert workflow.background_tasks == [workflow.summarize_node]
+    workflow.summary_trigger_tokens = 0
+    assert workflow.background_tasks == []
+
+
+@pytest.mark.asyncio
+async def test_summary_applies_on_a_later_turn(workflow):
+    release = asyncio.Event()
+    summarize = workflow.summarize_node
+
+    async def slow_summarize(state, config):
+        await release.wait()
+        return await summarize(state, config)
+
+    messages = [HumanMessage(content=f"message {i} " * 10) for i in range(6)]
+    state = make_state(messages)
+    run_in_background("thread", [slow_summarize], state, {})
+    state["messages"] += [HumanMessage(content="next")]
+    # The next turn doesn't wait for the summary
+    assert not apply_background_run("thread", state)
+    assert state["summary"] == ""
+
+    release.set()
+    await asyncio.sleep(0.1)
+    assert apply_background_run("thread", state)
+    assert state["summary"] == "summary"
+    assert len(state["messages"]) == 7
@@ -0,0 +1,34 @@
+import pytest
+from chat_workflow.workflows.simple_chat import SimpleChatWorkflow
+from chat_workflow.workflows.workflow_factory import WorkflowFactory
+
+
+@pytest.fixture(autouse=True)
+def registered_workflow():
+    WorkflowFactory.register(SimpleChatWorkflow.name(), SimpleChatWorkflow)
+    yield
+    WorkflowFactory.unregister(SimpleChatWorkflow.name())
+
+
+def test_get_returns_shared_instance():
+    workflow = WorkflowFactory.get("Simple Chat")
+    assert isinstance(workflow, SimpleChatWorkflow)
+    assert WorkflowFactory.get("Simple Chat") is workflow
+    assert WorkflowFactory.create("Simple Chat") is not workflow
+
+
+def test_get_graph_compiles_once():
+    graph = WorkflowFactory.get_graph("Simple Chat")
+    assert "chat" in graph.nodes
+    assert WorkflowFactory.get_graph("Simple Chat") is graph
+
+
+def test_register_invalidates_cache():
+    graph = WorkflowFactory.get_graph("Simple Chat")
+    WorkflowFactory.register(SimpleChatWorkflow.name(), SimpleChatWorkflow)
+    assert WorkflowFactory.get_graph("Simple Chat") is not graph
+
+
+def test_unknown_workflow():
+    with pytest.raises(ValueError):
+        WorkflowFactory.get("Unknown")
@@ -3,6 +3,7 @@ import json
 from typing import List, Dict, Optional
 from langchain_core.messages import ToolMessage
 from langchain_core.runnables import RunnableConfig, Runnable
+from ..metrics import TOOL_DURATION, get_run_labels
 
 
 class BasicToolNode(Runnable):
@@ -19,7 +20,8 @@ class BasicToolNode(Runnable):
         outputs = []
         for tool_call in message.tool_calls:
             async with cl.Step(f"tool [{tool_call['name']}]") as step:
-                tool_result = await self.tools_by_name[tool_call["name"]](**tool_call["args"])
+                with TOOL_DURATION.labels(*get_run_labels(config), tool_call["name"]).time():
+                    tool_result = await self.tools_by_name[tool_call["name"]](**tool_call["args"])
                 outputs.append(
                     ToolMessage(
                         content=json.dumps(tool_result),
@@ -1,10 +1,18 @@
+import json
+import math
 import operator
+import os
+import weakref
 import chainlit as cl
-from typing import TypedDict, Annotated, Sequence, Dict, Optional
-from langchain_core.messages import AnyMessage, HumanMessage
+from typing import TypedDict, Annotated, Awaitable, Callable, Sequence, Dict, List, Optional
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage, ToolMessage, get_buffer_string
+from langchain_core.runnables import RunnableConfig
 from abc import ABC, abstractmethod
 from typing import Dict, Any
 from langgraph.graph import StateGraph, END
+from chat_workflow.llm import llm_factory, model_catalog
+from chat_workflow.message_history import MessageHistory
+from chat_workflow.streaming import chunk_to_text
 
 
 class BaseState(TypedDict):
@@ -15,7 +23,215 @@ class BaseState(TypedDict):
     chat_profile: str
 
 
+class SummaryState(BaseState):
+    # Running summary of the messages folded out of the prompt
+    summary: str
+
+    # Number of messages covered by the summary
+    summary_upto: int
+
+
+# A task run after the reply, which returns the state fields to update
+BackgroundTask = Callable[[BaseState, RunnableConfig], Awaitable[Optional[Dict[str, Any]]]]
+
+# Token counts are estimated without a tokenizer
+CHARS_PER_TOKEN = 4
+# Tokens of an image part (a 512x512 image on OpenAI models)
+IMAGE_TOKENS = 765
+# Tokens added to every message for its role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Token counts of the messages alive in the process, by object id. They are
+# kept out of the messages, which are owned by the graph state and persisted.
+_token_counts: Dict[int, int] = {}
+
+
+def count_tokens(message: AnyMessage) -> int:
+    """
+    Get the number of tokens of a message.
+
+    The count is computed once per message object and cached until the message
+    is garbage collected. AI messages use the output tokens reported by the
+    provider; other messages are estimated from their length.
+    """
+    cached = _token_counts.get(id(message))
+    if cached is not None:
+        return cached
+
+    usage = getattr(message, "usage_metadata", None)
+    if usage and usage.get("output_tokens"):
+        count = usage["output_tokens"] + MESSAGE_OVERHEAD_TOKENS
+    else:
+        chars = 0
+        count = MESSAGE_OVERHEAD_TOKENS
+        content = message.content
+        for part in [content] if isinstance(content, str) else content:
+            if isinstance(part, str):
+                chars += len(part)
+            elif part.get("type") in ("image_url", "image"):
+                count += IMAGE_TOKENS
+            else:
+                chars += len(part.get("text", ""))
+        for tool_call in getattr(message, "tool_calls", []):
+            chars += len(tool_call["name"]) + len(json.dumps(tool_call["args"]))
+        count += math.ceil(chars / CHARS_PER_TOKEN)
+    _token_counts[id(message)] = count
+    # The id may be reused by another object once the message is collected
+    weakref.finalize(message, _token_counts.pop, id(message), None)
+    return count
+
+
+class HistoryWindow:
+    """
+    Trim the message history to the token budget of a model.
+
+    The budget is a share of the model's context window, from the context window
+    tables of the LLM providers, leaving the rest for the output. The most recent
+    messages that fit in the budget are kept, together with the system messages at
+    the start of the history. Tool results are never kept without the AI message
+    that called the tool.
+
+    Once the history is over budget, the oldest messages are dropped in steps of
+    `trim_step` of the budget rather than one by one, so that the kept history
+    starts with the same message for several turns and the provider's prompt
+    cache can reuse its prefix.
+
+    Args:
+        max_tokens (Optional[int]): Upper limit of the budget regardless of the model.
+            Defaults to HISTORY_MAX_TOKENS, 0 for no limit.
+        context_ratio (Optional[float]): Share of the context window used for the history.
+            Defaults to HISTORY_CONTEXT_RATIO (0.75).
+        default_context_window (Optional[int]): Context window of models that are not in the tables.
+            Defaults to HISTORY_DEFAULT_CONTEXT_WINDOW (8192).
+        trim_step (Optional[float]): Share of the budget dropped at once, 0 to drop as few messages as possible.
+            Defaults to HISTORY_TRIM_STEP (0.25).
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        context_ratio: Optional[float] = None,
+        default_context_window: Optional[int] = None,
+        trim_step: Optional[float] = None,
+    ):
+        if max_tokens is None:
+            max_tokens = int(os.getenv("HISTORY_MAX_TOKENS", "0"))
+        if context_ratio is None:
+            context_ratio = float(os.getenv("HISTORY_CONTEXT_RATIO", "0.75"))
+        if default_context_window is None:
+            default_context_window = int(
+                os.getenv("HISTORY_DEFAULT_CONTEXT_WINDOW", "8192"))
+        if trim_step is None:
+            trim_step = float(os.getenv("HISTORY_TRIM_STEP", "0.25"))
+        self.max_tokens = max_tokens
+        self.context_ratio = context_ratio
+        self.default_context_window = default_context_window
+        self.trim_step = trim_step
+
+    def get_budget(self, model: str) -> int:
+        """
+        Get the token budget of the history for a model.
+
+        Args:
+            model (str): The model name with its provider prefix, e.g. "(openai)gpt-4o".
+        """
+        context_window = llm_factory.get_context_window(
+            model) or self.default_context_window
+        budget = int(context_window * self.context_ratio)
+        if self.max_tokens:
+            budget = min(budget, self.max_tokens)
+        return budget
+
+    def trim(self, messages: Sequence[AnyMessage], budget: int, keep_first: int = 0) -> List[AnyMessage]:
+        """
+        Keep the most recent messages that fit in the budget.
+
+        The latest message is always kept. With cached token counts, a turn only
+        counts its new messages.
+
+        Args:
+            messages (Sequence[AnyMessage]): The message history.
+            budget (int): Maximum number of tokens of the kept messages.
+            keep_first (int): Number of messages at the start that are always kept,
+                in addition to the leading system messages. The first messages of a
+                windowed history are only kept if they are loaded, see
+                BaseWorkflow.load_pinned.
+        """
+        if isinstance(messages, MessageHistory):
+            keep_first = max(0, keep_first - messages.offset)
+        messages = list(messages)
+        head = 0
+        while head < len(messages) and isinstance(messages[head], SystemMessage):
+            head += 1
+        head = min(head + keep_first, len(messages))
+        budget -= sum(count_tokens(message) for message in messages[:head])
+
+        counts = [count_tokens(message) for message in messages[head:]]
+        excess = sum(counts) - budget
+        step = int(budget * self.trim_step)
+        if excess > 0 and step > 0:
+            # The cut only moves when the history grows past the next step
+            excess = math.ceil(excess / step) * step
+        start = head
+        while excess > 0 and start < len(messages) - 1:
+            excess -= counts[start - head]
+            start += 1
+
+        # Drop tool results whose tool call was cut off, unless nothing else is left
+        cut = start
+        while cut < len(messages) and isinstance(messages[cut], ToolMessage):
+            cut += 1
+        if cut == len(messages):
+            while cut > head and isinstance(messages[cut - 1], ToolMessage):
+                cut -= 1
+            cut = max(head, cut - 1)
+        return messages[:head] + messages[cut:]
+
+    def trim_for_model(
+        self,
+        messages: Sequence[AnyMessage],
+        model: str,
+        system_prompt: Optional[str] = None,
+        keep_first: int = 0,
+    ) -> List[AnyMessage]:
+        """
+        Trim the message history to the token budget of a model.
+
+        Args:
+            messages (Sequence[AnyMessage]): The message history.
+            model (str): The model name with its provider prefix, e.g. "(openai)gpt-4o".
+            system_prompt (Optional[str]): System prompt sent along with the history.
+                Its tokens are taken from the budget.
+            keep_first (int): Number of messages at the start that are always kept.
+        """
+        budget = self.get_budget(model)
+        if system_prompt:
+            budget -= count_tokens(SystemMessage(content=system_prompt))
+        return self.trim(messages, budget, keep_first)
+
+
+SUMMARY_PROMPT = """Summarize the conversation below for the assistant that continues it.
+Keep facts, decisions, open questions and user preferences; drop small talk.
+If there is an existing summary, extend it with the new messages and return the whole summary.
+
+Existing summary:
+{summary}
+
+New messages:
+{messages}"""
+
+
 class BaseWorkflow(ABC):
+    def __init__(self):
+        # Trims the history that the nodes send to the chat models
+        self.history_window = HistoryWindow()
+        # Summarization of long histories, used by workflows with a summarize node
+        self.summary_trigger_tokens = int(
+            os.getenv("SUMMARY_TRIGGER_TOKENS", "0"))
+        self.summary_keep_messages = int(
+            os.getenv("SUMMARY_KEEP_MESSAGES", "6"))
+        self.summary_model = os.getenv("SUMMARY_MODEL", "")
+
     @abstractmethod
     def create_graph(self) -> StateGraph:
         """
@@ -58,6 +274,19 @@ class BaseWorkflow(ABC):
         customizable settings to the user.
         """
 
+    @property
+    def background_tasks(self) -> List[BackgroundTask]:
+        """
+        Tasks that run in the background after the reply has been sent to the user,
+        e.g. summarize_node.
+
+        A task gets a snapshot of the state and returns the state fields to update,
+        or None. The updates are applied at the start of the first turn after the
+        task has finished. Turns don't wait for the tasks, so a slow task never
+        delays a reply.
+        """
+        return []
+
     def tool_routing(self, state: BaseState):
         """
         Use in the conditional_edge to route to the ToolNode if the last message
@@ -74,6 +303,68 @@ class BaseWorkflow(ABC):
             return "tools"
         return END
 
+    async def summarize_node(self, state: SummaryState, config: RunnableConfig) -> Optional[SummaryState]:
+        """
+        Fold older messages into the running summary of the conversation.
+
+        Opt-in background task for workflows whose state extends SummaryState. List
+        it in background_tasks when SUMMARY_TRIGGER_TOKENS is set, so that it runs
+        after the reply has been sent. It does nothing, and returns None, until the
+        messages that are not summarized exceed SUMMARY_TRIGGER_TOKENS. Then all but
+        the last SUMMARY_KEEP_MESSAGES messages are summarized, extending the previous
+        summary with only the newly folded messages, by SUMMARY_MODEL or the chat
+        model of the state.
+
+        Nodes build their prompt with get_summary_prompt and get_unsummarized_messages.
+        """
+        if not self.summary_trigger_tokens:
+            return None
+        messages = state["messages"]
+        offset = messages.offset if isinstance(
+            messages, MessageHistory) else 0
+        upto = state.get("summary_upto", 0)
+        if upto < offset:
+            await messages.load_older(offset - upto)
+            offset = messages.offset
+        pending = messages[upto - offset:]
+        if sum(count_tokens(message) for message in pending) <= self.summary_trigger_tokens:
+            return None
+
+        # Don't split a tool call from its results
+        cut = max(0, len(pending) - self.summary_keep_messages)
+        while cut < len(pending) and isinstance(pending[cut], ToolMessage):
+            cut += 1
+        if cut == 0:
+            return None
+
+        llm = llm_factory.create_model(
+            "summary_model", model=self.summary_model or state["chat_model"])
+        response = await llm.ainvoke([HumanMessage(content=SUMMARY_PROMPT.format(
+            summary=state.get("summary") or "(none)",
+            messages=get_buffer_string(pending[:cut]),
+        ))], config=config)
+        return {
+            "summary": chunk_to_text(response.content),
+            "summary_upto": upto + cut,
+        }
+
+    def get_summary_prompt(self, state: BaseState) -> str:
+        """
+        Get the running summary to append to the system prompt, or "" if there is none.
+        """
+        if not state.get("summary"):
+            return ""
+        return f"\n\nSummary of the earlier conversation:\n{state['summary']}"
+
+    def get_unsummarized_messages(self, state: BaseState) -> Sequence[AnyMessage]:
+        """
+        Get the messages that are not covered by the running summary.
+        """
+        messages = state["messages"]
+        offset = messages.offset if isinstance(
+            messages, MessageHistory) else 0
+        return messages[max(0, state.get("summary_upto", 0) - offset):]
+
     async def get_chat_settings(self, state: Optional[BaseState] = None) -> cl.ChatSettings:
         """
         Get the chat settings for the workflow.
@@ -81,6 +372,8 @@ class BaseWorkflow(ABC):
         Args:
             state (Optional[BaseState]): The state of the workflow. Used to resume a chat from previous session.
         """
+        # The settings list the models of the catalog, which is only loaded on the first start
+        await model_catalog.wait_until_loaded()
         settings = self.chat_settings
         # Resume settings from previous session
         if state is not None:
@@ -114,5 +407,39 @@ class BaseWorkflow(ABC):
                             widget.initial = state[widget.id]
         return await settings.send()
 
-    def format_message(self, message: cl.Message) -> HumanMessage:
+    async def load_history(self, state: BaseState, limit: Optional[int] = None) -> Sequence[AnyMessage]:
+        """
+        Get the message history of the state, paging in the older messages that
+        were not loaded when the chat was resumed.
+
+        Args:
+            state (BaseState): The state of the workflow.
+            limit (Optional[int]): Maximum number of older messages to page in. Pages in all if not given.
+        """
+        messages = state["messages"]
+        if isinstance(messages, MessageHistory):
+            await messages.load_older(limit)
+        return messages
+
+    async def load_pinned(self, state: BaseState, keep_first: int) -> Sequence[AnyMessage]:
+        """
+        Get the message history of the state with its first messages, for
+        HistoryWindow.trim_for_model with the same `keep_first`.
+
+        If the chat was resumed with a window of recent messages, the first
+        messages are paged in and put in front of the loaded ones.
+
+        Args:
+            state (BaseState): The state of the workflow.
+            keep_first (int): Number of messages at the start of the thread to include.
+        """
+        messages = state["messages"]
+        if not isinstance(messages, MessageHistory) or messages.offset == 0 or messages.loader is None:
+            return messages
+        first = await messages.load_first(keep_first)
+        if messages.offset == 0:
+            return messages
+        return first + list(messages)
+
+    async def format_message(self, message: cl.Message) -> HumanMessage:
         return HumanMessage(content=message.content)
@@ -5,7 +5,7 @@ from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import Runnable, RunnableConfig
 from .base import BaseWorkflow, BaseState
-from ..llm import llm_factory, ModelCapability
+from ..llm import llm_factory, model_catalog, ModelCapability
 
 
 class GraphState(BaseState):
@@ -36,8 +36,10 @@ class LeanCanvasChatWorkflow(BaseWorkflow):
         llm = llm_factory.create_model(self.output_chat_model,
                                        model=state["chat_model"])
         chain: Runnable = prompt | llm
+        messages = self.history_window.trim_for_model(
+            state["messages"], state["chat_model"], self.chat_system_prompt)
         return {
-            "messages": [await chain.ainvoke(state, config=config)]
+            "messages": [await chain.ainvoke({**state, "messages": messages}, config=config)]
         }
 
     def create_default_state(self) -> GraphState:
@@ -76,7 +78,7 @@ class LeanCanvasChatWorkflow(BaseWorkflow):
             Select(
                 id="chat_model",
                 label="Chat Model",
-                values=sorted(llm_factory.list_models(
+                values=sorted(model_catalog.list_models(
                     capabilities=self.capabilities)),
                 initial_index=0,
             ),
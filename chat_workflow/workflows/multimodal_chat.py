@@ -1,12 +1,14 @@
+import asyncio
 import chainlit as cl
-import base64
 from chainlit.input_widget import Select
 from langgraph.graph import StateGraph
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import Runnable, RunnableConfig
+from pathlib import Path
 from .base import BaseWorkflow, BaseState
-from ..llm import llm_factory, ModelCapability
+from ..image_store import ImageStore
+from ..llm import llm_factory, model_catalog, ModelCapability
 from ..tools import BasicToolNode
 from ..tools.search import get_search_tools
 from ..tools.time import get_datetime_now
@@ -24,6 +26,7 @@ class MultimodalChatWorkflow(BaseWorkflow):
         self.capabilities = {
             ModelCapability.TEXT_TO_TEXT, ModelCapability.IMAGE_TO_TEXT, ModelCapability.TOOL_CALLING}
         self.tools = [get_datetime_now] + get_search_tools()
+        self.image_store = ImageStore()
 
     def create_graph(self) -> StateGraph:
         graph = StateGraph(GraphState)
@@ -37,15 +40,20 @@ class MultimodalChatWorkflow(BaseWorkflow):
         return graph
 
     async def chat_node(self, state: GraphState, config: RunnableConfig) -> GraphState:
+        system_prompt = "You're a helpful assistant."
         prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content="You're a helpful assistant."),
+            SystemMessage(content=system_prompt),
             MessagesPlaceholder(variable_name="messages"),
         ])
         llm = llm_factory.create_model(
             self.output_chat_model, model=state["chat_model"], tools=self.tools)
         chain: Runnable = prompt | llm
+        messages = self.history_window.trim_for_model(
+            state["messages"], state["chat_model"], system_prompt)
+        messages = await self.image_store.resolve_messages(
+            messages, state["chat_model"], accepts_urls=llm_factory.accepts_image_urls(state["chat_model"]))
         return {
-            "messages": [await chain.ainvoke(state, config=config)]
+            "messages": [await chain.ainvoke({**state, "messages": messages}, config=config)]
         }
 
     def create_default_state(self) -> GraphState:
@@ -94,13 +102,13 @@ class MultimodalChatWorkflow(BaseWorkflow):
             Select(
                 id="chat_model",
                 label="Chat Model",
-                values=sorted(llm_factory.list_models(
+                values=sorted(model_catalog.list_models(
                     capabilities=self.capabilities)),
                 initial_index=0,
             ),
         ])
 
-    def format_message(self, msg: cl.Message) -> HumanMessage:
+    async def format_message(self, msg: cl.Message) -> HumanMessage:
         """Format chainlit message to LangChain message with multimodal support"""
         if not msg.elements:
             return HumanMessage(content=msg.content)
@@ -108,16 +116,15 @@ class MultimodalChatWorkflow(BaseWorkflow):
         # Initialize the multimodal content list
         formatted_content = [{"type": "text", "text": msg.content}]
 
-        # Process images
+        # Process images, which are stored once and only referred to by the message
         images = [file for file in msg.elements if "image" in file.mime]
         for image in images:
-            with open(image.path, "rb") as img_file:
-                image_data = base64.b64encode(img_file.read()).decode("utf-8")
-                formatted_content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{image_data}"
-                    }
-                })
+            image_data = await asyncio.to_thread(Path(image.path).read_bytes)
+            formatted_content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": await self.image_store.put(image_data, image.mime)
+                }
+            })
 
         return HumanMessage(content=formatted_content)
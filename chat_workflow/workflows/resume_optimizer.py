@@ -7,7 +7,7 @@ from langchain_core.messages import HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, SystemMessagePromptTemplate
 from langchain_core.runnables import Runnable, RunnableConfig
 from .base import BaseWorkflow, BaseState
-from ..llm import llm_factory, ModelCapability
+from ..llm import llm_factory, model_catalog, ModelCapability
 # from ..tools import BasicToolNode
 # from ..tools.search import get_search_tools
 # from ..tools.time import get_datetime_now
@@ -127,8 +127,11 @@ Based on the above guidelines, please provide a detailed and specific modificati
         llm = llm_factory.create_model(self.output_chat_model,
                                        model=state["chat_model"])
         chain: Runnable = prompt | llm
+        # Always keep the first message of the user and the extracted resume
+        messages = self.history_window.trim_for_model(
+            await self.load_pinned(state, 2), state["chat_model"], system_prompt.prompt.template, keep_first=2)
         return {
-            "messages": [await chain.ainvoke({"messages": state["messages"]}, config=config)]
+            "messages": [await chain.ainvoke({"messages": messages}, config=config)]
         }
 
     def create_default_state(self) -> GraphState:
@@ -168,7 +171,7 @@ Based on the above guidelines, please provide a detailed and specific modificati
             Select(
                 id="chat_model",
                 label="Chat Model",
-                values=sorted(llm_factory.list_models(
+                values=sorted(model_catalog.list_models(
                     capabilities=self.capabilities)),
                 initial_index=0,
             ),
@@ -1,17 +1,18 @@
 import chainlit as cl
+from typing import List
 from chainlit.input_widget import Select
 from langgraph.graph import StateGraph
 from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import Runnable, RunnableConfig
-from .base import BaseWorkflow, BaseState
-from ..llm import llm_factory, ModelCapability
+from .base import BackgroundTask, BaseWorkflow, SummaryState
+from ..llm import llm_factory, model_catalog, ModelCapability
 from ..tools import BasicToolNode
 from ..tools.search import get_search_tools
 from ..tools.time import get_datetime_now
 
 
-class GraphState(BaseState):
+class GraphState(SummaryState):
     # Model name of the chatbot
     chat_model: str
 
@@ -36,15 +37,19 @@ class SimpleChatWorkflow(BaseWorkflow):
         return graph
 
     async def chat_node(self, state: GraphState, config: RunnableConfig) -> GraphState:
+        system_prompt = "You're a helpful assistant." + \
+            self.get_summary_prompt(state)
         prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content="You're a helpful assistant."),
+            SystemMessage(content=system_prompt),
             MessagesPlaceholder(variable_name="messages"),
         ])
         llm = llm_factory.create_model(
             self.output_chat_model, model=state["chat_model"], tools=self.tools)
         chain: Runnable = prompt | llm
+        messages = self.history_window.trim_for_model(
+            self.get_unsummarized_messages(state), state["chat_model"], system_prompt)
         return {
-            "messages": [await chain.ainvoke(state, config=config)]
+            "messages": [await chain.ainvoke({**state, "messages": messages}, config=config)]
         }
 
     def create_default_state(self) -> GraphState:
@@ -52,6 +57,8 @@ class SimpleChatWorkflow(BaseWorkflow):
             "name": self.name(),
             "messages": [],
             "chat_model": "",
+            "summary": "",
+            "summary_upto": 0,
         }
 
     @classmethod
@@ -62,6 +69,10 @@ class SimpleChatWorkflow(BaseWorkflow):
     def output_chat_model(self) -> str:
         return "chat_model"
 
+    @property
+    def background_tasks(self) -> List[BackgroundTask]:
+        return [self.summarize_node] if self.summary_trigger_tokens else []
+
     @classmethod
     def chat_profile(cls) -> cl.ChatProfile:
         return cl.ChatProfile(
@@ -94,7 +105,7 @@ class SimpleChatWorkflow(BaseWorkflow):
             Select(
                 id="chat_model",
                 label="Chat Model",
-                values=sorted(llm_factory.list_models(
+                values=sorted(model_catalog.list_models(
                     capabilities=self.capabilities)),
                 initial_index=0,
             ),
@@ -1,12 +1,20 @@
 import chainlit as cl
 import importlib
-from typing import Type, Dict
+from chainlit.logger import logger
+from typing import Type, Dict, Optional
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph.state import CompiledStateGraph
 from .base import BaseWorkflow, BaseState
 
 
 class WorkflowFactory:
     _workflows: Dict[str, Type[BaseWorkflow]] = {}
     _module_map: Dict[str, str] = {}  # Maps chat profile names to module names
+    # Workflows are stateless, so one instance and one compiled graph
+    # per chat profile are shared by all sessions.
+    _instances: Dict[str, BaseWorkflow] = {}
+    _graphs: Dict[str, CompiledStateGraph] = {}
+    _checkpointer: Optional[BaseCheckpointSaver] = None
 
     @classmethod
     def register(cls, name: str, workflow_class: Type[BaseWorkflow]):
@@ -14,11 +22,15 @@ class WorkflowFactory:
             '.')[-1]  # e.g. 'simple_chat'
         cls._workflows[name] = workflow_class  # e.g. 'Simple Chat'
         cls._module_map[name] = module_name
+        cls._instances.pop(name, None)
+        cls._graphs.pop(name, None)
 
     @classmethod
     def unregister(cls, name: str):
         """Dynamically remove workflows"""
         cls._workflows.pop(name, None)
+        cls._instances.pop(name, None)
+        cls._graphs.pop(name, None)
 
     @classmethod
     def create(cls, name: str, **kwargs) -> BaseWorkflow:
@@ -26,6 +38,37 @@ class WorkflowFactory:
             raise ValueError(f"Workflow {name} not found")
         return cls._workflows[name](**kwargs)
 
+    @classmethod
+    def set_checkpointer(cls, checkpointer: Optional[BaseCheckpointSaver]):
+        """Set the checkpointer that compiled graphs persist their state with"""
+        cls._checkpointer = checkpointer
+        cls._graphs.clear()
+
+    @classmethod
+    def get(cls, name: str) -> BaseWorkflow:
+        """Get the shared workflow instance, creating it on first use"""
+        if name not in cls._instances:
+            cls._instances[name] = cls.create(name)
+        return cls._instances[name]
+
+    @classmethod
+    def get_graph(cls, name: str) -> CompiledStateGraph:
+        """Get the shared compiled graph, compiling it on first use"""
+        if name not in cls._graphs:
+            cls._graphs[name] = cls.get(name).create_graph().compile(
+                checkpointer=cls._checkpointer)
+            logger.debug(f"Compiled graph for workflow: {name}")
+        return cls._graphs[name]
+
+    @classmethod
+    def warm_up(cls):
+        """Build the workflow instances and compile the graphs of all registered workflows"""
+        for name in cls.list_workflows():
+            try:
+                cls.get_graph(name)
+            except Exception as e:
+                logger.error(f"Error compiling graph for workflow {name}: {e}")
+
     @classmethod
     def list_workflows(cls) -> list[str]:
         return list(cls._workflows.keys())